@@ -1,26 +1,100 @@
-from flask import Flask
+import threading
+from flask import Flask, g
 from flask_restx import Api
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from .config.config import config_dict
-from .utils import db, jwt
+from .utils import db, jwt, event_log, replicas, pubsub, compression, idempotency, scheduler, shards, jobs, cache
+from .utils.replicas import replicas_sync
+from .utils.sharding import shards_init
+from .utils.jobs import jobs_run
+from .utils.openapi import export_openapi, serve_prebuilt_spec
+from .utils.seed import seed_command
+from .products.search import rebuild_search_index
+from .analytics.rollups import backfill_rollups_command
+from .products import cache as product_cache, live
+from .auth.cache import token_is_blocklisted, cached_claims
+from .auth.throttle import init_login_throttle
+from .products.facets import init_facets, reconcile_facets_command
+from .carts.compaction import init_cart_compaction, compact_carts_command
+from .orders.archive import archive_orders_command
 from .models.carts import Cart
 from .models.cartItems import CartItem
 from .models.orderItems import OrderItem
 from .models.orders import Order
 from .models.products import Product
 from .models.users import User, Admin
-from .auth.views import auth_namespace
-from .admin.views import admin_user_namespace
-from .carts.views import cart_namespace
-from .products.views import product_namespace
-from .cartItems.views import cartItems_namespace
-from .orders.views import order_namespace
-from .orderItems.views import orderItems_namespace
-from .tokenBlockList.views import logout_namespace
-from .admin.auth import admin_auth_namespace
 from .models.logout import TokenBlockList
+from .models.events import AuditEvent
+from .models.purgeJobs import PurgeJob
+from .models.stockAlerts import StockAlert
+from .models.productFacets import ProductFacet
+from .models.jobs import Job
+from .models.idempotencyKeys import IdempotencyKey
+from .models.archivedOrders import ArchivedOrder
+from .models.salesRollups import DailyProductSales, DailyCategorySales, CategoryInventory
 
 
+# Modules that only register Session listeners. Views may be imported lazily, and CLI commands and
+# background jobs commit without them, so they are imported with the app
+SESSION_LISTENERS = (live, product_cache)
+
+
+def register_namespaces(api):
+    """
+        Import the views modules and mount their namespaces.
+        The imports live here rather than at module level so that `import api`
+        (CLI commands, workers before fork) does not pay for building every resource.
+    """
+    from .auth.views import auth_namespace
+    from .admin.views import admin_user_namespace
+    from .carts.views import cart_namespace
+    from .products.views import product_namespace
+    from .cartItems.views import cartItems_namespace
+    from .orders.views import order_namespace
+    from .orderItems.views import orderItems_namespace
+    from .tokenBlockList.views import logout_namespace
+    from .admin.auth import admin_auth_namespace
+    from .analytics.views import analytics_namespace
+    from .batch.views import batch_namespace
+
+    api.add_namespace(auth_namespace, path='/auth')
+    api.add_namespace(cart_namespace, path='/carts')
+    api.add_namespace(product_namespace, path='/products')
+    api.add_namespace(cartItems_namespace, path='/cartItems')
+    api.add_namespace(order_namespace, path='/orders')
+    api.add_namespace(orderItems_namespace, path='/orderItems')
+    api.add_namespace(logout_namespace, path='/logout')
+    api.add_namespace(admin_auth_namespace, path='/admin/auth')
+    api.add_namespace(admin_user_namespace, path='/admin')
+    api.add_namespace(analytics_namespace, path='/admin/analytics')
+    api.add_namespace(batch_namespace, path='/batch')
+
+
+class NamespaceLoader:
+    """
+        Registers the namespaces once. With LAZY_NAMESPACES the loader wraps the WSGI app
+        and registers them just before the first request is dispatched; Flask does not
+        allow adding routes once a request has been handled, so this is the latest point.
+    """
+    def __init__(self, api):
+        self.api = api
+        self.registered = False
+        self._lock = threading.Lock()
+
+    def ensure_registered(self):
+        if self.registered:
+            return
+        with self._lock:
+            if not self.registered:
+                register_namespaces(self.api)
+                self.registered = True
+
+    def wrap(self, wsgi_app):
+        def lazy_wsgi_app(environ, start_response):
+            self.ensure_registered()
+            return wsgi_app(environ, start_response)
+        return lazy_wsgi_app
 
 
 def create_app(config=config_dict['dev']):
@@ -43,39 +117,72 @@ def create_app(config=config_dict['dev']):
                       browsing products, managing carts, and processing orders.',
               contact='samsongreats@gmail.com',
               authorizations=authorizations, security='Bearer Auth',
+              doc='/' if app.config.get('SWAGGER_UI_ENABLED', True) else False,
               )
     
+    # Replica and shard binds have to be in the config before db.init_app creates the engines
+    replicas.init_app(app)
+    shards.init_app(app)
     db.init_app(app)
+    replicas.detach_metadata(db, app)
+    shards.detach_metadata(db, app)
     jwt.init_app(app)
+    event_log.init_app(app)
+    pubsub.init_app(app)
+    compression.init_app(app)
+    idempotency.init_app(app)
+    scheduler.init_app(app)
+    jobs.init_app(app)
+    cache.init_app(app)
+    init_facets(app)
+    init_cart_compaction(app)
+    init_login_throttle(app)
     
-    migrate = Migrate(app, db)
+    Migrate(app, db)
     
-    api.add_namespace(auth_namespace, path='/auth')
-    api.add_namespace(cart_namespace, path='/carts')
-    api.add_namespace(product_namespace, path='/products')
-    api.add_namespace(cartItems_namespace, path='/cartItems')
-    api.add_namespace(order_namespace, path='/orders')
-    api.add_namespace(orderItems_namespace, path='/orderItems')
-    api.add_namespace(logout_namespace, path='/logout')
-    api.add_namespace(admin_auth_namespace, path='/admin/auth')
-    api.add_namespace(admin_user_namespace, path='/admin')
+    namespaces = NamespaceLoader(api)
+    app.extensions['namespaces'] = namespaces
+    if app.config.get('LAZY_NAMESPACES'):
+        app.wsgi_app = namespaces.wrap(app.wsgi_app)
+    else:
+        namespaces.ensure_registered()
+    
+    if app.config.get('SWAGGER_SPEC_PATH'):
+        serve_prebuilt_spec(app, app.config['SWAGGER_SPEC_PATH'])
+    
+    if app.config.get('PROXY_FIX_X_FOR'):
+        # Only the hops of our own proxies are trusted; anything the client sent before them is ignored
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+    
+    app.cli.add_command(rebuild_search_index)
+    app.cli.add_command(replicas_sync)
+    app.cli.add_command(shards_init)
+    app.cli.add_command(jobs_run)
+    app.cli.add_command(export_openapi)
+    app.cli.add_command(backfill_rollups_command)
+    app.cli.add_command(reconcile_facets_command)
+    app.cli.add_command(compact_carts_command)
+    app.cli.add_command(archive_orders_command)
+    app.cli.add_command(seed_command)
     
     @jwt.token_in_blocklist_loader
     def token_in_blocklist_callback(jwt_header, jwt_data):
 	    jti = jwt_data['jti']
 	
-	    token = db.session.query(TokenBlockList).filter(TokenBlockList.jti == jti).scalar()
+	    # Inside a /batch request the answer is looked up once for all the calls
+	    memo = g.get('_jwt_blocklist_memo')
+	    if memo is not None and jti in memo:
+	        return memo[jti]
+	
+	    blocklisted = token_is_blocklisted(jti)
 	
-	    return token is not None
+	    if memo is not None:
+	        memo[jti] = blocklisted
+	    return blocklisted
  
     @jwt.additional_claims_loader
     def add_claims_to_jwt(identity):
-        user = Admin.query.filter_by(email=identity).first()
-        if user:
-            return {
-                'role': 'admin',
-            }
-        return {}
+        return cached_claims(identity)
         
     @app.shell_context_processor
     def make_shell_context():
@@ -88,6 +195,17 @@ def create_app(config=config_dict['dev']):
             'Cart': Cart,
             'CartItem': CartItem,
             'Admin': Admin,
+            'AuditEvent': AuditEvent,
+            'PurgeJob': PurgeJob,
+            'StockAlert': StockAlert,
+            'ProductFacet': ProductFacet,
+            'DailyProductSales': DailyProductSales,
+            'DailyCategorySales': DailyCategorySales,
+            'CategoryInventory': CategoryInventory,
+            'ArchivedOrder': ArchivedOrder,
+            'TokenBlockList': TokenBlockList,
+            'Job': Job,
+            'IdempotencyKey': IdempotencyKey,
         }
     
     return app
\ No newline at end of file
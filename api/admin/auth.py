@@ -1,7 +1,7 @@
-from flask_restx import Namespace, Resource, fields, marshal_with
-from flask import request
-from datetime import datetime
+from flask_restx import Namespace, Resource, fields
+from flask import current_app, request
 from ..models.users import Admin
+from ..auth.throttle import login_attempt
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 
 admin_auth_namespace = Namespace('admin/auth', description='Admins registration and authentication operations')
@@ -72,10 +72,17 @@ class Login(Resource):
         if '@' not in data['email']:
             return {"message": "Invalid email address"}, 400
         email = data['email']
+        # Throttled attempts are turned away before the lookup and the password hash
+        account, ip, rejection = login_attempt('admin', email)
+        if rejection:
+            return rejection
+        throttle = current_app.extensions['login_throttle']
         user = Admin.query.filter_by(email=email).first()
         if not user:
+            throttle.failed(account, ip)
             return {"message": "User not found. Please register user!"}, 404
         if user and user.check_password(data['password']):
+            throttle.succeeded(account)
             access_token = create_access_token(identity=email)
             if not access_token:
                 return {"message": "Something went wrong creating the access token"}, 400
@@ -86,6 +93,7 @@ class Login(Resource):
                 "access_token": access_token, 
                 "refresh_token": refresh_token
                 }, 200
+        throttle.failed(account, ip)
         return {"message": "Invalid credentials"}, 401
 
 
@@ -98,7 +106,7 @@ class Refresh(Resource):
         """
             Refresh a user's JWT access token
         """
-        username = get_jwt_identity()
+        email = get_jwt_identity()
         access_token = create_access_token(identity=email)
         return {"access_token": access_token}, 200
 
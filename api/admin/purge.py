@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from ..carts.compaction import delete_cart_items, release_stock
+from ..models.carts import Cart
+from ..models.orderItems import OrderItem
+from ..models.orders import Order
+from ..models.purgeJobs import PurgeJob
+from ..models.users import User
+from ..utils import cache, db, shards
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+_threads = {}
+
+
+def start_purge(app):
+    """
+        Record a purge job and run it on a background thread.
+        Returns the id of the committed job so it can be handed to the client,
+        or None when another job is already pending or running.
+    """
+    job = PurgeJob(chunk_size=app.config['USER_PURGE_CHUNK_SIZE'])
+    try:
+        job.save()
+    except IntegrityError:
+        # uq_purge_jobs_active: another request claimed the purge first
+        db.session.rollback()
+        return None
+    job_id = job.id
+    thread = threading.Thread(target=run_purge, args=(app, job_id), name=f'user-purge-{job_id}', daemon=True)
+    _threads[job_id] = thread
+    thread.start()
+    return job_id
+
+
+def wait_for_purge(job_id, timeout=None):
+    thread = _threads.get(job_id)
+    if thread is not None:
+        thread.join(timeout)
+
+
+def abandoned(job, timeout):
+    """
+        Whether a pending or running job has nobody working on it any more: its thread in this
+        process is gone, or, for a job of another process, it made no progress for timeout seconds.
+    """
+    thread = _threads.get(job.id)
+    if thread is not None:
+        return not thread.is_alive()
+    last_progress = job.updated_at or job.started_at or job.created_at
+    return last_progress < datetime.utcnow() - timedelta(seconds=timeout)
+
+
+def fail_abandoned(job):
+    """Mark an abandoned job failed, unless it finished meanwhile. The caller commits."""
+    db.session.execute(
+        update(PurgeJob).where(PurgeJob.id == job.id, PurgeJob.status.in_(('pending', 'running')))
+        .values(status='failed', error='Abandoned: the purge stopped making progress', finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False))
+    logger.warning(f"Marked abandoned purge job {job.id} as failed")
+
+
+def run_purge(app, job_id):
+    """
+        Delete every user with their carts, cart items, orders and order items.
+        Each chunk of users is removed in its own short transaction, children first,
+        so the write lock is only held for one chunk and other writers get a turn in between.
+    """
+    with app.app_context():
+        job = db.session.get(PurgeJob, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        job.total_users = db.session.execute(select(func.count(User.id))).scalar()
+        db.session.commit()
+        pause = app.config['USER_PURGE_PAUSE']
+        try:
+            while True:
+                user_ids = db.session.execute(
+                    select(User.id).order_by(User.id).limit(job.chunk_size)).scalars().all()
+                if not user_ids:
+                    break
+                deleted_carts, deleted_orders = delete_users(user_ids)
+                job.deleted_users += len(user_ids)
+                job.deleted_carts += deleted_carts
+                job.deleted_orders += deleted_orders
+                db.session.commit()
+                time.sleep(pause)
+            job.status = 'completed'
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"An error occurred while purging users in job {job_id}: {str(e)}")
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        db.session.remove()
+        _threads.pop(job_id, None)
+
+
+def delete_users(user_ids):
+    """
+        Delete the users with their carts, cart items, orders and order items in the current
+        transaction, and return how many carts and orders went. The stock held in their carts
+        goes back to the products, as when stale carts are compacted. The caller commits.
+    """
+    if not shards.enabled():
+        deleted_carts, deleted_orders = _delete_owned_rows(user_ids)
+    else:
+        # Carts and orders live on the shard of their user: delete them shard by shard
+        by_shard = defaultdict(list)
+        for user_id in user_ids:
+            by_shard[shards.shard_for_user(user_id)].append(user_id)
+        deleted_carts = deleted_orders = 0
+        for ids in by_shard.values():
+            with shards.use_shard(ids[0]):
+                carts, orders = _delete_owned_rows(ids)
+            deleted_carts += carts
+            deleted_orders += orders
+    db.session.execute(delete(User.__table__).where(User.id.in_(user_ids)))
+    # The bulk delete bypasses the ORM events that invalidate cached claims one email at a time
+    cache.invalidate_on_commit(db.session, 'claims')
+    return deleted_carts, deleted_orders
+
+
+def _delete_owned_rows(user_ids):
+    cart_ids = select(Cart.id).where(Cart.user_id.in_(user_ids))
+    order_ids = select(Order.id).where(Order.user_id.in_(user_ids))
+    released = Counter()
+    for product_id, quantity in delete_cart_items(cart_ids):
+        released[product_id] += quantity
+    if released:
+        release_stock(released)
+    deleted_carts = db.session.execute(delete(Cart.__table__).where(Cart.user_id.in_(user_ids))).rowcount
+    db.session.execute(delete(OrderItem.__table__).where(OrderItem.order_id.in_(order_ids)))
+    deleted_orders = db.session.execute(delete(Order.__table__).where(Order.user_id.in_(user_ids))).rowcount
+    return deleted_carts, deleted_orders
@@ -1,6 +1,15 @@
-from flask_restx import Resource, Namespace, fields, abort
+from flask_restx import Resource, Namespace, fields
 from flask_jwt_extended import jwt_required, get_jwt
-from ..models.users import Admin, User
+from flask import request, current_app
+from datetime import datetime
+from sqlalchemy import select
+from ..models.users import User
+from ..models.purgeJobs import PurgeJob
+from ..models.jobs import Job
+from ..utils import db, compression, jobs
+from .purge import abandoned, delete_users, fail_abandoned, start_purge
+from ..utils.cursors import decode_cursor, encode_cursor
+from ..utils.replicas import read_only
 
 admin_user_namespace = Namespace('admin', description='Operations related to managing users and administrative tasks')
 user_model = admin_user_namespace.model('User', {
@@ -10,46 +19,184 @@ user_model = admin_user_namespace.model('User', {
     'role': fields.String(required=True)
 })
 
-@admin_user_namespace.route('all/users')
+user_summary_model = admin_user_namespace.model('UserSummary', {
+    'id': fields.Integer(readonly=True),
+    'username': fields.String(),
+    'email': fields.String(),
+    'is_active': fields.Boolean(),
+    'created_at': fields.DateTime()
+})
+
+user_page_model = admin_user_namespace.model('UserPage', {
+    'users': fields.List(fields.Nested(user_summary_model)),
+    'limit': fields.Integer(description='Maximum number of users per page'),
+    'next_cursor': fields.String(description='Pass as cursor to get the next page; null on the last page')
+})
+
+compression_stats_model = admin_user_namespace.model('CompressionStats', {
+    'responses': fields.Integer(description='Responses compressed by this process'),
+    'skipped_small': fields.Integer(description='Responses left uncompressed for being under COMPRESS_MIN_SIZE'),
+    'bytes_in': fields.Integer(description='Body bytes before compression'),
+    'bytes_out': fields.Integer(description='Body bytes sent on the wire'),
+    'ratio': fields.Float(description='bytes_out / bytes_in'),
+    'cpu_ms_per_response': fields.Float(description='Average CPU time spent compressing one response')
+})
+
+cart_compaction_stats_model = admin_user_namespace.model('CartCompactionStats', {
+    'runs': fields.Integer(description='Compactions run by this process'),
+    'carts': fields.Integer(description='Stale carts deleted'),
+    'items': fields.Integer(description='Cart items deleted with them'),
+    'units': fields.Integer(description='Units of stock returned to the products'),
+    'last_run_at': fields.DateTime(description='When the last compaction finished'),
+    'last_duration_seconds': fields.Float(description='How long the last compaction took')
+})
+
+login_throttle_stats_model = admin_user_namespace.model('LoginThrottleStats', {
+    'tracked_keys': fields.Integer(description='Accounts and client IPs with recent failed logins'),
+    'locked_keys': fields.Integer(description='Accounts and client IPs locked out right now'),
+    'failures': fields.Integer(description='Failed logins counted'),
+    'rejected': fields.Integer(description='Login attempts turned away before the password check'),
+    'lockouts': fields.Integer(description='Lockouts started')
+})
+
+purge_job_model = admin_user_namespace.model('PurgeJob', {
+    'id': fields.Integer(readonly=True),
+    'status': fields.String(description='pending, running, completed or failed'),
+    'total_users': fields.Integer(description='Users present when the job started'),
+    'deleted_users': fields.Integer(),
+    'deleted_carts': fields.Integer(),
+    'deleted_orders': fields.Integer(),
+    'chunk_size': fields.Integer(description='Users deleted per transaction'),
+    'error': fields.String(),
+    'created_at': fields.DateTime(),
+    'started_at': fields.DateTime(),
+    'finished_at': fields.DateTime()
+})
+
+background_job_model = admin_user_namespace.model('BackgroundJob', {
+    'id': fields.Integer(readonly=True),
+    'name': fields.String(),
+    'status': fields.String(description='queued, running, done or dead'),
+    'attempts': fields.Integer(),
+    'max_attempts': fields.Integer(),
+    'run_at': fields.DateTime(description='When the job is due (again)'),
+    'last_error': fields.String(),
+    'created_at': fields.DateTime(),
+    'finished_at': fields.DateTime()
+})
+
+background_job_page_model = admin_user_namespace.model('BackgroundJobPage', {
+    'jobs': fields.List(fields.Nested(background_job_model)),
+    'limit': fields.Integer(description='Maximum number of jobs per page'),
+    'next_cursor': fields.String(description='Pass as cursor to get the next page; null on the last page')
+})
+
+# Only these columns are loaded for listings; password_hash and the rest stay in the database
+USER_SUMMARY_COLUMNS = (User.id, User.username, User.email, User.is_active, User.created_at)
+
+
+def parse_datetime_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        admin_user_namespace.abort(400, f'{name} must be an ISO 8601 date or datetime')
+
+
+@admin_user_namespace.route('/all/users')
 class GetAllUsers(Resource):
-    @admin_user_namespace.marshal_with(user_model)
-    @admin_user_namespace.doc(description="Get all registered users")
+    @admin_user_namespace.marshal_with(user_page_model)
+    @admin_user_namespace.doc(description="Get registered users, one page at a time",
+                              params={'limit': 'Users per page (1-200, default 50)',
+                                      'cursor': 'next_cursor from the previous page',
+                                      'is_active': 'Only active (true) or inactive (false) users',
+                                      'created_after': 'Only users created at or after this ISO date',
+                                      'created_before': 'Only users created before this ISO date',
+                                      'email': 'Only users whose email starts with this prefix'})
     @jwt_required()
+    @read_only
     def get(self):
         """
-             Retrieve a list of all registered users.
+             Retrieve registered users page by page, ordered by ID.
+             Pages use keyset cursors, so every page costs the same however deep it is.
              Accessible only to admin users.
-             Returns:  a list of all registered users.
+             Returns: a page of users and the cursor of the next page.
                 status codes:
                     200: Success
+                    400: Invalid filter or cursor
                     403: Unauthorized
         """
         jwt_data = get_jwt()
         if jwt_data.get('role') != 'admin':
             admin_user_namespace.abort(403, 'Unauthorized. Only admins can view all users')
-        users = User.query.all()
-        return users
+        limit = request.args.get('limit', default=50, type=int)
+        if limit < 1 or limit > 200:
+            admin_user_namespace.abort(400, 'limit must be between 1 and 200')
+
+        query = select(*USER_SUMMARY_COLUMNS).order_by(User.id).limit(limit + 1)
+        cursor = request.args.get('cursor')
+        if cursor:
+            query = query.where(User.id > decode_cursor(cursor))
+        is_active = request.args.get('is_active')
+        if is_active is not None:
+            if is_active.lower() not in ('true', 'false'):
+                admin_user_namespace.abort(400, 'is_active must be true or false')
+            query = query.where(User.is_active == (is_active.lower() == 'true'))
+        created_after = parse_datetime_arg('created_after')
+        if created_after:
+            query = query.where(User.created_at >= created_after)
+        created_before = parse_datetime_arg('created_before')
+        if created_before:
+            query = query.where(User.created_at < created_before)
+        email = request.args.get('email')
+        if email:
+            # Escaped so % and _ in the prefix match literally
+            query = query.where(User.email.startswith(email, autoescape=True))
+
+        rows = db.session.execute(query).mappings().all()
+        users = rows[:limit]
+        next_cursor = encode_cursor(users[-1]['id']) if len(rows) > limit else None
+        return {"users": users, "limit": limit, "next_cursor": next_cursor}
     
+    @admin_user_namespace.doc(description="Delete all registered users in a background job")
+    @jwt_required()
     def delete(self):
         """
-            Delete all registered users.
+            Delete all registered users together with their carts, cart items and orders.
+            The deletion runs as a background job in small chunks; poll the returned status URL for progress.
             Accessible only to admin users.
-            Returns: a message indicating that all users have been deleted.
+            Returns: the ID and status URL of the purge job.
                 status codes:
-                    200: Success
+                    202: Purge job started
                     403: Unauthorized
+                    409: A purge job is already running
         """
         jwt_data = get_jwt()
         if jwt_data.get('role') != 'admin':
             admin_user_namespace.abort(403, 'Unauthorized. Only admins can delete all users')
-        User.query.delete()
-        return {"message": "All users deleted successfully"}, 200
+        running = PurgeJob.query.filter(PurgeJob.status.in_(('pending', 'running'))).first()
+        if running and abandoned(running, current_app.config['USER_PURGE_TIMEOUT']):
+            # A job whose worker died would otherwise block every later purge
+            fail_abandoned(running)
+            db.session.commit()
+            running = None
+        if running:
+            admin_user_namespace.abort(409, f'Purge job {running.id} is already running')
+        job_id = start_purge(current_app._get_current_object())
+        if job_id is None:
+            # Another request started a purge between the check above and the claim
+            admin_user_namespace.abort(409, 'A purge job is already running')
+        return {"message": "User purge started", "job_id": job_id,
+                "status_url": f"/admin/jobs/purge/{job_id}"}, 202
 
-@admin_user_namespace.route('users/<int:id>')
+@admin_user_namespace.route('/users/<int:id>')
 class GetUser(Resource):
     @admin_user_namespace.marshal_with(user_model)
     @admin_user_namespace.doc(description="Get a user")
     @jwt_required()
+    @read_only
     def get(self, id):
         """
             Retrieve the details of a specific user by their ID.
@@ -70,6 +217,7 @@ class GetUser(Resource):
             admin_user_namespace.abort(404, 'User not found')
         return user
     
+    @jwt_required()
     def delete(self, id):
         """
              Delete a specific user by their ID.
@@ -88,6 +236,152 @@ class GetUser(Resource):
         user = User.query.get(id)
         if not user:
             admin_user_namespace.abort(404, 'User not found')
-        db.session.delete(user)
+        # Their carts and orders are deleted on the user's shard, the user on the primary
+        delete_users([user.id])
         db.session.commit()
-        return {"message": "User deleted successfully"}, 200
\ No newline at end of file
+        return {"message": "User deleted successfully"}, 200
+
+@admin_user_namespace.route('/jobs/purge/<int:id>')
+class GetPurgeJob(Resource):
+    @admin_user_namespace.marshal_with(purge_job_model)
+    @admin_user_namespace.doc(description="Get the progress of a user purge job")
+    @jwt_required()
+    def get(self, id):
+        """
+            Report the progress of a bulk user deletion job.
+            Accessible only to admin users.
+            Returns: the job status and how many rows it has deleted so far.
+                status codes:
+                    200: Success
+                    403: Unauthorized
+                    404: Job not found
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            admin_user_namespace.abort(403, 'Unauthorized. Only admins can view purge jobs')
+        job = db.session.get(PurgeJob, id)
+        if not job:
+            admin_user_namespace.abort(404, 'Purge job not found')
+        return job
+
+
+@admin_user_namespace.route('/jobs')
+class BackgroundJobs(Resource):
+    @admin_user_namespace.marshal_with(background_job_page_model)
+    @admin_user_namespace.doc(description="List background jobs in one status, e.g. the dead letters",
+                              params={'status': 'queued, running, done or dead (default dead)',
+                                      'limit': 'Jobs per page (1-200, default 50)',
+                                      'cursor': 'next_cursor from the previous page'})
+    @jwt_required()
+    def get(self):
+        """
+            List background jobs by status, ordered by ID. Dead jobs ran out of attempts and keep their last error.
+            Accessible only to admin users.
+            Returns: a page of jobs and the cursor of the next page.
+                status codes:
+                    200: Success
+                    400: Invalid status, limit or cursor
+                    403: Unauthorized
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            admin_user_namespace.abort(403, 'Unauthorized. Only admins can view background jobs')
+        status = request.args.get('status', default='dead')
+        if status not in ('queued', 'running', 'done', 'dead'):
+            admin_user_namespace.abort(400, 'status must be queued, running, done or dead')
+        limit = request.args.get('limit', default=50, type=int)
+        if limit < 1 or limit > 200:
+            admin_user_namespace.abort(400, 'limit must be between 1 and 200')
+        query = select(Job).where(Job.status == status).order_by(Job.id).limit(limit + 1)
+        cursor = request.args.get('cursor')
+        if cursor:
+            query = query.where(Job.id > decode_cursor(cursor))
+        rows = db.session.execute(query).scalars().all()
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1].id) if len(rows) > limit else None
+        return {"jobs": page, "limit": limit, "next_cursor": next_cursor}
+
+
+@admin_user_namespace.route('/jobs/<int:id>/retry')
+class RetryBackgroundJob(Resource):
+    @admin_user_namespace.doc(description="Queue a dead background job again")
+    @jwt_required()
+    def post(self, id):
+        """
+            Give a dead job a fresh set of attempts, e.g. after fixing what made it fail.
+            Accessible only to admin users.
+            Returns: a message indicating that the job was queued.
+                status codes:
+                    200: Success
+                    403: Unauthorized
+                    404: Job not found
+                    409: The job is not dead
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            admin_user_namespace.abort(403, 'Unauthorized. Only admins can retry background jobs')
+        if not db.session.get(Job, id):
+            admin_user_namespace.abort(404, 'Job not found')
+        if not jobs.retry(id):
+            admin_user_namespace.abort(409, 'Only dead jobs can be retried')
+        return {"message": f"Job {id} queued again"}, 200
+
+
+@admin_user_namespace.route('/stats/compression')
+class CompressionStats(Resource):
+    @admin_user_namespace.marshal_with(compression_stats_model)
+    @admin_user_namespace.doc(description="Response compression totals of the process serving the request")
+    @jwt_required()
+    def get(self):
+        """
+            Report bytes saved and CPU spent by response compression, to tune COMPRESS_LEVEL and COMPRESS_MIN_SIZE.
+            Accessible only to admin users. The figures cover the worker process that answers.
+            Returns: compression totals since the process started.
+                status codes:
+                    200: Success
+                    403: Unauthorized
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            admin_user_namespace.abort(403, 'Unauthorized. Only admins can view compression stats')
+        return compression.stats()
+
+
+@admin_user_namespace.route('/stats/cart_compaction')
+class CartCompactionStats(Resource):
+    @admin_user_namespace.marshal_with(cart_compaction_stats_model)
+    @admin_user_namespace.doc(description="Stale cart compaction totals of the process serving the request")
+    @jwt_required()
+    def get(self):
+        """
+            Report the carts, items and stock reclaimed by the stale cart compaction.
+            Accessible only to admin users. The figures cover the worker process that answers.
+            Returns: compaction totals since the process started.
+                status codes:
+                    200: Success
+                    403: Unauthorized
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            admin_user_namespace.abort(403, 'Unauthorized. Only admins can view cart compaction stats')
+        return current_app.extensions['cart_compaction'].snapshot()
+
+
+@admin_user_namespace.route('/stats/login_throttle')
+class LoginThrottleStats(Resource):
+    @admin_user_namespace.marshal_with(login_throttle_stats_model)
+    @admin_user_namespace.doc(description="Login throttling totals of the process serving the request")
+    @jwt_required()
+    def get(self):
+        """
+            Report the failed logins counted and the attempts turned away by the login throttle.
+            Accessible only to admin users. The figures cover the worker process that answers.
+            Returns: throttling totals since the process started.
+                status codes:
+                    200: Success
+                    403: Unauthorized
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            admin_user_namespace.abort(403, 'Unauthorized. Only admins can view login throttle stats')
+        return current_app.extensions['login_throttle'].snapshot()
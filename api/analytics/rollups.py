@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import date
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Date, cast, delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+from ..models.orderItems import OrderItem
+from ..models.orders import Order
+from ..models.products import Product, category_name
+from ..models.salesRollups import CategoryInventory, DailyCategorySales, DailyProductSales
+from ..utils import db, jobs, shards
+from ..utils.counters import increment, previous_value
+
+
+def record_sale(day, product, quantity, revenue):
+    """Add one order line to the daily product and category rollups, inside the caller's transaction."""
+    connection = db.session.connection()
+    category = category_name(product.category)
+    increment(connection, DailyProductSales.__table__, {'day': day, 'product_id': product.id},
+              {'units': quantity, 'revenue': revenue}, extra={'category': category})
+    increment(connection, DailyCategorySales.__table__, {'day': day, 'category': category},
+              {'units': quantity, 'revenue': revenue})
+
+
+@jobs.task('analytics.record_sales')
+def record_sales_job(day, lines):
+    """Add the lines of a placed order, as (product_id, quantity, revenue), to the sales rollups."""
+    sale_day = date.fromisoformat(day)
+    product_ids = [product_id for product_id, _, _ in lines]
+    products = {product.id: product for product in Product.query.filter(Product.id.in_(product_ids))}
+    for product_id, quantity, revenue in lines:
+        # Products deleted since the checkout have no category left to count the sale under
+        if product_id in products:
+            record_sale(sale_day, products[product_id], quantity, revenue)
+
+
+def apply_inventory_deltas(connection, deltas):
+    """deltas maps category -> (units, value) changes of the stock held in that category."""
+    for category, (units, value) in deltas.items():
+        if units or value:
+            increment(connection, CategoryInventory.__table__, {'category': category},
+                      {'units': units, 'value': value})
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_inventory(session, flush_context, instances):
+    """Keep category_inventory in step with every ORM write to products."""
+    deltas = defaultdict(lambda: [0, 0.0])
+
+    def add(sign, category, stock, price):
+        stock, price = stock or 0, price or 0.0
+        delta = deltas[category_name(category)]
+        delta[0] += sign * stock
+        delta[1] += sign * stock * price
+
+    for product in session.new:
+        if isinstance(product, Product):
+            add(1, product.category, product.stock, product.price)
+    for product in session.deleted:
+        if isinstance(product, Product):
+            state = inspect(product)
+            add(-1, previous_value(state, 'category'), previous_value(state, 'stock'), previous_value(state, 'price'))
+    for product in session.dirty:
+        if isinstance(product, Product) and session.is_modified(product):
+            state = inspect(product)
+            add(-1, previous_value(state, 'category'), previous_value(state, 'stock'), previous_value(state, 'price'))
+            add(1, product.category, product.stock, product.price)
+    if deltas:
+        apply_inventory_deltas(session.connection(), deltas)
+
+
+def _sale_day(connection):
+    sold_at = func.coalesce(OrderItem.created_at, Order.created_at)
+    # SQLite has no DATE type; date() gives the same YYYY-MM-DD text the Date column stores
+    return func.date(sold_at) if connection.dialect.name == 'sqlite' else cast(sold_at, Date)
+
+
+def backfill_rollups():
+    """Rebuild every rollup table from order_items, orders and products in one transaction."""
+    with db.engine.begin() as connection:
+        for model in (DailyProductSales, DailyCategorySales, CategoryInventory):
+            connection.execute(delete(model.__table__))
+        if shards.enabled():
+            _backfill_product_sales_from_shards(connection)
+        else:
+            day = _sale_day(connection)
+            product_sales = (
+                select(day, OrderItem.product_id, Product.category,
+                       func.sum(OrderItem.quantity), func.sum(OrderItem.price))
+                .select_from(OrderItem)
+                .join(Order, Order.id == OrderItem.order_id)
+                .join(Product, Product.id == OrderItem.product_id)
+                .group_by(day, OrderItem.product_id, Product.category))
+            connection.execute(insert(DailyProductSales).from_select(
+                ['day', 'product_id', 'category', 'units', 'revenue'], product_sales))
+        connection.execute(insert(DailyCategorySales).from_select(
+            ['day', 'category', 'units', 'revenue'],
+            select(DailyProductSales.day, DailyProductSales.category,
+                   func.sum(DailyProductSales.units), func.sum(DailyProductSales.revenue))
+            .group_by(DailyProductSales.day, DailyProductSales.category)))
+        connection.execute(insert(CategoryInventory).from_select(
+            ['category', 'units', 'value'],
+            select(Product.category, func.sum(Product.stock), func.sum(Product.stock * Product.price))
+            .group_by(Product.category)))
+        return connection.execute(select(func.count()).select_from(DailyProductSales)).scalar()
+
+
+def _backfill_product_sales_from_shards(connection):
+    """
+        Orders live on the shards and products on the primary, so the join cannot run in SQL:
+        sum the order lines per shard, then add the product categories from the primary.
+    """
+    totals = defaultdict(lambda: [0, 0.0])
+    for key in current_app.extensions['shards'].keys:
+        with db.engines[key].connect() as shard:
+            day = _sale_day(shard)
+            rows = shard.execute(
+                select(day, OrderItem.product_id, func.sum(OrderItem.quantity), func.sum(OrderItem.price))
+                .select_from(OrderItem)
+                .join(Order, Order.id == OrderItem.order_id)
+                .group_by(day, OrderItem.product_id))
+            for sold_on, product_id, units, revenue in rows:
+                total = totals[(sold_on, product_id)]
+                total[0] += units or 0
+                total[1] += revenue or 0.0
+    product_ids = {product_id for _, product_id in totals}
+    categories = dict(connection.execute(
+        select(Product.id, Product.category).where(Product.id.in_(product_ids))).all()) if product_ids else {}
+    rows = [{'day': date.fromisoformat(sold_on) if isinstance(sold_on, str) else sold_on,
+             'product_id': product_id, 'category': category_name(categories[product_id]), 'units': units, 'revenue': revenue}
+            for (sold_on, product_id), (units, revenue) in totals.items() if product_id in categories]
+    if rows:
+        connection.execute(insert(DailyProductSales), rows)
+
+
+@click.command('analytics-backfill')
+@with_appcontext
+def backfill_rollups_command():
+    """Rebuild the sales and inventory rollup tables from existing orders and products."""
+    rows = backfill_rollups()
+    click.echo(f"Rebuilt sales rollups: {rows} product-day rows")
@@ -0,0 +1,198 @@
+from flask_restx import Namespace, Resource, fields
+from flask import request
+from flask_jwt_extended import jwt_required, get_jwt
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select
+from ..models.products import Product, ProductCategory
+from ..models.salesRollups import CategoryInventory, DailyCategorySales, DailyProductSales
+from ..utils import db
+from ..utils.replicas import read_only
+
+analytics_namespace = Namespace('admin/analytics', description='Sales and inventory reports served from pre-aggregated rollups (admins only)')
+
+top_seller_model = analytics_namespace.model('TopSeller', {
+    'product_id': fields.Integer(),
+    'name': fields.String(description='Current product name; null if the product was deleted'),
+    'category': fields.String(),
+    'units': fields.Integer(description='Units sold in the window'),
+    'revenue': fields.Float(description='Revenue in the window')
+})
+
+top_sellers_model = analytics_namespace.model('TopSellers', {
+    'start': fields.Date(),
+    'end': fields.Date(),
+    'products': fields.List(fields.Nested(top_seller_model))
+})
+
+revenue_point_model = analytics_namespace.model('RevenuePoint', {
+    'day': fields.Date(),
+    'category': fields.String(),
+    'units': fields.Integer(),
+    'revenue': fields.Float()
+})
+
+revenue_model = analytics_namespace.model('Revenue', {
+    'start': fields.Date(),
+    'end': fields.Date(),
+    'group_by': fields.String(description='day or category'),
+    'units': fields.Integer(description='Units sold in the window'),
+    'revenue': fields.Float(description='Revenue in the window'),
+    'series': fields.List(fields.Nested(revenue_point_model))
+})
+
+inventory_category_model = analytics_namespace.model('InventoryCategory', {
+    'category': fields.String(),
+    'units': fields.Integer(description='Units in stock'),
+    'value': fields.Float(description='Stock valued at current prices')
+})
+
+inventory_model = analytics_namespace.model('Inventory', {
+    'units': fields.Integer(),
+    'value': fields.Float(),
+    'categories': fields.List(fields.Nested(inventory_category_model))
+})
+
+
+def require_admin():
+    jwt_data = get_jwt()
+    if jwt_data.get('role') != 'admin':
+        analytics_namespace.abort(403, 'Unauthorized. Only admins can view analytics')
+
+
+def parse_date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        analytics_namespace.abort(400, f'{name} must be an ISO date (YYYY-MM-DD)')
+
+
+def parse_category_arg():
+    category = request.args.get('category')
+    if category and category not in ProductCategory.__members__:
+        analytics_namespace.abort(400, 'Invalid category. Category must be phone brands')
+    return category
+
+
+@analytics_namespace.route('/top_sellers')
+class TopSellers(Resource):
+    @analytics_namespace.marshal_with(top_sellers_model)
+    @analytics_namespace.doc(description="Best selling products over the last N days",
+                             params={'days': 'Window length in days, ending today (1-366, default 7)',
+                                     'limit': 'Number of products (1-100, default 10)',
+                                     'category': 'Only products of this phone brand'})
+    @jwt_required()
+    @read_only
+    def get(self):
+        """
+            List the best selling products by units sold over a recent window.
+            Reads the daily product rollup, so the cost depends on the window, not on the number of orders.
+            Returns:
+                The products with their units sold and revenue, best first
+            status codes:
+                200: Success
+                400: Invalid parameters
+                403: Unauthorized
+        """
+        require_admin()
+        days = request.args.get('days', default=7, type=int)
+        if days < 1 or days > 366:
+            analytics_namespace.abort(400, 'days must be between 1 and 366')
+        limit = request.args.get('limit', default=10, type=int)
+        if limit < 1 or limit > 100:
+            analytics_namespace.abort(400, 'limit must be between 1 and 100')
+        category = parse_category_arg()
+        end = datetime.utcnow().date()
+        start = end - timedelta(days=days - 1)
+
+        units = func.sum(DailyProductSales.units)
+        query = (select(DailyProductSales.product_id, DailyProductSales.category,
+                        units.label('units'), func.sum(DailyProductSales.revenue).label('revenue'))
+                 .where(DailyProductSales.day >= start, DailyProductSales.day <= end)
+                 .group_by(DailyProductSales.product_id, DailyProductSales.category)
+                 .order_by(units.desc(), DailyProductSales.product_id)
+                 .limit(limit))
+        if category:
+            query = query.where(DailyProductSales.category == category)
+        rows = db.session.execute(query).mappings().all()
+        names = dict(db.session.execute(
+            select(Product.id, Product.name).where(Product.id.in_([row['product_id'] for row in rows]))).all())
+        products = [dict(row, name=names.get(row['product_id'])) for row in rows]
+        return {'start': start, 'end': end, 'products': products}
+
+
+@analytics_namespace.route('/revenue')
+class Revenue(Resource):
+    @analytics_namespace.marshal_with(revenue_model)
+    @analytics_namespace.doc(description="Revenue and units sold over a date range",
+                             params={'start': 'First day (YYYY-MM-DD), default 30 days ago',
+                                     'end': 'Last day (YYYY-MM-DD), default today',
+                                     'category': 'Only this phone brand',
+                                     'group_by': 'day (default) or category'})
+    @jwt_required()
+    @read_only
+    def get(self):
+        """
+            Report revenue over a time window, per day or per category.
+            Reads the daily category rollup: at most one row per category per day.
+            Returns:
+                The totals for the window and the grouped series
+            status codes:
+                200: Success
+                400: Invalid parameters
+                403: Unauthorized
+        """
+        require_admin()
+        end = parse_date_arg('end', datetime.utcnow().date())
+        start = parse_date_arg('start', end - timedelta(days=29))
+        if start > end:
+            analytics_namespace.abort(400, 'start must not be after end')
+        group_by = request.args.get('group_by', 'day')
+        if group_by not in ('day', 'category'):
+            analytics_namespace.abort(400, 'group_by must be day or category')
+        category = parse_category_arg()
+
+        column = DailyCategorySales.day if group_by == 'day' else DailyCategorySales.category
+        query = (select(column, func.sum(DailyCategorySales.units).label('units'),
+                        func.sum(DailyCategorySales.revenue).label('revenue'))
+                 .where(DailyCategorySales.day >= start, DailyCategorySales.day <= end)
+                 .group_by(column)
+                 .order_by(column))
+        if category:
+            query = query.where(DailyCategorySales.category == category)
+        series = db.session.execute(query).mappings().all()
+        return {
+            'start': start,
+            'end': end,
+            'group_by': group_by,
+            'units': sum(point['units'] for point in series),
+            'revenue': sum(point['revenue'] for point in series),
+            'series': series,
+        }
+
+
+@analytics_namespace.route('/inventory')
+class InventoryValuation(Resource):
+    @analytics_namespace.marshal_with(inventory_model)
+    @analytics_namespace.doc(description="Units in stock and their value at current prices, per category")
+    @jwt_required()
+    @read_only
+    def get(self):
+        """
+            Value the inventory held in stock, per category and in total.
+            Served from the category inventory rollup kept up to date on every product write.
+            Returns:
+                Units and value per category and overall
+            status codes:
+                200: Success
+                403: Unauthorized
+        """
+        require_admin()
+        categories = CategoryInventory.query.order_by(CategoryInventory.category).all()
+        return {
+            'units': sum(row.units for row in categories),
+            'value': sum(row.value for row in categories),
+            'categories': categories,
+        }
@@ -0,0 +1,40 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from ..models.logout import TokenBlockList
+from ..models.users import Admin, User
+from ..utils import cache, db
+
+
+def token_is_blocklisted(jti):
+    """Whether the token was logged out; cached until the jti is added to the blocklist."""
+    return cache.get_or_load('blocklist', jti, lambda: db.session.query(
+        db.session.query(TokenBlockList).filter(TokenBlockList.jti == jti).exists()).scalar())
+
+
+def cached_claims(identity):
+    """
+        The extra JWT claims of an identity: the admin role, or the user id that picks the shard
+        of the user's carts and orders without a lookup per request. Cached until an admin or
+        user with that email is created, deleted or renamed.
+    """
+    def load():
+        if Admin.query.filter_by(email=identity).first():
+            return {'role': 'admin'}
+        user = User.query.filter_by(email=identity).first()
+        if user:
+            return {'uid': user.id}
+        return {}
+    return cache.get_or_load('claims', identity, load)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_changed_identities(session, flush_context):
+    for token in session.new:
+        if isinstance(token, TokenBlockList):
+            cache.invalidate_on_commit(session, 'blocklist', token.jti)
+    for account in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(account, (Admin, User)):
+            history = inspect(account).attrs.email.history
+            for email in (account.email, *history.deleted):
+                if email:
+                    cache.invalidate_on_commit(session, 'claims', email)
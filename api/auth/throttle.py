@@ -0,0 +1,119 @@
+import collections
+import logging
+import math
+import threading
+import time
+from flask import current_app, request
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+
+class _Failures:
+    __slots__ = ('times', 'locked_until')
+
+    def __init__(self):
+        self.times = collections.deque()
+        self.locked_until = 0.0
+
+
+class LoginThrottle:
+    """
+        Failed logins per account and per client IP over a sliding window of
+        LOGIN_THROTTLE_WINDOW seconds, kept in the memory of the process.
+
+        Past its free failures a key waits LOGIN_THROTTLE_DELAY seconds before the next
+        attempt, twice as long after each further failure; at its maximum it is locked out for
+        LOGIN_THROTTLE_LOCKOUT seconds. check() runs before the account lookup and the
+        password hash, so a rejected attempt costs a dictionary lookup and no database query.
+        At most LOGIN_THROTTLE_MAX_KEYS keys are tracked; the least recently failed go first.
+    """
+    def __init__(self, app, clock=time.monotonic):
+        config = app.config
+        self.window = config.get('LOGIN_THROTTLE_WINDOW', 900)
+        self.delay = config.get('LOGIN_THROTTLE_DELAY', 1.0)
+        self.lockout = config.get('LOGIN_THROTTLE_LOCKOUT', 900)
+        self.limits = {
+            'account': (config.get('LOGIN_THROTTLE_ACCOUNT_FREE', 3), config.get('LOGIN_THROTTLE_ACCOUNT_MAX', 10)),
+            'ip': (config.get('LOGIN_THROTTLE_IP_FREE', 20), config.get('LOGIN_THROTTLE_IP_MAX', 50)),
+        }
+        self.max_keys = config.get('LOGIN_THROTTLE_MAX_KEYS', 100000)
+        self.clock = clock
+        self.keys = collections.OrderedDict()
+        self.failures = 0
+        self.rejected = 0
+        self.lockouts = 0
+        self._lock = threading.Lock()
+
+    def _wait(self, key, now):
+        entry = self.keys.get(key)
+        if entry is None:
+            return 0.0
+        while entry.times and entry.times[0] <= now - self.window:
+            entry.times.popleft()
+        if not entry.times and entry.locked_until <= now:
+            del self.keys[key]
+            return 0.0
+        free, _ = self.limits[key[0]]
+        backoff = len(entry.times) - free
+        next_attempt = entry.times[-1] + min(self.delay * 2 ** (backoff - 1), self.lockout) if backoff > 0 else 0.0
+        until = max(entry.locked_until, next_attempt)
+        return until - now if until > now else 0.0
+
+    def check(self, account, ip):
+        """Seconds the attempt has to wait, 0 when it may go ahead."""
+        now = self.clock()
+        with self._lock:
+            wait = max(self._wait(('account', account), now), self._wait(('ip', ip), now))
+            if wait:
+                self.rejected += 1
+            return wait
+
+    def failed(self, account, ip):
+        now = self.clock()
+        with self._lock:
+            self.failures += 1
+            for key in (('account', account), ('ip', ip)):
+                entry = self.keys.get(key)
+                if entry is None:
+                    entry = self.keys[key] = _Failures()
+                    if len(self.keys) > self.max_keys:
+                        self.keys.popitem(last=False)
+                self.keys.move_to_end(key)
+                entry.times.append(now)
+                _, limit = self.limits[key[0]]
+                if len(entry.times) >= limit and entry.locked_until <= now:
+                    entry.locked_until = now + self.lockout
+                    entry.times.clear()
+                    self.lockouts += 1
+                    logger.warning(f"Locked out login {key[0]} {key[1]} for {self.lockout}s after {limit} failures")
+
+    def succeeded(self, account):
+        """A correct password clears the account's failures; those of the IP stay."""
+        with self._lock:
+            self.keys.pop(('account', account), None)
+
+    def snapshot(self):
+        now = self.clock()
+        with self._lock:
+            return {'tracked_keys': len(self.keys),
+                    'locked_keys': sum(1 for entry in self.keys.values() if entry.locked_until > now),
+                    'failures': self.failures, 'rejected': self.rejected, 'lockouts': self.lockouts}
+
+
+def init_login_throttle(app):
+    app.extensions['login_throttle'] = LoginThrottle(app)
+
+
+def login_attempt(realm, email):
+    """
+        The throttle keys of a login to realm ('user' or 'admin') as email, and the response
+        rejecting it with 429 and Retry-After when either key has to wait, else None.
+        Behind proxies the client address comes from X-Forwarded-For (PROXY_FIX_X_FOR).
+    """
+    account, ip = (realm, email.strip().lower()), request.remote_addr
+    wait = current_app.extensions['login_throttle'].check(account, ip)
+    if not wait:
+        return account, ip, None
+    return account, ip, ({"message": "Too many failed login attempts. Try again later"}, 429,
+                         {'Retry-After': str(math.ceil(wait))})
@@ -1,7 +1,8 @@
-from flask_restx import Namespace, Resource, fields, marshal_with
-from flask import request
-from datetime import datetime
+from flask_restx import Namespace, Resource, fields
+from flask import current_app, request
 from ..models.users import User
+from ..carts.guest import guest_cart_cookie, load_guest_cart, merge_guest_cart
+from .throttle import login_attempt
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 import logging
 
@@ -80,7 +81,7 @@ class Login(Resource):
            Authenticate a user with their email and password.
            On successful authentication, returns a JWT access token and a refresh token.
               status codes:
-                - 200: User authenticated
+                - 200: User authenticated; a guest cart sent along is merged into the user's cart
                 - 400: Invalid input data provided
                 - 401: Invalid credentials
                 - 404: User not found
@@ -93,20 +94,40 @@ class Login(Resource):
         if '@' not in data['email']:
             return {"message": "Invalid email address"}, 400
         email = data['email']
+        # Throttled attempts are turned away before the lookup and the password hash
+        account, ip, rejection = login_attempt('user', email)
+        if rejection:
+            return rejection
+        throttle = current_app.extensions['login_throttle']
         user = User.query.filter_by(email=email).first()
         if not user:
+            throttle.failed(account, ip)
             return {"message": "User not found. Please register user!"}, 404
         if user and user.check_password(data['password']):
+            throttle.succeeded(account)
             access_token = create_access_token(identity=email)
             if not access_token:
                 return {"message": "Something went wrong creating the access token"}, 400
             refresh_token = create_refresh_token(identity=email)
             if not refresh_token:
                 return {"message": "Something went wrong creating the refresh token"}, 400
-            return {
+            response = {
                 "access_token": access_token, 
                 "refresh_token": refresh_token
-                }, 200
+                }
+            # A cart built before logging in moves into the user's cart, and the guest cookie is cleared
+            guest_items = load_guest_cart()
+            if guest_items:
+                try:
+                    merged, skipped = merge_guest_cart(user, guest_items)
+                except Exception as e:
+                    # Logging in still works; the guest cart is kept so the next login can merge it
+                    logger.error(f"An error occurred while merging the guest cart of user {user.id}: {str(e)}")
+                    return response, 200
+                response["guest_cart"] = {"merged": merged, "skipped": skipped}
+                return response, 200, {'Set-Cookie': guest_cart_cookie(None)}
+            return response, 200
+        throttle.failed(account, ip)
         return {"message": "Invalid credentials"}, 401
 
 
@@ -0,0 +1,107 @@
+from flask_restx import Namespace, Resource, fields
+from flask import current_app, g, request
+from flask_jwt_extended import verify_jwt_in_request
+from werkzeug.test import EnvironBuilder
+from ..utils import db
+
+import logging
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+batch_namespace = Namespace('batch', description='Run several read requests against the API in one round-trip')
+
+sub_request_model = batch_namespace.model('SubRequest', {
+    'method': fields.String(description='HTTP method; only GET is accepted', default='GET'),
+    'path': fields.String(required=True, description='API path with optional query string, e.g. /products/product?page=2'),
+})
+
+batch_request_model = batch_namespace.model('BatchRequest', {
+    'requests': fields.List(fields.Nested(sub_request_model), required=True),
+})
+
+sub_response_model = batch_namespace.model('SubResponse', {
+    'path': fields.String(),
+    'status': fields.Integer(description='HTTP status of this call'),
+    'body': fields.Raw(description='Decoded JSON body, or text for non-JSON responses'),
+})
+
+batch_response_model = batch_namespace.model('BatchResponse', {
+    'responses': fields.List(fields.Nested(sub_response_model)),
+})
+
+
+def run_sub_request(path, authorization):
+    """
+        Dispatch one GET through the full Flask pipeline inside the current app context,
+        so every call shares this request's database session and its memoised JWT checks.
+        Everything else on g (the decoded token, the replica routing and sticky-writer flags,
+        the requested fields) belongs to one request: each call starts from a clean g and the
+        batch gets its own back afterwards.
+    """
+    path, _, query_string = path.partition('?')
+    headers = {'Authorization': authorization} if authorization else {}
+    builder = EnvironBuilder(path=path, method='GET', query_string=query_string, headers=headers,
+                             environ_base={'REMOTE_ADDR': request.remote_addr})
+    batch_g = vars(g).copy()
+    vars(g).clear()
+    g._jwt_blocklist_memo = batch_g.get('_jwt_blocklist_memo')
+    try:
+        with current_app.request_context(builder.get_environ()):
+            response = current_app.full_dispatch_request()
+    except Exception as e:
+        logger.error(f"Batch call to {path} failed: {str(e)}")
+        db.session.rollback()
+        return {'path': path, 'status': 500, 'body': {'message': 'An unexpected error occurred'}}
+    finally:
+        vars(g).clear()
+        vars(g).update(batch_g)
+    if response.is_streamed:
+        response.close()
+        return {'path': path, 'status': 400, 'body': {'message': 'Streaming endpoints cannot be batched'}}
+    body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+    return {'path': path, 'status': response.status_code, 'body': body}
+
+
+@batch_namespace.route('')
+class Batch(Resource):
+    @batch_namespace.expect(batch_request_model)
+    @batch_namespace.marshal_with(batch_response_model)
+    @batch_namespace.doc(description="Run up to BATCH_MAX_REQUESTS GET requests and return all their responses")
+    def post(self):
+        """
+            Run several GET requests in one round-trip
+            The calls run in order, in process, with the caller's Authorization header.
+            The token is verified once for the whole batch. Writes are not accepted:
+            send them as separate requests so their retries and Idempotency-Keys behave as usual.
+            Returns:
+                The status and body of every call, in request order
+                HTTP status code:
+                - 200: OK (check each call's status)
+                - 400: Bad Request
+                - 401: Invalid token
+        """
+        data = batch_namespace.payload or {}
+        calls = data.get('requests')
+        if not isinstance(calls, list) or not calls:
+            batch_namespace.abort(400, 'requests must be a non-empty list')
+        max_requests = current_app.config['BATCH_MAX_REQUESTS']
+        if len(calls) > max_requests:
+            batch_namespace.abort(400, f'A batch can hold at most {max_requests} requests')
+        for call in calls:
+            if not isinstance(call, dict) or not isinstance(call.get('path'), str) or not call['path'].startswith('/'):
+                batch_namespace.abort(400, 'Every request needs a path starting with /')
+            if call.get('method', 'GET').upper() != 'GET':
+                batch_namespace.abort(400, 'Only GET requests can be batched')
+            if call['path'].split('?')[0].rstrip('/') == '/batch':
+                batch_namespace.abort(400, 'Batches cannot be nested')
+
+        authorization = request.headers.get('Authorization')
+        g._jwt_blocklist_memo = {}
+        try:
+            if authorization:
+                # Fails the whole batch once for a bad or revoked token instead of failing every call
+                verify_jwt_in_request()
+            return {'responses': [run_sub_request(call['path'], authorization) for call in calls]}
+        finally:
+            g.pop('_jwt_blocklist_memo', None)
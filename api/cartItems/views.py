@@ -1,8 +1,12 @@
 from flask_restx import Namespace, Resource, fields
+from datetime import datetime
 from ..models.carts import Cart
 from ..models.cartItems import CartItem
 from ..models.products import Product
+from ..models.stockAlerts import StockAlert
 from ..models.users import User
+from ..utils import db, event_log
+from ..utils.idempotency import idempotent
 from flask_jwt_extended import jwt_required, get_jwt
 import logging
 
@@ -19,11 +23,20 @@ cartItems_model = cartItems_namespace.model('CartItem', {
     "quantity": fields.Integer(required=True, description='Quantity of the product to add to the cart')
 })
 
+def record_stock_alert(product, previous_stock):
+    # Added to the session so the alert commits together with the stock decrement
+    alert = StockAlert.for_decrement(product, previous_stock)
+    if alert:
+        db.session.add(alert)
+
+
 @cartItems_namespace.route('/add')
 class cartItemsResource(Resource):
     @cartItems_namespace.expect(cartItems_model)
     @jwt_required()
-    @cartItems_namespace.doc(description="Add a product to a cart before placing an order")
+    @cartItems_namespace.doc(description="Add a product to a cart before placing an order",
+                             params={'Idempotency-Key': {'in': 'header', 'description': 'Unique key per add; retries with the same key are replayed'}})
+    @idempotent
     def post(self):
         """
              Adds a product to a cart or update the quantity of an existing product in the cart.
@@ -84,16 +97,24 @@ class cartItemsResource(Resource):
         if price <= 0:
             cartItems_namespace.abort(400, {'message': 'Price must be greater than 0'})
         
+        # Keeps the cart from being compacted as stale while it is in use
+        cart.updated_at = datetime.utcnow()
+        
         # Check if the cart item already exists
         existing_item = CartItem.query.filter_by(cart_id=cart_id, product_id=product_id).first()
         if existing_item:
             # Update the existing item's quantity
             existing_item.quantity += quantity
             existing_item.price = existing_item.quantity * product.price
-            product.stock -= existing_item.quantity
+            previous_stock = product.stock
+            # Only the units added now; the rest of the line already holds its stock
+            product.stock -= quantity
+            record_stock_alert(product, previous_stock)
             try:
                 existing_item.save()
                 product.save()
+                event_log.record('cart_item.added', user_id=user_id, cart_id=cart_id,
+                                 product_id=product_id, quantity=quantity)
                 return {'message': 'Product quantity updated in cart'}, 200
             except Exception as e:
                 logger.error(f"An error occurred while trying update product quantity : {str(e)}")
@@ -101,10 +122,14 @@ class cartItemsResource(Resource):
         else:
             # Create a new cart item
             item = CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity, price=price)
+            previous_stock = product.stock
             product.stock -= item.quantity
+            record_stock_alert(product, previous_stock)
             try:
                 item.save()
                 product.save()
+                event_log.record('cart_item.added', user_id=user_id, cart_id=cart_id,
+                                 product_id=product_id, quantity=quantity)
                 return {'message': 'Product added to cart'}, 201
             except Exception as e:
                 logger.error(f"An error occurred while trying to add product to cart: {str(e)}")
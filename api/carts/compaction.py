@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import case, delete, func, select, update
+from ..analytics.rollups import apply_inventory_deltas
+from ..models.cartItems import CartItem
+from ..models.carts import Cart
+from ..models.productFacets import ProductFacet
+from ..models.products import Product, category_name
+from ..products.facets import facet_values
+from ..utils import cache, db, shards
+from ..utils.counters import increment
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+
+class CompactionStats:
+    """Totals of the compactions run by this process, for GET /admin/stats/cart_compaction."""
+    def __init__(self):
+        self.runs = 0
+        self.carts = 0
+        self.items = 0
+        self.units = 0
+        self.last_run_at = None
+        self.last_duration_seconds = None
+        self._lock = threading.Lock()
+
+    def add(self, result, duration):
+        with self._lock:
+            self.runs += 1
+            self.carts += result['carts']
+            self.items += result['items']
+            self.units += result['units']
+            self.last_run_at = datetime.utcnow()
+            self.last_duration_seconds = duration
+
+    def snapshot(self):
+        with self._lock:
+            return {'runs': self.runs, 'carts': self.carts, 'items': self.items, 'units': self.units,
+                    'last_run_at': self.last_run_at, 'last_duration_seconds': self.last_duration_seconds}
+
+
+def init_cart_compaction(app):
+    """Set up the metrics and the periodic compaction (CART_COMPACTION_INTERVAL seconds, 0 disables it)."""
+    from ..utils import scheduler
+    app.extensions['cart_compaction'] = CompactionStats()
+    scheduler.add_job(app, 'carts-compact', app.config.get('CART_COMPACTION_INTERVAL', 0), compact_stale_carts)
+
+
+def compact_stale_carts(max_age=None, batch_size=None):
+    """
+        Delete the carts left untouched for max_age (CART_COMPACTION_MAX_AGE_HOURS by default)
+        and give the stock they reserved back to the products. Carts go batch_size at a time,
+        each batch in its own transaction: one DELETE of the items returning what they held,
+        one DELETE of the carts and one UPDATE adding the released units to every product.
+        Under sharding the carts of each shard are compacted in turn.
+        Returns the number of carts, items and units reclaimed.
+    """
+    started = time.monotonic()
+    max_age = max_age or timedelta(hours=current_app.config['CART_COMPACTION_MAX_AGE_HOURS'])
+    batch_size = batch_size or current_app.config['CART_COMPACTION_BATCH_SIZE']
+    cutoff = datetime.utcnow() - max_age
+    result = {'carts': 0, 'items': 0, 'units': 0}
+    for key in current_app.extensions['shards'].keys or [None]:
+        with shards.on_shard(key):
+            while True:
+                batch = _compact_batch(cutoff, batch_size)
+                if not batch['carts']:
+                    break
+                for name, count in batch.items():
+                    result[name] += count
+    current_app.extensions['cart_compaction'].add(result, time.monotonic() - started)
+    if result['carts']:
+        logger.info(f"Compacted {result['carts']} stale carts, releasing {result['units']} units of stock")
+    return result
+
+
+def _compact_batch(cutoff, batch_size):
+    # A cart's last activity: its last item change, or its creation when it never changed
+    stale = func.coalesce(Cart.updated_at, Cart.created_at) < cutoff
+    try:
+        cart_ids = db.session.execute(
+            select(Cart.id).where(stale).order_by(Cart.id).limit(batch_size)).scalars().all()
+        if not cart_ids:
+            db.session.rollback()
+            return {'carts': 0, 'items': 0, 'units': 0}
+        # Rewriting updated_at as it is locks the carts that are still stale, so an item added
+        # meanwhile either lands before this batch (and the cart is kept) or waits for it
+        claim = (update(Cart.__table__).where(Cart.id.in_(cart_ids), stale)
+                 .values(updated_at=Cart.updated_at))
+        if db.session.get_bind(clause=claim).dialect.update_returning:
+            cart_ids = db.session.execute(claim.returning(Cart.id)).scalars().all()
+        else:
+            db.session.execute(claim)
+            cart_ids = db.session.execute(select(Cart.id).where(Cart.id.in_(cart_ids), stale)).scalars().all()
+        if not cart_ids:
+            db.session.rollback()
+            return {'carts': 0, 'items': 0, 'units': 0}
+        items = delete_cart_items(cart_ids)
+        db.session.execute(delete(Cart.__table__).where(Cart.id.in_(cart_ids)))
+        released = Counter()
+        for product_id, quantity in items:
+            released[product_id] += quantity
+        if released:
+            release_stock(released)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {'carts': len(cart_ids), 'items': len(items), 'units': sum(released.values())}
+
+
+def delete_cart_items(cart_ids):
+    """Delete the items of the carts and return their (product_id, quantity) pairs."""
+    deleted = delete(CartItem.__table__).where(CartItem.cart_id.in_(cart_ids))
+    if db.session.get_bind(clause=deleted).dialect.delete_returning:
+        return db.session.execute(deleted.returning(CartItem.product_id, CartItem.quantity)).all()
+    items = db.session.execute(
+        select(CartItem.product_id, CartItem.quantity).where(CartItem.cart_id.in_(cart_ids))).all()
+    db.session.execute(deleted)
+    return items
+
+
+def release_stock(released):
+    """
+        Add the released units to every product in one UPDATE. The statement bypasses the ORM,
+        so the product facets, category inventory, cached products and live updates are
+        brought in step here.
+    """
+    product_ids = sorted(released)
+    db.session.execute(
+        update(Product).where(Product.id.in_(product_ids))
+        .values(stock=Product.stock + case(released, value=Product.id, else_=0))
+        .execution_options(synchronize_session=False))
+    # Read after the UPDATE, inside its transaction, so the previous stock is exact
+    rows = db.session.execute(select(Product.id, Product.name, Product.category, Product.price, Product.stock)
+                              .where(Product.id.in_(product_ids))).all()
+    deltas = Counter()
+    inventory = defaultdict(lambda: [0, 0.0])
+    live_changes = db.session.info.setdefault('live_product_changes', {})
+    for row in rows:
+        deltas.subtract(facet_values(row.category, row.price, row.stock - released[row.id]))
+        deltas.update(facet_values(row.category, row.price, row.stock))
+        held = inventory[category_name(row.category)]
+        held[0] += released[row.id]
+        held[1] += released[row.id] * (row.price or 0.0)
+        cache.invalidate_on_commit(db.session, 'product', row.id)
+        live_changes[row.id] = {'id': row.id, 'name': row.name, 'price': row.price, 'stock': row.stock,
+                                'category': category_name(row.category), 'deleted': False}
+    connection = db.session.connection()
+    apply_inventory_deltas(connection, inventory)
+    for (facet, value), delta in deltas.items():
+        if delta:
+            increment(connection, ProductFacet.__table__, {'facet': facet, 'value': value}, {'count': delta})
+            db.session.info['facets_changed'] = True
+
+
+@click.command('carts-compact')
+@click.option('--max-age-hours', type=float, default=None, help='Idle time after which a cart is stale')
+@click.option('--batch-size', type=int, default=None, help='Carts deleted per transaction')
+@with_appcontext
+def compact_carts_command(max_age_hours, batch_size):
+    """Delete stale carts and return the stock they held to the products."""
+    result = compact_stale_carts(timedelta(hours=max_age_hours) if max_age_hours else None, batch_size)
+    click.echo(f"Deleted {result['carts']} carts and {result['items']} items, "
+               f"releasing {result['units']} units of stock")
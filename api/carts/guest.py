@@ -0,0 +1,102 @@
+from datetime import datetime
+from flask import current_app, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.http import dump_cookie
+from ..models.carts import Cart
+from ..models.cartItems import CartItem
+from ..models.products import Product
+from ..models.stockAlerts import StockAlert
+from ..utils import db, event_log, shards
+import logging
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_HEADER = 'X-Guest-Cart'
+
+
+class GuestCartTooLarge(ValueError):
+    pass
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='guest-cart')
+
+
+def load_guest_cart():
+    """
+        The guest cart sent with the request as {product_id: quantity}, from the X-Guest-Cart
+        header or the guest_cart cookie. A missing, tampered or expired cart is an empty one.
+    """
+    token = request.headers.get(GUEST_CART_HEADER) or request.cookies.get(GUEST_CART_COOKIE)
+    if not token:
+        return {}
+    try:
+        lines = _serializer().loads(token, max_age=current_app.config['GUEST_CART_MAX_AGE'])
+        return {int(product_id): int(quantity) for product_id, quantity in lines}
+    except (BadSignature, TypeError, ValueError):
+        logger.info("Ignoring an invalid or expired guest cart")
+        return {}
+
+
+def dump_guest_cart(items):
+    """Sign a guest cart into a token, refusing carts over GUEST_CART_MAX_ITEMS lines or GUEST_CART_MAX_BYTES."""
+    if len(items) > current_app.config['GUEST_CART_MAX_ITEMS']:
+        raise GuestCartTooLarge(f"A guest cart holds at most {current_app.config['GUEST_CART_MAX_ITEMS']} products")
+    token = _serializer().dumps(sorted(items.items()))
+    if len(token) > current_app.config['GUEST_CART_MAX_BYTES']:
+        raise GuestCartTooLarge("The guest cart is too large; log in to keep adding products")
+    return token
+
+
+def guest_cart_cookie(token):
+    """Set-Cookie header value storing the token, or clearing the cookie when token is None."""
+    if token is None:
+        return dump_cookie(GUEST_CART_COOKIE, '', max_age=0, httponly=True, samesite='Lax')
+    return dump_cookie(GUEST_CART_COOKIE, token, max_age=current_app.config['GUEST_CART_MAX_AGE'],
+                       httponly=True, samesite='Lax', secure=request.is_secure)
+
+
+def merge_guest_cart(user, items):
+    """
+        Move a guest cart into the user's server-side cart in one transaction: one query for the
+        products, one for the cart's existing lines, one commit. Stock is reserved now, as when
+        adding to a cart; products that are gone or short of stock are skipped and reported.
+    """
+    with shards.use_shard(user.id):
+        products = {product.id: product for product in Product.query.filter(Product.id.in_(list(items)))}
+        cart = Cart.query.filter_by(user_id=user.id).first()
+        if not cart:
+            cart = Cart(user_id=user.id)
+            db.session.add(cart)
+            existing = {}
+        else:
+            existing = {item.product_id: item for item in cart.items}
+            cart.updated_at = datetime.utcnow()
+        merged, skipped = [], []
+        for product_id, quantity in sorted(items.items()):
+            product = products.get(product_id)
+            if not product or quantity <= 0 or product.stock < quantity:
+                skipped.append(product_id)
+                continue
+            item = existing.get(product_id)
+            if item:
+                item.quantity += quantity
+                item.price = item.quantity * product.price
+            else:
+                cart.items.append(CartItem(product_id=product_id, quantity=quantity, price=quantity * product.price))
+            previous_stock = product.stock
+            product.stock -= quantity
+            alert = StockAlert.for_decrement(product, previous_stock)
+            if alert:
+                db.session.add(alert)
+            merged.append(product_id)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        cart_id = cart.id
+    event_log.record('cart.guest_merged', user_id=user.id, cart_id=cart_id, merged=merged, skipped=skipped)
+    return merged, skipped
@@ -1,9 +1,15 @@
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource, fields, marshal
 from flask import request
-from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt
 from ..models.carts import Cart
 from ..models.users import User
 from ..models.cartItems import CartItem
+from sqlalchemy import select
+from ..utils import db, event_log, shards
+from ..utils.replicas import read_only
+from ..utils.fieldsets import marshal_with_fields, only_requested_columns
+from ..products.cache import cached_product
+from .guest import GuestCartTooLarge, dump_guest_cart, guest_cart_cookie, load_guest_cart
 import logging
 
 # Create a logger instance
@@ -53,6 +59,42 @@ cart_list_model = cart_namespace.model('CartResponse', {
     'pagination': fields.Nested(pagination_model)
 })
 
+guest_item_model = cart_namespace.model('GuestCartItemInput', {
+    "product_id": fields.Integer(required=True, description='ID of the product to add to the guest cart'),
+    "quantity": fields.Integer(required=True, description='Quantity to add')
+})
+
+guest_line_model = cart_namespace.model('GuestCartLine', {
+    "product_id": fields.Integer(),
+    "name": fields.String(),
+    "quantity": fields.Integer(),
+    "unit_price": fields.Float(),
+    "price": fields.Float(description='unit_price * quantity at the current product price')
+})
+
+guest_cart_model = cart_namespace.model('GuestCart', {
+    'items': fields.List(fields.Nested(guest_line_model)),
+    'total': fields.Float(),
+    'guest_cart': fields.String(description='Signed cart token; also set as the guest_cart cookie. '
+                                            'Clients without cookies send it back in the X-Guest-Cart header')
+})
+
+
+def guest_cart_response(items, status=200):
+    """The guest cart priced from the products table (read only), with its token and cookie."""
+    try:
+        token = dump_guest_cart(items)
+    except GuestCartTooLarge as e:
+        cart_namespace.abort(400, str(e))
+    products = {product_id: cached_product(product_id) for product_id in items}
+    lines = [{"product_id": product_id, "name": products[product_id]['name'], "quantity": quantity,
+              "unit_price": products[product_id]['price'], "price": products[product_id]['price'] * quantity}
+             for product_id, quantity in sorted(items.items()) if products[product_id]]
+    body = marshal({"items": lines, "total": sum(line['price'] for line in lines), "guest_cart": token},
+                   guest_cart_model)
+    return body, status, {'Set-Cookie': guest_cart_cookie(token)}
+
+
 @cart_namespace.route('/create_cart')
 class CreateCart(Resource):
     # @cart_namespace.expect(cart_model)
@@ -75,7 +117,7 @@ class CreateCart(Resource):
         user_email = jwt_data['sub']
         user = User.query.filter_by(email=user_email).first()
         if not user:
-            cart_namespace.abort(404, f"User not found")
+            cart_namespace.abort(404, "User not found")
         existing_cart = Cart.query.filter_by(user_id=user.id).first()
         if existing_cart:
             cart_namespace.abort(400, f"Cart already exists for this user with id {user.id}")
@@ -111,12 +153,14 @@ class DeleteCart(Resource):
             cart_namespace.abort(401, "Invalid or missing authorization token")
         user = User.query.filter_by(email=user_email).first()
         if not user:
-            cart_namespace.abort(404, f"User not found")
+            cart_namespace.abort(404, "User not found")
         cart = Cart.query.filter_by(user_id=user.id).first()
         if not cart:
             cart_namespace.abort(404, f"Cart not found for user with ID {user.id}")
+        cart_id = cart.id
         try:
             cart.delete()
+            event_log.record('cart.deleted', user_id=user.id, cart_id=cart_id)
             return {"message": f"Cart for user with ID {user.id} deleted successfully"}, 200
         except Exception as e:
             logger.error(f"An error occurred while trying to delete cart for user {user_email}: {str(e)}")
@@ -124,7 +168,7 @@ class DeleteCart(Resource):
         
 @cart_namespace.route('/cart_items/all')
 class GetAllCartItems(Resource):
-    @cart_namespace.marshal_with(cart_items_model)
+    @marshal_with_fields(cart_namespace, cart_items_model, cart_item_model, list_key='cart_items')
     @jwt_required()
     @cart_namespace.doc(description="Retrieve all items in a user's cart")
     def get(self):
@@ -153,7 +197,8 @@ class GetAllCartItems(Resource):
         page = request.args.get('page', default=1, type=int)
         per_page = request.args.get('per_page', default=5, type=int)
         try:
-            paginated_cart_items = CartItem.query.filter_by(cart_id=cart.id).paginate(page=page, per_page=per_page)
+            query = only_requested_columns(CartItem.query.filter_by(cart_id=cart.id), CartItem)
+            paginated_cart_items = query.paginate(page=page, per_page=per_page)
             if page > paginated_cart_items.pages:
                 cart_namespace.abort(400, "Page number out of range")
             if per_page > 50:
@@ -178,6 +223,7 @@ class GetAllCarts(Resource):
     @cart_namespace.marshal_with(cart_list_model)
     @jwt_required()
     @cart_namespace.doc(description="Retrieve all carts for all users")
+    @read_only
     def get(self):
         """
            Fetches all carts in the system with support for pagination. 
@@ -194,7 +240,10 @@ class GetAllCarts(Resource):
         try:
             page = request.args.get('page', default=1, type=int)
             per_page = request.args.get('per_page', default=5, type=int)
-            carts = Cart.query.paginate(page=page, per_page=per_page)
+            if shards.enabled():
+                carts = shards.paginate(db, select(Cart).order_by(Cart.id), page=page, per_page=per_page)
+            else:
+                carts = Cart.query.paginate(page=page, per_page=per_page)
             if not carts:
                 cart_namespace.abort(404, "No carts found")
             if page < 1:
@@ -252,9 +301,82 @@ class DeleteItem(Resource):
             cart_namespace.abort(404, f"Cart item not found for cart with ID {cart.id}")
         if cart_item.cart_id != cart.id:
             cart_namespace.abort(400, "Cart item does not belong to this cart")
+        event = {'cart_id': cart.id, 'cart_item_id': id,
+                 'product_id': cart_item.product_id, 'quantity': cart_item.quantity}
         try:
             cart_item.delete()
+            event_log.record('cart_item.deleted', user_id=user.id, **event)
             return {"message": "Cart item deleted successfully"}, 200
         except Exception as e:
             logger.error(f"An error occurred while deleting cart item with ID {id}: {str(e)}")
-            cart_namespace.abort(500, "Failed to delete cart item")
\ No newline at end of file
+            cart_namespace.abort(500, "Failed to delete cart item")
+
+
+@cart_namespace.route('/guest')
+class GuestCart(Resource):
+    @cart_namespace.response(200, 'Success', guest_cart_model)
+    @cart_namespace.doc(description="Show the cart of a visitor who is not logged in")
+    @read_only
+    def get(self):
+        """
+            Show a guest cart. Guest carts live in a signed token (guest_cart cookie or
+            X-Guest-Cart header), not in the database, and are merged into the user's cart on login.
+            Returns:
+                The guest cart's products with current prices, and its token.
+            status codes:
+                200: Guest cart retrieved successfully
+        """
+        return guest_cart_response(load_guest_cart())
+
+
+@cart_namespace.route('/guest/items')
+class GuestCartItems(Resource):
+    @cart_namespace.expect(guest_item_model)
+    @cart_namespace.response(200, 'Success', guest_cart_model)
+    @cart_namespace.doc(description="Add a product to the cart of a visitor who is not logged in")
+    @read_only
+    def post(self):
+        """
+            Add a product to a guest cart without touching the database: the product and its stock
+            are only read, and the updated cart is returned as a new signed token. Stock is reserved
+            when the cart is merged on login.
+            Returns:
+                The updated guest cart and its token.
+            status codes:
+                200: Product added to the guest cart
+                400: Invalid quantity, not enough stock or the guest cart is full
+                404: Product not found
+        """
+        data = request.get_json(silent=True) or {}
+        product_id = data.get('product_id')
+        quantity = data.get('quantity')
+        if not isinstance(product_id, int) or not isinstance(quantity, int) or quantity <= 0:
+            cart_namespace.abort(400, 'product_id and a quantity greater than 0 are required')
+        product = cached_product(product_id)
+        if not product:
+            cart_namespace.abort(404, 'Product not found')
+        items = load_guest_cart()
+        items[product_id] = items.get(product_id, 0) + quantity
+        if product['stock'] < items[product_id]:
+            cart_namespace.abort(400, 'Quantity exceeds available stock or stock is empty')
+        return guest_cart_response(items)
+
+
+@cart_namespace.route('/guest/items/<int:product_id>')
+class GuestCartItem(Resource):
+    @cart_namespace.response(200, 'Success', guest_cart_model)
+    @cart_namespace.doc(description="Remove a product from the cart of a visitor who is not logged in")
+    @read_only
+    def delete(self, product_id):
+        """
+            Remove a product from a guest cart.
+            Returns:
+                The updated guest cart and its token.
+            status codes:
+                200: Product removed from the guest cart
+                404: Product not in the guest cart
+        """
+        items = load_guest_cart()
+        if items.pop(product_id, None) is None:
+            cart_namespace.abort(404, 'Product not in the guest cart')
+        return guest_cart_response(items)
@@ -1,5 +1,5 @@
 import os
-from decouple import config
+from decouple import config, Csv
 from datetime import timedelta
 
 BASE_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -9,6 +9,108 @@ class Config:
     JWT_SECRET_KEY = config('JWT_SECRET_KEY')
     access_token_expire = timedelta(minutes=30)
     refresh_token_expire = timedelta(days=30)
+    # werkzeug password hashing method; the method is stored with each hash, so changing it keeps old hashes valid
+    PASSWORD_HASH_METHOD = config('PASSWORD_HASH_METHOD', default='scrypt')
+    # Audit event log: bounded queue drained by a background writer thread.
+    # EVENT_LOG_BACKPRESSURE is 'drop' (discard when full) or 'block' (wait up to EVENT_LOG_BLOCK_TIMEOUT, then discard)
+    EVENT_LOG_QUEUE_SIZE = config('EVENT_LOG_QUEUE_SIZE', default=10000, cast=int)
+    EVENT_LOG_BATCH_SIZE = config('EVENT_LOG_BATCH_SIZE', default=500, cast=int)
+    EVENT_LOG_FLUSH_INTERVAL = config('EVENT_LOG_FLUSH_INTERVAL', default=0.5, cast=float)
+    EVENT_LOG_BACKPRESSURE = config('EVENT_LOG_BACKPRESSURE', default='drop')
+    EVENT_LOG_BLOCK_TIMEOUT = config('EVENT_LOG_BLOCK_TIMEOUT', default=0.05, cast=float)
+    # Read replicas for read-only endpoints, e.g. REPLICA_DATABASE_URIS=sqlite:///replica1.sqlite3,sqlite:///replica2.sqlite3
+    # Users who wrote within REPLICA_STICKY_SECONDS keep reading from the primary, on any worker:
+    # writes hand back a signed primary_reads cookie and X-Primary-Reads header carrying the marker
+    REPLICA_DATABASE_URIS = config('REPLICA_DATABASE_URIS', default='', cast=Csv())
+    REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5.0, cast=float)
+    # Databases holding carts and orders, split by user_id, e.g. SHARD_DATABASE_URIS=sqlite:///shard0.sqlite3,sqlite:///shard1.sqlite3
+    # Create their tables with `flask shards-init`; when empty everything stays on the primary
+    SHARD_DATABASE_URIS = config('SHARD_DATABASE_URIS', default='', cast=Csv())
+    # Start-up: LAZY_NAMESPACES imports the views on the first request instead of in create_app,
+    # SWAGGER_SPEC_PATH serves a swagger.json built with `flask openapi-export`, SWAGGER_UI_ENABLED toggles the docs page
+    LAZY_NAMESPACES = config('LAZY_NAMESPACES', default=False, cast=bool)
+    SWAGGER_SPEC_PATH = config('SWAGGER_SPEC_PATH', default='')
+    SWAGGER_UI_ENABLED = config('SWAGGER_UI_ENABLED', default=True, cast=bool)
+    # Bulk user deletion: users removed per transaction and the pause between transactions.
+    # A job of another process that made no progress for USER_PURGE_TIMEOUT seconds is abandoned
+    USER_PURGE_CHUNK_SIZE = config('USER_PURGE_CHUNK_SIZE', default=500, cast=int)
+    USER_PURGE_PAUSE = config('USER_PURGE_PAUSE', default=0.01, cast=float)
+    USER_PURGE_TIMEOUT = config('USER_PURGE_TIMEOUT', default=600, cast=int)
+    # Live product updates over Server-Sent Events (GET /products/stream).
+    # Each connection buffers at most PUBSUB_BUFFER_SIZE distinct products; updates arriving within
+    # SSE_COALESCE_SECONDS are sent together, and streams end after SSE_MAX_STREAM_SECONDS so clients reconnect
+    PUBSUB_BUFFER_SIZE = config('PUBSUB_BUFFER_SIZE', default=100, cast=int)
+    PUBSUB_MAX_SUBSCRIBERS = config('PUBSUB_MAX_SUBSCRIBERS', default=1000, cast=int)
+    SSE_HEARTBEAT_SECONDS = config('SSE_HEARTBEAT_SECONDS', default=15.0, cast=float)
+    SSE_COALESCE_SECONDS = config('SSE_COALESCE_SECONDS', default=0.25, cast=float)
+    SSE_MAX_STREAM_SECONDS = config('SSE_MAX_STREAM_SECONDS', default=300.0, cast=float)
+    SSE_MAX_TOPICS = config('SSE_MAX_TOPICS', default=50, cast=int)
+    # Response compression negotiated from Accept-Encoding (gzip or deflate).
+    # Bodies under COMPRESS_MIN_SIZE bytes are sent as they are; COMPRESS_LEVEL trades CPU for size (1-9)
+    COMPRESS_ENABLED = config('COMPRESS_ENABLED', default=True, cast=bool)
+    COMPRESS_LEVEL = config('COMPRESS_LEVEL', default=6, cast=int)
+    COMPRESS_MIN_SIZE = config('COMPRESS_MIN_SIZE', default=500, cast=int)
+    COMPRESS_MIMETYPES = config('COMPRESS_MIMETYPES', default='application/json,text/plain,text/html', cast=Csv())
+    # Idempotency-Key: outcomes are replayed to retries for IDEMPOTENCY_TTL_SECONDS, from any worker; a retry
+    # arriving while the first request is still running waits up to IDEMPOTENCY_WAIT_SECONDS for it. A request
+    # still in flight after IDEMPOTENCY_LEASE_SECONDS is taken for dead and its key can be claimed again
+    IDEMPOTENCY_TTL_SECONDS = config('IDEMPOTENCY_TTL_SECONDS', default=86400, cast=int)
+    IDEMPOTENCY_WAIT_SECONDS = config('IDEMPOTENCY_WAIT_SECONDS', default=10.0, cast=float)
+    IDEMPOTENCY_LEASE_SECONDS = config('IDEMPOTENCY_LEASE_SECONDS', default=300.0, cast=float)
+    # POST /batch: maximum number of GET calls in one batch
+    BATCH_MAX_REQUESTS = config('BATCH_MAX_REQUESTS', default=20, cast=int)
+    # Guest carts are signed tokens kept by the client: products per cart, token size and lifetime in seconds
+    GUEST_CART_MAX_ITEMS = config('GUEST_CART_MAX_ITEMS', default=20, cast=int)
+    GUEST_CART_MAX_BYTES = config('GUEST_CART_MAX_BYTES', default=2048, cast=int)
+    GUEST_CART_MAX_AGE = config('GUEST_CART_MAX_AGE', default=7 * 24 * 3600, cast=int)
+    # POST /orders/transitions: maximum number of orders moved in one request
+    ORDERS_BULK_MAX = config('ORDERS_BULK_MAX', default=10000, cast=int)
+    # GET /products/facets: served from memory, reloaded after FACETS_CACHE_SECONDS.
+    # The counts are checked against the products table every FACETS_RECONCILE_INTERVAL seconds (0 disables it)
+    FACETS_CACHE_SECONDS = config('FACETS_CACHE_SECONDS', default=5.0, cast=float)
+    FACETS_RECONCILE_INTERVAL = config('FACETS_RECONCILE_INTERVAL', default=3600, cast=int)
+    # Background jobs (post-checkout work): worker threads per process, attempts before a job is dead,
+    # first retry delay (doubled on every retry, up to JOBS_BACKOFF_MAX_SECONDS) and how often workers
+    # look for jobs queued by other processes. A job running longer than JOBS_LEASE_SECONDS is run again.
+    JOBS_WORKERS = config('JOBS_WORKERS', default=2, cast=int)
+    JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=5, cast=int)
+    JOBS_BACKOFF_SECONDS = config('JOBS_BACKOFF_SECONDS', default=2.0, cast=float)
+    JOBS_BACKOFF_MAX_SECONDS = config('JOBS_BACKOFF_MAX_SECONDS', default=300.0, cast=float)
+    JOBS_POLL_SECONDS = config('JOBS_POLL_SECONDS', default=5.0, cast=float)
+    JOBS_LEASE_SECONDS = config('JOBS_LEASE_SECONDS', default=300.0, cast=float)
+    # Product, blocklist and JWT claim lookups are cached for CACHE_TTL seconds. CACHE_BACKEND 'memory' keeps
+    # entries in each process (up to CACHE_MAX_ENTRIES); 'sqlite' shares them between the workers of a host
+    # through the file at CACHE_SQLITE_PATH (a file per database in the temp directory by default)
+    CACHE_BACKEND = config('CACHE_BACKEND', default='memory')
+    CACHE_SQLITE_PATH = config('CACHE_SQLITE_PATH', default='')
+    CACHE_TTL = config('CACHE_TTL', default=60.0, cast=float)
+    CACHE_MAX_ENTRIES = config('CACHE_MAX_ENTRIES', default=10000, cast=int)
+    # Carts idle for CART_COMPACTION_MAX_AGE_HOURS are deleted and their stock released every
+    # CART_COMPACTION_INTERVAL seconds (0 disables it), CART_COMPACTION_BATCH_SIZE carts per transaction
+    CART_COMPACTION_MAX_AGE_HOURS = config('CART_COMPACTION_MAX_AGE_HOURS', default=72.0, cast=float)
+    CART_COMPACTION_INTERVAL = config('CART_COMPACTION_INTERVAL', default=3600, cast=int)
+    CART_COMPACTION_BATCH_SIZE = config('CART_COMPACTION_BATCH_SIZE', default=500, cast=int)
+    # `flask orders-archive` moves delivered and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS into gzip
+    # NDJSON segments under ORDER_ARCHIVE_DIR, ORDER_ARCHIVE_CHUNK_SIZE orders per transaction. Each compressed
+    # block holds ORDER_ARCHIVE_BLOCK_SIZE orders: larger blocks compress better, smaller ones read faster
+    ORDER_ARCHIVE_DIR = config('ORDER_ARCHIVE_DIR', default=os.path.join(BASE_DIR, 'order_archive'))
+    ORDER_ARCHIVE_AFTER_DAYS = config('ORDER_ARCHIVE_AFTER_DAYS', default=365, cast=int)
+    ORDER_ARCHIVE_CHUNK_SIZE = config('ORDER_ARCHIVE_CHUNK_SIZE', default=500, cast=int)
+    ORDER_ARCHIVE_BLOCK_SIZE = config('ORDER_ARCHIVE_BLOCK_SIZE', default=50, cast=int)
+    # Failed logins are counted per account and per client IP over LOGIN_THROTTLE_WINDOW seconds. Past its
+    # _FREE failures a key waits LOGIN_THROTTLE_DELAY seconds, doubled at each further failure, before it may
+    # try again; at its _MAX failures it is locked out for LOGIN_THROTTLE_LOCKOUT seconds
+    LOGIN_THROTTLE_WINDOW = config('LOGIN_THROTTLE_WINDOW', default=900, cast=int)
+    LOGIN_THROTTLE_DELAY = config('LOGIN_THROTTLE_DELAY', default=1.0, cast=float)
+    LOGIN_THROTTLE_LOCKOUT = config('LOGIN_THROTTLE_LOCKOUT', default=900, cast=int)
+    LOGIN_THROTTLE_ACCOUNT_FREE = config('LOGIN_THROTTLE_ACCOUNT_FREE', default=3, cast=int)
+    LOGIN_THROTTLE_ACCOUNT_MAX = config('LOGIN_THROTTLE_ACCOUNT_MAX', default=10, cast=int)
+    LOGIN_THROTTLE_IP_FREE = config('LOGIN_THROTTLE_IP_FREE', default=20, cast=int)
+    LOGIN_THROTTLE_IP_MAX = config('LOGIN_THROTTLE_IP_MAX', default=50, cast=int)
+    LOGIN_THROTTLE_MAX_KEYS = config('LOGIN_THROTTLE_MAX_KEYS', default=100000, cast=int)
+    # Number of reverse proxies in front of the app that append to X-Forwarded-For. The client address the
+    # login throttle keys on is then read from that header; 0 trusts REMOTE_ADDR as is
+    PROXY_FIX_X_FOR = config('PROXY_FIX_X_FOR', default=0, cast=int)
 
 class DevConfig(Config):
     DEBUG = True
@@ -27,7 +129,12 @@ class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://' # use in-memory sqlite database
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO = True
+    SQLALCHEMY_ECHO = config('TEST_SQL_ECHO', default=False, cast=bool) # TEST_SQL_ECHO=1 logs every statement
+    # A single iteration keeps the many register/login calls of the suite cheap
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1'
+    FACETS_RECONCILE_INTERVAL = 0 # tests run reconciliation explicitly
+    JOBS_WORKERS = 0 # tests run queued jobs with jobs.run_pending()
+    CART_COMPACTION_INTERVAL = 0 # tests compact carts explicitly
     
     
 config_dict = {
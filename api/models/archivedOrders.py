@@ -0,0 +1,21 @@
+from ..utils import db
+from datetime import datetime
+
+# Where an order moved to cold storage lives: a gzip member of an NDJSON segment file
+class ArchivedOrder(db.Model):
+    __tablename__ = 'archived_orders'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # Name of the shard the order came from ('' without sharding): order ids repeat across shards
+    shard = db.Column(db.String(50), nullable=False, default='')
+    order_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    segment = db.Column(db.String(255), nullable=False)
+    # Byte range of the compressed block holding the order within the segment
+    offset = db.Column(db.Integer, nullable=False)
+    length = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('shard', 'order_id', name='uq_archived_orders_shard_order'),
+        db.Index('ix_archived_orders_user_id', 'user_id'),
+    )
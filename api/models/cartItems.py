@@ -3,7 +3,7 @@ from ..utils import db
 class CartItem(db.Model):
     __tablename__ = "cart_items"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False)
+    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, default=0.0, nullable=False)
@@ -0,0 +1,11 @@
+from ..utils import db
+from datetime import datetime
+
+class AuditEvent(db.Model):
+    __tablename__ = 'audit_events'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event_type = db.Column(db.String(50), nullable=False, index=True)
+    # No foreign key: the log is append-only and must outlive the users it mentions
+    user_id = db.Column(db.Integer, index=True)
+    payload = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,26 @@
+from ..utils import db
+from datetime import datetime
+
+class IdempotencyKey(db.Model):
+    """
+        The claim and the outcome of a request sent with an Idempotency-Key, shared by every
+        worker through the database. The unique scope lets exactly one request claim a key.
+    """
+    __tablename__ = 'idempotency_keys'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    identity = db.Column(db.String(255), nullable=False)
+    method = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # in_flight while the first request runs, then completed with the response to replay
+    status = db.Column(db.String(20), nullable=False, default='in_flight')
+    response = db.Column(db.Text)
+    # An in-flight claim past its lease belongs to a worker that died; a retry takes it over
+    locked_until = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('identity', 'method', 'path', 'key', name='uq_idempotency_keys_scope'),
+    )
@@ -4,7 +4,7 @@ from datetime import datetime
 class TokenBlockList(db.Model):
     __tablename__ = 'token_blocklist'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    jti = db.Column(db.String(120), nullable=False)
+    jti = db.Column(db.String(120), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def save(self):
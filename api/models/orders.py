@@ -1,19 +1,53 @@
-from ..utils import db 
+from ..utils import db
 from datetime import datetime
+from sqlalchemy.orm import validates
+
+# Allowed moves of Order.status; delivered and cancelled are final
+ORDER_TRANSITIONS = {
+    'pending': ('paid', 'cancelled'),
+    'paid': ('shipped', 'cancelled'),
+    'shipped': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+
+
+def statuses_leading_to(status):
+    """The statuses an order may be in to move to `status`."""
+    return tuple(source for source, targets in ORDER_TRANSITIONS.items() if status in targets)
+
+
+class InvalidTransition(ValueError):
+    pass
+
 
 class Order(db.Model):
     __tablename__ = 'orders'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     # total = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(50), default='pending')
     items = db.relationship('OrderItem', backref='order', lazy=True)
-    
+
+    # Admin queues list the orders in one status by id, straight from this index
+    __table_args__ = (
+        db.Index('ix_orders_status', 'status', 'id'),
+    )
+
+    @validates('status')
+    def validate_status(self, key, status):
+        if status not in ORDER_TRANSITIONS:
+            raise InvalidTransition(f"Unknown order status {status!r}")
+        current = self.status
+        if current is not None and current != status and status not in ORDER_TRANSITIONS.get(current, ()):
+            raise InvalidTransition(f"Order {self.id} cannot move from {current} to {status}")
+        return status
+
     def save(self):
         db.session.add(self)
         db.session.commit()
-        
+
     def delete(self):
         db.session.delete(self)
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
@@ -0,0 +1,12 @@
+from ..utils import db
+
+
+class ProductFacet(db.Model):
+    """
+        Number of in-stock products per facet value: facet is 'category' (value = brand)
+        or 'price' (value = bucket label). Maintained from product writes, see products/facets.py.
+    """
+    __tablename__ = 'product_facets'
+    facet = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(30), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
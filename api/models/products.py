@@ -1,6 +1,7 @@
 from ..utils import db
 from datetime import datetime
 from enum import Enum
+from sqlalchemy import event
 
 class ProductCategory(Enum):
     iphone = 'iphone',
@@ -25,6 +26,11 @@ class ProductCategory(Enum):
     lenovo = 'lenovo',
     
 
+def category_name(category):
+    # Product.category holds the enum once loaded but the raw string right after assignment
+    return category.name if isinstance(category, ProductCategory) else category
+
+
 class Product(db.Model):
     __tablename__ = 'products'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -33,14 +39,31 @@ class Product(db.Model):
     price = db.Column(db.Float, nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=0)
     stock = db.Column(db.Integer, nullable=False, default=0)
+    # Stock level below which the product needs reordering
+    reorder_threshold = db.Column(db.Integer, nullable=False, default=5, server_default='5')
     category = db.Column(db.Enum(ProductCategory), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
     
+    # Partial index holding only the products below their reorder threshold, so the
+    # low-stock listing reads the matches instead of scanning the catalogue.
+    # Backends without partial indexes ignore the WHERE and index stock for every row.
+    __table_args__ = (
+        db.Index('ix_products_low_stock', 'stock', 'id',
+                 sqlite_where=db.text('stock < reorder_threshold'),
+                 postgresql_where=db.text('stock < reorder_threshold')),
+    )
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         if self.stock is None:
             self.stock = 0
+        if self.reorder_threshold is None:
+            self.reorder_threshold = 5
+    
+    def crossed_reorder_threshold(self, previous_stock):
+        """True when a decrement from previous_stock took the product below its reorder threshold."""
+        return previous_stock >= self.reorder_threshold > self.stock
     
     def save(self):
         db.session.add(self)
@@ -48,4 +71,46 @@ class Product(db.Model):
     
     def delete(self):
         db.session.delete(self)
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+
+# Full-text index over products (SQLite FTS5). It is an external-content table,
+# so it stores only the index; triggers keep it in sync with the products table.
+# The update trigger only fires for indexed columns, so stock changes do not touch it.
+PRODUCT_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description, category,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description, category ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+]
+
+
+def create_product_search_index(connection):
+    for statement in PRODUCT_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Product.__table__, 'after_create')
+def _create_product_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        create_product_search_index(connection)
+
+
+@event.listens_for(Product.__table__, 'before_drop')
+def _drop_product_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql("DROP TABLE IF EXISTS products_fts")
@@ -0,0 +1,29 @@
+from ..utils import db
+from datetime import datetime
+
+class PurgeJob(db.Model):
+    __tablename__ = 'purge_jobs'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    chunk_size = db.Column(db.Integer, nullable=False)
+    total_users = db.Column(db.Integer)
+    deleted_users = db.Column(db.Integer, nullable=False, default=0)
+    deleted_carts = db.Column(db.Integer, nullable=False, default=0)
+    deleted_orders = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    # At most one pending or running job: every active row has the same indexed value,
+    # so a second concurrent claim fails with an IntegrityError instead of racing a check.
+    __table_args__ = (
+        db.Index('uq_purge_jobs_active', db.text("(status IN ('pending', 'running'))"), unique=True,
+                 sqlite_where=db.text("status IN ('pending', 'running')"),
+                 postgresql_where=db.text("status IN ('pending', 'running')")),
+    )
+    
+    def save(self):
+        db.session.add(self)
+        db.session.commit()
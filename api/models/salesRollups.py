@@ -0,0 +1,28 @@
+from ..utils import db
+
+
+# Pre-aggregated sales and inventory figures for the admin analytics endpoints.
+# Product ids are kept without a foreign key so history survives product deletion.
+
+class DailyProductSales(db.Model):
+    __tablename__ = 'daily_product_sales'
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True, index=True)
+    category = db.Column(db.String(20), nullable=False)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class DailyCategorySales(db.Model):
+    __tablename__ = 'daily_category_sales'
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(20), primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class CategoryInventory(db.Model):
+    __tablename__ = 'category_inventory'
+    category = db.Column(db.String(20), primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    value = db.Column(db.Float, nullable=False, default=0.0)
@@ -0,0 +1,22 @@
+from ..utils import db
+from datetime import datetime
+
+class StockAlert(db.Model):
+    """
+        One row per stock decrement that took a product below its reorder threshold.
+        Written in the same transaction as the decrement; admins read it as a feed by id.
+    """
+    __tablename__ = 'stock_alerts'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # No foreign key: alerts outlive the products they mention
+    product_id = db.Column(db.Integer, nullable=False, index=True)
+    stock = db.Column(db.Integer, nullable=False)
+    reorder_threshold = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @classmethod
+    def for_decrement(cls, product, previous_stock):
+        """Return an unsaved alert if the decrement from previous_stock crossed the threshold, else None."""
+        if not product.crossed_reorder_threshold(previous_stock):
+            return None
+        return cls(product_id=product.id, stock=product.stock, reorder_threshold=product.reorder_threshold)
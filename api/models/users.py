@@ -1,3 +1,4 @@
+from flask import current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from ..utils import db
@@ -19,7 +20,7 @@ class User(db.Model):
     cart = db.relationship('Cart', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -49,7 +50,7 @@ class Admin(db.Model):
     # cart = db.relationship('Cart', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
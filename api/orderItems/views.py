@@ -1,12 +1,12 @@
 from flask_restx import Namespace, Resource, fields
-from flask import request
 from flask_jwt_extended import jwt_required, get_jwt
 from ..models.orders import Order
 from ..models.orderItems import OrderItem
 from ..models.users import User
-from ..models.products import Product
 from ..models.carts import Cart
-from ..utils import db
+from ..utils import db, event_log, jobs
+from ..utils.idempotency import idempotent
+from datetime import datetime
 
 import logging
 
@@ -33,16 +33,18 @@ orderItem_model = orderItems_namespace.model('OrderItem', {
 @orderItems_namespace.route('/add_order_item')
 class AddOrderItem(Resource):
     @jwt_required()
-    @orderItems_namespace.doc(description="Add item(s) to an order from the cart (Place an order)")
+    @orderItems_namespace.doc(description="Add item(s) to an order from the cart (Place an order)",
+                              params={'Idempotency-Key': {'in': 'header', 'description': 'Unique key per checkout; retries with the same key are replayed'}})
+    @idempotent
     def post(self):
         """
            Handles the process of placing an order by adding items from the user's cart to an order.
 
         - Validates the user's authorization token and retrieves the associated user.
         - Ensures the user's cart exists and contains items.
-        - Creates a new order if one does not exist for the user.
-        - Transfers items from the cart to the order, while updating product stock levels.
-        - Deletes the cart upon successful order placement.
+        - Adds the items to the user's pending order, creating one if there is none.
+        - Transfers items from the cart to the order and queues a job adding them to the daily sales rollups.
+        - Deletes the cart upon successful order placement, in the same transaction.
         
         Returns:
             Success message with the created order ID upon successful operation.
@@ -73,8 +75,9 @@ class AddOrderItem(Resource):
             orderItems_namespace.abort(404, {'message': 
                 f'Cart is empty for user {user_email}. Add items to cart before placing an order'})
         
-        # Validate order and create a new order if it does not exist
-        order = Order.query.filter_by(user_id=user_id).first()
+        # Add to the user's pending order, or start a new one; orders that moved on
+        # (paid, shipped, delivered or cancelled) never take new lines
+        order = Order.query.filter_by(user_id=user_id, status='pending').order_by(Order.id.desc()).first()
         if not order:
             # Create a new order
             order = Order(user_id=user_id)
@@ -83,32 +86,26 @@ class AddOrderItem(Resource):
             except Exception as e:
                 logger.error(f"An error occurred while creating order: {str(e)}")
                 orderItems_namespace.abort(500, {'message': 'An unexpected error occurred while trying to create order'})
-        # Add order items to an order from the cart (Place an order)
-        for item in cart.items:
-            order_item = OrderItem(order_id=order.id, product_id=item.product_id, quantity=item.quantity, price=item.price)
-            try:
-                order_item.save()
-            except Exception as e:
-                logger.error(f"An error occurred while adding product to order: {str(e)}")
-                orderItems_namespace.abort(500, {'message': 'An unexpected error occurred while trying to add product to order'})
-            
-               
-                # Update product stock
-                product = Product.query.get(item.product_id)
-                if product:
-                    product.stock -= item.quantity
-                    try:
-                        product.save()
-                    except Exception as e:
-                        logger.error(f"An error occurred while updating product stock: {str(e)}")
-                        orderItems_namespace.abort(500, 
-                        {'message': 'An unexpected error occurred while trying to update product stock'}
-                        )
-                        
-        # Delete cart after placing an order
+        # Add order items to an order from the cart (Place an order).
+        # Stock was reserved when the items were added to the cart, so it is not touched here.
+        # The order lines and the cart removal are committed together; the sales rollups are
+        # updated by a background job queued in the same transaction.
+        cart_id = cart.id
+        item_count = len(cart.items)
+        sale_day = datetime.utcnow().date()
         try:
-            cart.delete()
+            lines = []
+            for item in cart.items:
+                order_item = OrderItem(order_id=order.id, product_id=item.product_id, quantity=item.quantity, price=item.price)
+                db.session.add(order_item)
+                lines.append((item.product_id, item.quantity, item.price))
+            jobs.enqueue('analytics.record_sales', day=sale_day.isoformat(), lines=lines)
+            # Delete cart after placing an order
+            db.session.delete(cart)
+            db.session.commit()
         except Exception as e:
-            logger.error(f"An error occurred while deleting cart: {str(e)}")
-            orderItems_namespace.abort(500, {'message': 'An unexpected error occurred while trying to delete cart'})
+            db.session.rollback()
+            logger.error(f"An error occurred while placing order: {str(e)}")
+            orderItems_namespace.abort(500, {'message': 'An unexpected error occurred while trying to place order'})
+        event_log.record('order.checked_out', user_id=user_id, order_id=order.id, cart_id=cart_id, items=item_count)
         return {'message': f'Order placed successfully for {user_email}, order.id:{order.id}'}, 201
\ No newline at end of file
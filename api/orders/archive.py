@@ -0,0 +1,160 @@
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, insert, select
+from ..models.archivedOrders import ArchivedOrder
+from ..models.orderItems import OrderItem
+from ..models.orders import ORDER_TRANSITIONS, Order
+from ..utils import db, shards
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+# Only orders that can no longer change are archived
+FINAL_STATUSES = tuple(status for status, targets in ORDER_TRANSITIONS.items() if not targets)
+
+
+class SegmentWriter:
+    """
+        A new segment file under ORDER_ARCHIVE_DIR, written once and never modified.
+        Every block of orders is its own gzip member, so the file as a whole reads as one
+        gzip stream of NDJSON while a single block can be decompressed from its byte range.
+    """
+    def __init__(self, directory, shard):
+        os.makedirs(directory, exist_ok=True)
+        self.name = f"orders-{shard or 'main'}-{datetime.utcnow():%Y%m%dT%H%M%S%f}.ndjson.gz"
+        self._file = open(os.path.join(directory, self.name), 'xb')
+
+    def write_block(self, records):
+        """Append the records as one compressed block and return its (offset, length)."""
+        lines = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        data = gzip.compress(lines.encode())
+        offset = self._file.tell()
+        self._file.write(data)
+        return offset, len(data)
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _record(order, items, shard):
+    return {
+        'id': order.id,
+        'user_id': order.user_id,
+        'status': order.status,
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+        'shard': shard,
+        'items': [{'id': item.id, 'product_id': item.product_id, 'quantity': item.quantity, 'price': item.price,
+                   'created_at': item.created_at.isoformat() if item.created_at else None} for item in items],
+    }
+
+
+def archive_orders(before, chunk_size=None):
+    """
+        Move the delivered and cancelled orders created before `before`, with their items, out of
+        the hot tables into compressed NDJSON segments. Orders are read chunk_size at a time by id.
+        For every chunk the segment is written and synced first, then the archived_orders index
+        rows are committed, then the orders and items are deleted in a second transaction. A run
+        cut short between the two finds the chunk already indexed and only deletes it.
+        Sales rollups are not affected, but `flask analytics-backfill` only sees the hot tables.
+        Returns the number of orders and items archived and the segments written.
+    """
+    chunk_size = chunk_size or current_app.config['ORDER_ARCHIVE_CHUNK_SIZE']
+    block_size = current_app.config['ORDER_ARCHIVE_BLOCK_SIZE']
+    directory = current_app.config['ORDER_ARCHIVE_DIR']
+    result = {'orders': 0, 'items': 0, 'segments': []}
+    for key in current_app.extensions['shards'].keys or [None]:
+        writer = None
+        last_id = 0
+        try:
+            with shards.on_shard(key):
+                while True:
+                    orders = db.session.execute(
+                        select(Order.id, Order.user_id, Order.status, Order.created_at)
+                        .where(Order.created_at < before, Order.status.in_(FINAL_STATUSES), Order.id > last_id)
+                        .order_by(Order.id).limit(chunk_size)).all()
+                    if not orders:
+                        db.session.rollback()
+                        break
+                    last_id = orders[-1].id
+                    order_ids = [order.id for order in orders]
+                    items = defaultdict(list)
+                    for item in db.session.execute(select(OrderItem.__table__)
+                                                   .where(OrderItem.order_id.in_(order_ids))
+                                                   .order_by(OrderItem.id)):
+                        items[item.order_id].append(item)
+                    indexed = set(db.session.execute(
+                        select(ArchivedOrder.order_id)
+                        .where(ArchivedOrder.shard == (key or ''), ArchivedOrder.order_id.in_(order_ids))).scalars())
+                    pending = [order for order in orders if order.id not in indexed]
+                    if pending:
+                        if writer is None:
+                            writer = SegmentWriter(directory, key)
+                            result['segments'].append(writer.name)
+                        index = []
+                        for start in range(0, len(pending), block_size):
+                            block = pending[start:start + block_size]
+                            offset, length = writer.write_block([_record(order, items[order.id], key) for order in block])
+                            index.extend({'shard': key or '', 'order_id': order.id, 'user_id': order.user_id,
+                                          'segment': writer.name, 'offset': offset, 'length': length}
+                                         for order in block)
+                        writer.sync()
+                        db.session.execute(insert(ArchivedOrder), index)
+                        db.session.commit()
+                    db.session.execute(delete(OrderItem.__table__).where(OrderItem.order_id.in_(order_ids)))
+                    db.session.execute(delete(Order.__table__).where(Order.id.in_(order_ids)))
+                    db.session.commit()
+                    result['orders'] += len(pending)
+                    result['items'] += sum(len(items[order.id]) for order in pending)
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            if writer is not None:
+                writer.close()
+    if result['orders']:
+        logger.info(f"Archived {result['orders']} orders into {', '.join(result['segments'])}")
+    return result
+
+
+def load_archived_order(order_id, shard=None):
+    """
+        An archived order with its items, or None. Only the block holding the order is read and
+        decompressed, found through the archived_orders index.
+    """
+    entry = db.session.execute(
+        select(ArchivedOrder).where(ArchivedOrder.shard == (shard or ''), ArchivedOrder.order_id == order_id)
+    ).scalar()
+    if entry is None:
+        return None
+    with open(os.path.join(current_app.config['ORDER_ARCHIVE_DIR'], entry.segment), 'rb') as segment:
+        segment.seek(entry.offset)
+        block = gzip.decompress(segment.read(entry.length))
+    for line in block.decode().splitlines():
+        record = json.loads(line)
+        if record['id'] == order_id:
+            return record
+    logger.error(f"Archived order {order_id} is missing from its block in {entry.segment}")
+    return None
+
+
+@click.command('orders-archive')
+@click.option('--older-than-days', type=int, default=None, help='Archive orders created more than this many days ago')
+@click.option('--chunk-size', type=int, default=None, help='Orders read and deleted per transaction')
+@with_appcontext
+def archive_orders_command(older_than_days, chunk_size):
+    """Move old delivered and cancelled orders to compressed segment files."""
+    days = older_than_days if older_than_days is not None else current_app.config['ORDER_ARCHIVE_AFTER_DAYS']
+    result = archive_orders(datetime.utcnow() - timedelta(days=days), chunk_size)
+    click.echo(f"Archived {result['orders']} orders and {result['items']} items"
+               + (f" into {', '.join(result['segments'])}" if result['segments'] else ""))
@@ -0,0 +1,41 @@
+from sqlalchemy import select, update
+from ..models.orders import ORDER_TRANSITIONS, Order, statuses_leading_to
+from ..utils import db
+
+# Order ids per UPDATE, under the bound-parameter limit of older SQLite builds
+CHUNK_SIZE = 500
+
+
+def bulk_transition(order_ids, status):
+    """
+        Move every order in order_ids to `status` with set-based UPDATEs, in the caller's transaction.
+        Only rows whose current status may lead to `status` are touched; the check is part of
+        the UPDATE's WHERE clause, so concurrent changes cannot slip an invalid move through.
+        Returns the updated ids and, for every other id, its current status (None when missing).
+    """
+    if status not in ORDER_TRANSITIONS:
+        raise ValueError(f"Unknown order status {status!r}")
+    sources = statuses_leading_to(status)
+    order_ids = list(dict.fromkeys(order_ids))
+    updated = []
+    for start in range(0, len(order_ids), CHUNK_SIZE):
+        chunk = order_ids[start:start + CHUNK_SIZE]
+        statement = (update(Order.__table__)
+                     .where(Order.id.in_(chunk), Order.status.in_(sources))
+                     .values(status=status))
+        if db.session.get_bind(clause=statement).dialect.update_returning:
+            updated.extend(db.session.execute(statement.returning(Order.id)).scalars())
+        else:
+            valid = db.session.execute(
+                select(Order.id).where(Order.id.in_(chunk), Order.status.in_(sources))).scalars().all()
+            if valid:
+                db.session.execute(statement.where(Order.id.in_(valid)))
+            updated.extend(valid)
+
+    done = set(updated)
+    rejected = [order_id for order_id in order_ids if order_id not in done]
+    current = {}
+    for start in range(0, len(rejected), CHUNK_SIZE):
+        chunk = rejected[start:start + CHUNK_SIZE]
+        current.update(db.session.execute(select(Order.id, Order.status).where(Order.id.in_(chunk))).all())
+    return sorted(done), {order_id: current.get(order_id) for order_id in rejected}
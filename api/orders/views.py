@@ -1,10 +1,15 @@
+from contextlib import nullcontext
 from flask_restx import Namespace, Resource, fields
-from flask import request
+from flask import current_app, request
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
-from ..models.carts import Cart
+from sqlalchemy import select
 from ..models.users import User
-from ..models.orders import Order
-from ..models.orderItems import OrderItem
+from ..models.orders import ORDER_TRANSITIONS, Order, statuses_leading_to
+from ..utils import db, event_log, shards
+from ..utils.cursors import decode_cursor, encode_cursor
+from ..utils.replicas import read_only
+from .transitions import bulk_transition
+from .archive import load_archived_order
 
 import logging
 
@@ -48,6 +53,62 @@ order_items_model = order_namespace.model('OrderItems', {
     'pagination': fields.Nested(pagination_model)
 })
 
+order_queue_model = order_namespace.model('OrderQueue', {
+    'orders': fields.List(fields.Nested(order_status_model)),
+    'limit': fields.Integer(description='Maximum number of orders per page'),
+    'next_cursor': fields.String(description='Pass as cursor to get the next page; null on the last page')
+})
+
+order_transition_model = order_namespace.model('OrderTransition', {
+    'order_ids': fields.List(fields.Integer, required=True, description='IDs of the orders to move'),
+    'status': fields.String(required=True, enum=list(ORDER_TRANSITIONS), description='Status to move the orders to'),
+    'shard': fields.Integer(description='With sharded orders: index of the shard the ids belong to')
+})
+
+rejected_order_model = order_namespace.model('RejectedOrder', {
+    'id': fields.Integer(),
+    'status': fields.String(description='Current status of the order; null when it does not exist')
+})
+
+archived_order_item_model = order_namespace.model('ArchivedOrderItem', {
+    'id': fields.Integer(),
+    'product_id': fields.Integer(),
+    'quantity': fields.Integer(),
+    'price': fields.Float(),
+    'created_at': fields.DateTime()
+})
+
+archived_order_model = order_namespace.model('ArchivedOrder', {
+    'id': fields.Integer(),
+    'user_id': fields.Integer(),
+    'status': fields.String(),
+    'created_at': fields.DateTime(),
+    'items': fields.List(fields.Nested(archived_order_item_model))
+})
+
+transition_result_model = order_namespace.model('OrderTransitionResult', {
+    'status': fields.String(),
+    'updated': fields.Integer(description='Number of orders moved'),
+    'rejected': fields.List(fields.Nested(rejected_order_model),
+                            description='Orders left as they were because the move is not allowed from their status')
+})
+
+
+def shard_key(value):
+    """Sharded orders repeat ids across shards, so admin order endpoints name the shard they act on."""
+    if not shards.enabled():
+        return None
+    keys = current_app.extensions['shards'].keys
+    if value is None or not 0 <= value < len(keys):
+        order_namespace.abort(400, f'shard must be between 0 and {len(keys) - 1}')
+    return keys[value]
+
+
+def shard_argument(value):
+    key = shard_key(value)
+    return nullcontext() if key is None else shards.on_shard(key)
+
+
 @order_namespace.route('/create_order')
 class CreateOrder(Resource):
     """
@@ -92,42 +153,176 @@ class CreateOrder(Resource):
 @order_namespace.route('/cancel_order')
 class DeleteOrder(Resource):
     """
-    Resource for canceling (or deleting) an existing order for a user.
-    This endpoint allows a user to cancel an existing order. The order is identified based on the user
-    details obtained via the JWT token. Upon successful cancellation, the order is removed from the database.
+    Resource for cancelling an existing order of a user.
+    The caller names one of their own orders; it is kept and moves to the cancelled status,
+    which ORDER_TRANSITIONS only allows from pending or paid.
     """
     @jwt_required()
-    @order_namespace.doc(description="Cancel an order for a user", security='Bearer Auth')
+    @order_namespace.doc(description="Cancel an order for a user", security='Bearer Auth',
+                         params={'order_id': 'The ID of the order to cancel'})
     def delete(self):
         """
         Handle DELETE request to cancel an order.
-        This method validates the user's identity using the JWT token, retrieves the user's associated order from the 
-        database, and deletes the order.
+        This method validates the user's identity using the JWT token, retrieves the order named by
+        order_id among the user's orders, and moves it to cancelled.
 
         Returns:
             dict: A success message if the order is canceled successfully.
             HTTP Status Code:
-                - 200: OK if the order is deleted successfully.
+                - 200: OK if the order is cancelled.
+                - 400: Bad Request if order_id is missing or not an integer.
                 - 401: Unauthorized if the token is invalid or missing.
                 - 404: Not Found if the user or order does not exist.
+                - 409: Conflict if the order is no longer pending or paid.
                 - 500: Internal Server Error if an unexpected error occurs.
         """
         jwt_data = get_jwt()
         user_email = jwt_data['sub']
         if not user_email:
             order_namespace.abort(401, {'message': 'Invalid or missing authorization token'})
+        order_id = request.args.get('order_id', type=int)
+        if order_id is None:
+            order_namespace.abort(400, 'order_id must be an integer')
         user = User.query.filter_by(email=user_email).first()
         if not user:
             order_namespace.abort(404, {'message': 'User not found'})
 
-        order = Order.query.filter_by(user_id=user.id).first()
+        order = Order.query.filter_by(id=order_id, user_id=user.id).first()
         if not order:
             order_namespace.abort(404, {'message': 'Order not found for user'})
-        
+        if order.status not in statuses_leading_to('cancelled'):
+            order_namespace.abort(409, f'Order {order_id} is {order.status} and can no longer be cancelled')
         try:
-            order.delete()
-            return {'message': 'Order deleted successfully'}, 200
+            # ORDER_TRANSITIONS is checked again in the UPDATE itself, so an order shipped
+            # since it was read is not cancelled
+            updated, current = bulk_transition([order_id], 'cancelled')
+            db.session.commit()
         except Exception as e:
-            logger.error(f"An error occurred while deleting order for user {user.id}: {str(e)}")
-            order_namespace.abort(500, {'message': 'An unexpected error occurred while trying to delete an order'})
-       
\ No newline at end of file
+            db.session.rollback()
+            logger.error(f"An error occurred while cancelling order {order_id} for user {user.id}: {str(e)}")
+            order_namespace.abort(500, {'message': 'An unexpected error occurred while trying to cancel an order'})
+        if not updated:
+            order_namespace.abort(409, f'Order {order_id} is {current[order_id]} and can no longer be cancelled')
+        event_log.record('order.cancelled', user_id=user.id, order_id=order_id)
+        return {'message': 'Order cancelled successfully'}, 200
+
+
+@order_namespace.route('/queue')
+class OrderQueue(Resource):
+    @order_namespace.marshal_with(order_queue_model)
+    @order_namespace.doc(description="List the orders in one status, oldest first",
+                         params={'status': 'Status of the orders to list (default paid)',
+                                 'limit': 'Orders per page (1-200, default 50)',
+                                 'cursor': 'next_cursor from the previous page',
+                                 'shard': 'With sharded orders: index of the shard to list'})
+    @jwt_required()
+    @read_only
+    def get(self):
+        """
+            Work queue for fulfilment: the orders in a given status, ordered by ID.
+            Pages use keyset cursors over the (status, id) index, so every page costs the same.
+            Accessible only to admin users.
+            Returns: a page of orders and the cursor of the next page.
+                status codes:
+                    200: Success
+                    400: Invalid status, limit, cursor or shard
+                    403: Unauthorized
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            order_namespace.abort(403, 'Unauthorized. Only admins can view the order queue')
+        status = request.args.get('status', default='paid')
+        if status not in ORDER_TRANSITIONS:
+            order_namespace.abort(400, f"status must be one of {', '.join(ORDER_TRANSITIONS)}")
+        limit = request.args.get('limit', default=50, type=int)
+        if limit < 1 or limit > 200:
+            order_namespace.abort(400, 'limit must be between 1 and 200')
+
+        query = select(Order).where(Order.status == status).order_by(Order.id).limit(limit + 1)
+        cursor = request.args.get('cursor')
+        if cursor:
+            query = query.where(Order.id > decode_cursor(cursor))
+        with shard_argument(request.args.get('shard', type=int)):
+            rows = db.session.execute(query).scalars().all()
+        orders = rows[:limit]
+        next_cursor = encode_cursor(orders[-1].id) if len(rows) > limit else None
+        return {"orders": orders, "limit": limit, "next_cursor": next_cursor}
+
+
+@order_namespace.route('/transitions')
+class OrderTransitions(Resource):
+    @order_namespace.expect(order_transition_model)
+    @order_namespace.marshal_with(transition_result_model)
+    @order_namespace.doc(description="Move many orders to a new status at once")
+    @jwt_required()
+    def post(self):
+        """
+            Move a batch of orders to a new status (pending -> paid -> shipped -> delivered, or cancelled
+            from pending or paid) with set-based UPDATEs in one transaction. Orders whose current
+            status does not allow the move, and unknown ids, are left alone and reported back.
+            Accessible only to admin users.
+            Returns: how many orders moved and the ones that were rejected.
+                status codes:
+                    200: Success, possibly with rejected orders
+                    400: Invalid status, order ids or shard
+                    403: Unauthorized
+                    500: An unexpected error occurred while updating the orders
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            order_namespace.abort(403, 'Unauthorized. Only admins can change order statuses')
+        data = request.get_json(silent=True) or {}
+        status = data.get('status')
+        if status not in ORDER_TRANSITIONS:
+            order_namespace.abort(400, f"status must be one of {', '.join(ORDER_TRANSITIONS)}")
+        order_ids = data.get('order_ids')
+        if not isinstance(order_ids, list) or not order_ids or \
+                not all(isinstance(order_id, int) and not isinstance(order_id, bool) for order_id in order_ids):
+            order_namespace.abort(400, 'order_ids must be a non-empty list of integers')
+        max_orders = current_app.config['ORDERS_BULK_MAX']
+        if len(order_ids) > max_orders:
+            order_namespace.abort(400, f'At most {max_orders} orders can be moved at once')
+
+        with shard_argument(data.get('shard')):
+            try:
+                updated, rejected = bulk_transition(order_ids, status)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"An error occurred while moving {len(order_ids)} orders to {status}: {str(e)}")
+                order_namespace.abort(500, 'An unexpected error occurred while updating the orders')
+        event_log.record('order.status_changed', status=status, updated=len(updated), rejected=len(rejected))
+        return {"status": status, "updated": len(updated),
+                "rejected": [{"id": order_id, "status": current} for order_id, current in rejected.items()]}, 200
+
+
+@order_namespace.route('/archive/<int:order_id>')
+class ArchivedOrderDetail(Resource):
+    @order_namespace.marshal_with(archived_order_model)
+    @order_namespace.doc(description="Fetch an order that was moved to the archive",
+                         params={'shard': 'Admins with sharded orders: index of the shard the id belongs to'})
+    @jwt_required()
+    def get(self, order_id):
+        """
+            Read an archived order with its items. Only the compressed block holding the order is read.
+            Users can read their own orders; admins can read any.
+            Returns: the archived order.
+                status codes:
+                    200: Success
+                    400: Invalid shard
+                    404: Order not found in the archive
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') == 'admin':
+            order = load_archived_order(order_id, shard_key(request.args.get('shard', type=int)))
+        else:
+            user = User.query.filter_by(email=get_jwt_identity()).first()
+            if not user:
+                order_namespace.abort(404, 'User not found')
+            shard = shards.shard_for_user(user.id) if shards.enabled() else None
+            order = load_archived_order(order_id, shard)
+            if order and order['user_id'] != user.id:
+                order = None
+        if not order:
+            order_namespace.abort(404, 'Archived order not found')
+        return order, 200
@@ -0,0 +1,28 @@
+from flask_restx import marshal
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..models.products import Product
+from ..utils import cache, db
+from ..utils.replicas import reads_from_primary
+
+
+def cached_product(product_id):
+    """
+        The product as rendered by product_status_model, or None if there is no such product.
+        Served from the cache; any committed write to the product invalidates it. Misses are
+        loaded from the primary even in requests routed to a replica: a lagging replica row
+        would otherwise be cached under the new version and served to the writer too.
+    """
+    def load():
+        from .views import product_status_model
+        with reads_from_primary():
+            product = db.session.get(Product, product_id)
+        return marshal(product, product_status_model) if product else None
+    return cache.get_or_load('product', product_id, load)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_changed_products(session, flush_context):
+    for product in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(product, Product) and product.id is not None:
+            cache.invalidate_on_commit(session, 'product', product.id)
@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+from collections import Counter
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import case, delete, event, func, inspect, insert, literal, select
+from sqlalchemy.orm import Session
+from ..models.productFacets import ProductFacet
+from ..models.products import Product, category_name
+from ..utils import db
+from ..utils.counters import increment, previous_value
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the price buckets; the last bucket is open ended.
+# Run `flask facets-reconcile` after changing them.
+PRICE_BUCKET_BOUNDS = (100, 250, 500, 1000)
+
+
+def price_bucket(price):
+    lower = 0
+    for upper in PRICE_BUCKET_BOUNDS:
+        if price < upper:
+            return f'{lower}-{upper}'
+        lower = upper
+    return f'{lower}+'
+
+
+def facet_values(category, price, stock):
+    """The facet rows an in-stock product counts towards; none when it is out of stock."""
+    if not stock or stock <= 0:
+        return []
+    return [('category', category_name(category)), ('price', price_bucket(price or 0.0))]
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_facets(session, flush_context, instances):
+    """Keep product_facets in step with every ORM write to products, stock decrements included."""
+    deltas = Counter()
+    for product in session.new:
+        if isinstance(product, Product):
+            deltas.update(facet_values(product.category, product.price, product.stock))
+    for product in session.deleted:
+        if isinstance(product, Product):
+            state = inspect(product)
+            deltas.subtract(facet_values(*(previous_value(state, key) for key in ('category', 'price', 'stock'))))
+    for product in session.dirty:
+        if isinstance(product, Product) and session.is_modified(product):
+            state = inspect(product)
+            deltas.subtract(facet_values(*(previous_value(state, key) for key in ('category', 'price', 'stock'))))
+            deltas.update(facet_values(product.category, product.price, product.stock))
+    changed = {key: delta for key, delta in deltas.items() if delta}
+    if not changed:
+        return
+    connection = session.connection()
+    for (facet, value), delta in changed.items():
+        increment(connection, ProductFacet.__table__, {'facet': facet, 'value': value}, {'count': delta})
+    session.info['facets_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_facet_cache(session):
+    if session.info.pop('facets_changed', False) and has_app_context() and 'facets' in current_app.extensions:
+        current_app.extensions['facets'].invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_facet_changes(session):
+    session.info.pop('facets_changed', None)
+
+
+class FacetCache:
+    """
+        In-memory copy of product_facets for GET /products/facets. Commits made by this
+        process invalidate it at once; writes from other processes show up after at most
+        FACETS_CACHE_SECONDS.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._facets = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._facets = None
+
+    def get(self):
+        facets = self._facets
+        if facets is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return facets
+        with self._lock:
+            if self._facets is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._facets = load_facets()
+                self._loaded_at = time.monotonic()
+            return self._facets
+
+
+def load_facets():
+    rows = db.session.execute(
+        select(ProductFacet.facet, ProductFacet.value, ProductFacet.count)
+        .where(ProductFacet.count > 0)
+        .order_by(ProductFacet.facet, ProductFacet.value)).all()
+    facets = {'category': [], 'price': []}
+    for facet, value, count in rows:
+        facets.setdefault(facet, []).append({'value': value, 'count': count})
+    # Buckets sort by their lower bound, not alphabetically
+    facets['price'].sort(key=lambda bucket: int(bucket['value'].split('-')[0].rstrip('+')))
+    return facets
+
+
+def _price_bucket_expression():
+    lower = 0
+    whens = []
+    for upper in PRICE_BUCKET_BOUNDS:
+        whens.append((Product.price < upper, literal(f'{lower}-{upper}')))
+        lower = upper
+    return case(*whens, else_=literal(f'{lower}+'))
+
+
+def _lock_facets(connection):
+    """
+        Hold off product writes until the reconciliation commits. Every product write also
+        increments product_facets in its transaction, so one committed between the recount and
+        the rewrite would otherwise be lost.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        # pysqlite does not begin a transaction before a SELECT: take the write lock up front
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+    elif dialect == 'postgresql':
+        connection.exec_driver_sql('LOCK TABLE product_facets IN SHARE ROW EXCLUSIVE MODE')
+    else:
+        connection.execute(select(ProductFacet.facet).with_for_update()).all()
+
+
+def reconcile_facets(fix=True):
+    """
+        Recount the facets from the products table and compare with product_facets.
+        Returns the mismatches as {(facet, value): (stored, actual)}; with fix=True the table
+        is rewritten from the recount in the same transaction.
+    """
+    bucket = _price_bucket_expression()
+    with db.engine.begin() as connection:
+        _lock_facets(connection)
+        actual = Counter()
+        for column in (Product.category, bucket):
+            facet = 'category' if column is Product.category else 'price'
+            rows = connection.execute(
+                select(column, func.count()).where(Product.stock > 0).group_by(column)).all()
+            actual.update({(facet, category_name(value)): count for value, count in rows})
+        stored = {(facet, value): count for facet, value, count in connection.execute(
+            select(ProductFacet.facet, ProductFacet.value, ProductFacet.count)).all()}
+        mismatches = {key: (stored.get(key, 0), actual.get(key, 0))
+                      for key in set(stored) | set(actual) if stored.get(key, 0) != actual.get(key, 0)}
+        if mismatches and fix:
+            connection.execute(delete(ProductFacet.__table__))
+            if actual:
+                connection.execute(insert(ProductFacet.__table__), [
+                    {'facet': facet, 'value': value, 'count': count} for (facet, value), count in actual.items()])
+    if mismatches:
+        logger.warning(f"Facet counts drifted from the products table: {mismatches}")
+        if fix and 'facets' in current_app.extensions:
+            current_app.extensions['facets'].invalidate()
+    return mismatches
+
+
+def init_facets(app):
+    """Set up the facet cache and the periodic reconciliation (FACETS_RECONCILE_INTERVAL seconds, 0 disables it)."""
+    from ..utils import scheduler
+    app.extensions['facets'] = FacetCache(app.config.get('FACETS_CACHE_SECONDS', 5.0))
+    scheduler.add_job(app, 'facets-reconcile', app.config.get('FACETS_RECONCILE_INTERVAL', 0), reconcile_facets)
+
+
+@click.command('facets-reconcile')
+@click.option('--check', is_flag=True, help='Only report mismatches, do not fix them')
+@with_appcontext
+def reconcile_facets_command(check):
+    """Verify the product facet counts against the products table and fix any drift."""
+    mismatches = reconcile_facets(fix=not check)
+    if not mismatches:
+        click.echo("Facet counts match the products table")
+        return
+    for (facet, value), (stored, actual) in sorted(mismatches.items()):
+        click.echo(f"{facet}={value}: stored {stored}, actual {actual}")
+    click.echo(f"{len(mismatches)} mismatched facet counts" + ("" if check else ", fixed"))
@@ -0,0 +1,100 @@
+import json
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from ..models.products import Product, category_name
+from ..utils import pubsub
+
+# Attributes whose changes storefronts care about; other product writes are not broadcast
+LIVE_ATTRIBUTES = ('name', 'price', 'stock', 'category')
+
+
+def product_topic(product_id):
+    return f'product:{product_id}'
+
+
+def category_topic(category):
+    return f'category:{category}'
+
+
+def product_snapshot(product, deleted=False):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'stock': product.stock,
+        'category': category_name(product.category),
+        'deleted': deleted,
+    }
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_product_changes(session, flush_context):
+    changes = session.info.setdefault('live_product_changes', {})
+    for product in session.new:
+        if isinstance(product, Product):
+            changes[product.id] = product_snapshot(product)
+    for product in session.dirty:
+        if isinstance(product, Product):
+            state = inspect(product)
+            if any(state.attrs[key].history.has_changes() for key in LIVE_ATTRIBUTES):
+                changes[product.id] = product_snapshot(product)
+    for product in session.deleted:
+        if isinstance(product, Product):
+            changes[product.id] = product_snapshot(product, deleted=True)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_product_changes(session):
+    # Published only after the commit, so subscribers never see a rolled back price or stock
+    changes = session.info.pop('live_product_changes', None)
+    if not changes or not has_app_context() or 'pubsub' not in current_app.extensions:
+        return
+    for snapshot in changes.values():
+        pubsub.publish((product_topic(snapshot['id']), category_topic(snapshot['category'])),
+                       snapshot['id'], snapshot)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_product_changes(session):
+    session.info.pop('live_product_changes', None)
+
+
+def format_event(data, event_type='product', event_id=None):
+    lines = [f'event: {event_type}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_events(subscription, snapshots, heartbeat, linger, max_seconds):
+    """
+        Generator behind GET /products/stream: the current state of the watched products,
+        then every change as it is committed, with a comment line as heartbeat when idle.
+        The stream ends after max_seconds; EventSource clients reconnect on their own.
+        The view unsubscribes when the response is closed.
+    """
+    deadline = time.monotonic() + max_seconds
+    sent = 0
+    yield f'retry: {int(heartbeat * 1000)}\n\n'
+    for snapshot in snapshots:
+        sent += 1
+        yield format_event(snapshot, event_id=sent)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        result = subscription.get(timeout=min(heartbeat, remaining), linger=linger)
+        if result is None:
+            return
+        overflowed, messages = result
+        if overflowed:
+            # Updates were dropped for this slow connection: tell the client to refetch
+            yield format_event({'reason': 'buffer overflow'}, event_type='resync')
+        for message in messages:
+            sent += 1
+            yield format_event(message, event_id=sent)
+        if not overflowed and not messages:
+            yield ': heartbeat\n\n'
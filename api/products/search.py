@@ -0,0 +1,72 @@
+import re
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import or_, select, text
+from ..models.products import Product, ProductCategory, create_product_search_index
+from ..utils import db
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# bm25 column weights for (name, description, category): a name hit outranks a description hit
+_SEARCH_SQL = """
+    SELECT products.* FROM products_fts
+    JOIN products ON products.id = products_fts.rowid
+    WHERE products_fts MATCH :match
+    ORDER BY bm25(products_fts, 10.0, 1.0, 0.0)
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def build_match_expression(query, category=None):
+    """
+        Turn free text into an FTS5 query: every word is a quoted prefix term, all terms
+        must match in name or description, and the category becomes a column filter.
+        Returns None when the query has no searchable words.
+    """
+    terms = ' AND '.join(f'"{token}"*' for token in _TOKEN.findall(query.lower()))
+    if not terms:
+        return None
+    match = f'{{name description}} : ({terms})'
+    if category:
+        match = f'category : "{category}" AND {match}'
+    return match
+
+
+def search_products(query, category=None, page=1, per_page=5):
+    """
+        Rank products against a search query with bm25.
+        Fetches one extra row to tell whether there is a next page without counting every match.
+    """
+    offset = (page - 1) * per_page
+    if db.engine.dialect.name != 'sqlite':
+        return _search_products_like(query, category, offset, per_page)
+    match = build_match_expression(query, category)
+    if match is None:
+        return [], False
+    statement = select(Product).from_statement(text(_SEARCH_SQL))
+    products = db.session.execute(statement, {'match': match, 'limit': per_page + 1, 'offset': offset}).scalars().all()
+    return products[:per_page], len(products) > per_page
+
+
+def _search_products_like(query, category, offset, per_page):
+    # Fallback for backends without FTS5: unranked substring match on name and description
+    statement = select(Product)
+    for token in _TOKEN.findall(query):
+        pattern = f'%{token}%'
+        statement = statement.where(or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
+    if category:
+        statement = statement.where(Product.category == ProductCategory[category])
+    statement = statement.order_by(Product.id).limit(per_page + 1).offset(offset)
+    products = db.session.execute(statement).scalars().all()
+    return products[:per_page], len(products) > per_page
+
+
+@click.command('search-rebuild')
+@with_appcontext
+def rebuild_search_index():
+    """Create the product search index if missing and rebuild it from the products table."""
+    with db.engine.begin() as connection:
+        create_product_search_index(connection)
+        connection.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        count = connection.exec_driver_sql("SELECT count(*) FROM products").scalar()
+    click.echo(f"Rebuilt the search index over {count} products")
@@ -1,7 +1,14 @@
 from flask_restx import Resource, Namespace, fields, abort
-from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
-from ..models.products import Product
-from flask import request
+from flask_jwt_extended import jwt_required, get_jwt
+from ..models.products import Product, ProductCategory
+from ..models.stockAlerts import StockAlert
+from flask import Response, current_app, request, stream_with_context
+from ..utils.replicas import read_only
+from .search import search_products
+from .cache import cached_product
+from .live import category_topic, product_snapshot, product_topic, stream_events
+from ..utils import db, pubsub
+from ..utils.fieldsets import marshal_with_fields, only_requested_columns
 
 product_namespace = Namespace('products', description='Endpoints for managing and interacting with products in the store,\
     including creation, retrieval, updating, and deletion.')
@@ -13,6 +20,7 @@ product_model = product_namespace.model('Product', {
     "quantity": fields.Integer(required=True, description='Product quantity'),
     "price": fields.Float(required=True, description='Product price'),
     "category": fields.String(required=True, description='Product category'),
+    "reorder_threshold": fields.Integer(description='Stock level below which the product needs reordering (default 5)'),
 })
 
 product_status_model = product_namespace.model('Product', {
@@ -23,6 +31,35 @@ product_status_model = product_namespace.model('Product', {
     "price": fields.Float(required=True, description='Product price'),
     "stock": fields.Integer(description='Product stock', default=0),
     "category": fields.String(required=True, description='Product category. Must be phone brands'),
+    "reorder_threshold": fields.Integer(description='Stock level below which the product needs reordering'),
+})
+
+low_stock_model = product_namespace.model('LowStockList', {
+    "products": fields.List(fields.Nested(product_status_model)),
+    "limit": fields.Integer(description='Maximum number of products returned'),
+})
+
+stock_alert_model = product_namespace.model('StockAlert', {
+    "id": fields.Integer(description='Alert id; pass the last one seen as since_id'),
+    "product_id": fields.Integer(),
+    "stock": fields.Integer(description='Stock right after the decrement'),
+    "reorder_threshold": fields.Integer(description='Threshold that was crossed'),
+    "created_at": fields.DateTime(),
+})
+
+stock_alert_feed_model = product_namespace.model('StockAlertFeed', {
+    "alerts": fields.List(fields.Nested(stock_alert_model)),
+    "last_id": fields.Integer(description='since_id for the next poll'),
+})
+
+facet_count_model = product_namespace.model('FacetCount', {
+    "value": fields.String(description='Brand, or price bucket such as 250-500'),
+    "count": fields.Integer(description='Number of in-stock products'),
+})
+
+facets_model = product_namespace.model('ProductFacets', {
+    "category": fields.List(fields.Nested(facet_count_model)),
+    "price": fields.List(fields.Nested(facet_count_model)),
 })
 
 pagination_model = product_namespace.model('Pagination', {
@@ -39,6 +76,15 @@ product_list_model = product_namespace.model('ProductList', {
     "pagination": fields.Nested(pagination_model)
 })
 
+search_result_model = product_namespace.model('ProductSearch', {
+    "products": fields.List(fields.Nested(product_status_model)),
+    "query": fields.String(description='The search query'),
+    "page": fields.Integer(description='Current page'),
+    "per_page": fields.Integer(description='Number of products per page'),
+    "next_page": fields.Integer(description='Next page number'),
+    "prev_page": fields.Integer(description='Previous page number'),
+})
+
 @product_namespace.route('/product')
 class CreateAndGetAllProducts(Resource):
     @product_namespace.expect(product_model)
@@ -57,7 +103,6 @@ class CreateAndGetAllProducts(Resource):
                 - 400: Bad Request
                 - 403: Forbidden     
         """
-        jwt_identity = get_jwt_identity()
         jwt_data = get_jwt()
         if jwt_data is None or jwt_data.get('role') != 'admin':
             product_namespace.abort(403, 'Unauthorized. Only admins can add products')
@@ -83,9 +128,13 @@ class CreateAndGetAllProducts(Resource):
             product_namespace.abort(400, 'Quantity must be an integer')
         if not isinstance(data.get('price'), float):
             product_namespace.abort(400, 'Price must be a float')
+        reorder_threshold = data.get('reorder_threshold')
+        if reorder_threshold is not None and (not isinstance(reorder_threshold, int) or reorder_threshold < 0):
+            product_namespace.abort(400, 'Reorder threshold must be a non-negative integer')
         if data:
             product = Product(name=data.get('name'), description=data.get('description'), price=data.get('price'), 
-                            category=data.get('category'), quantity=data.get('quantity'))
+                            category=data.get('category'), quantity=data.get('quantity'),
+                            reorder_threshold=reorder_threshold)
             product.stock = product.stock + product.quantity
             if not isinstance(product.stock, int):
                 product_namespace.abort(400, 'Stock must be an integer')
@@ -93,8 +142,9 @@ class CreateAndGetAllProducts(Resource):
             return product, 201
         return abort(500, 'Something went wrong')
     
-    @product_namespace.marshal_with(product_list_model)
+    @marshal_with_fields(product_namespace, product_list_model, product_status_model, list_key='products')
     @product_namespace.doc(description="Get all products in the store")
+    @read_only
     def get(self):
         """
             Retrieve all products in the store
@@ -115,7 +165,9 @@ class CreateAndGetAllProducts(Resource):
             product_namespace.abort(400, 'Page must be greater than 0')
         if not isinstance(per_page, int):
             product_namespace.abort(400, 'Page must be an integer')
-        products = Product.query.paginate(page=page, per_page=per_page)
+        # Skip loading columns the client did not ask for, e.g. the description text
+        query = only_requested_columns(Product.query, Product)
+        products = query.paginate(page=page, per_page=per_page)
         
         return {
             "products": products.items,
@@ -131,9 +183,10 @@ class CreateAndGetAllProducts(Resource):
 
 @product_namespace.route('/product/<int:id>')
 class GetUpdateDeleteProduct(Resource):
-    @product_namespace.marshal_with(product_status_model)
+    @marshal_with_fields(product_namespace, product_status_model)
     @product_namespace.doc(description="Retrieve a product by its ID", params={'product_id': 'The product ID'}, 
                            required=True)
+    @read_only
     def get(self, id):
         """
             Retrieves a specific product by its ID
@@ -143,7 +196,8 @@ class GetUpdateDeleteProduct(Resource):
                 - 200: OK
                 - 404: Not Found
         """
-        product = Product.query.get(id)
+        # The full product is cached once and narrowed to the requested fields when marshalled
+        product = cached_product(id)
         if not product:
             product_namespace.abort(404, 'Product not found')
         return product, 200
@@ -183,6 +237,9 @@ class GetUpdateDeleteProduct(Resource):
             product_namespace.abort(400, 'Price cannot be negative')
         if data.get('quantity') and data.get('quantity') < 0:
             product_namespace.abort(400, 'Quantity cannot be negative')
+        reorder_threshold = data.get('reorder_threshold')
+        if reorder_threshold is not None and (not isinstance(reorder_threshold, int) or reorder_threshold < 0):
+            product_namespace.abort(400, 'Reorder threshold must be a non-negative integer')
         if data.get('category') and data.get('category') not in ['iphone', 'samsung', 'huawei', 'tecno', 
                                         'infinix', 'itel', 'nokia', 'sony', 'lg', 'htc', 
                                         'blackberry', 'motorola', 'google', 'xiaomi', 'oppo', 'vivo', 
@@ -202,10 +259,12 @@ class GetUpdateDeleteProduct(Resource):
             # Update the stock only when the quantity is updated
             product.quantity = data.get('quantity')
             product.stock = product.stock + product.quantity
+        if reorder_threshold is not None:
+            product.reorder_threshold = reorder_threshold
         try:
             product.save()
             return product, 200
-        except Exception as e:
+        except Exception:
             product_namespace.abort(500, 'Failed to update product')
 
 
@@ -236,4 +295,188 @@ class GetUpdateDeleteProduct(Resource):
         return {"message": "Product deleted successfully"}, 200
     
     
-    
\ No newline at end of file
+    
+
+@product_namespace.route('/search')
+class SearchProducts(Resource):
+    @product_namespace.marshal_with(search_result_model)
+    @product_namespace.doc(description="Full-text search over product names and descriptions",
+                           params={'q': 'Search words; each word also matches as a prefix',
+                                   'category': 'Only return products of this phone brand',
+                                   'page': 'Page number', 'per_page': 'Products per page (max 50)'})
+    @read_only
+    def get(self):
+        """
+            Search products by name and description, best matches first
+            Returns:
+                A page of matching products ranked by relevance
+                HTTP status code:
+                - 200: OK
+                - 400: Bad Request
+        """
+        query = request.args.get('q', default='', type=str).strip()
+        if not query:
+            product_namespace.abort(400, 'Search query q is required')
+        category = request.args.get('category')
+        if category and category not in ProductCategory.__members__:
+            product_namespace.abort(400, 'Invalid category. Category must be phone brands')
+        page = request.args.get('page', default=1, type=int)
+        if page < 1:
+            product_namespace.abort(400, 'Page must be greater than 0')
+        per_page = request.args.get('per_page', default=5, type=int)
+        if per_page < 1 or per_page > 50:
+            product_namespace.abort(400, 'per_page must be between 1 and 50')
+        products, has_next = search_products(query, category=category, page=page, per_page=per_page)
+        return {
+            "products": products,
+            "query": query,
+            "page": page,
+            "per_page": per_page,
+            "next_page": page + 1 if has_next else None,
+            "prev_page": page - 1 if page > 1 else None,
+        }
+
+
+@product_namespace.route('/low_stock')
+class LowStockProducts(Resource):
+    @product_namespace.marshal_with(low_stock_model)
+    @product_namespace.doc(description="List products whose stock is below their reorder threshold",
+                           params={'limit': 'Maximum number of products (1-200, default 50)',
+                                   'category': 'Only products of this phone brand'})
+    @jwt_required()
+    @read_only
+    def get(self):
+        """
+            List the products that need reordering, lowest stock first
+            Only admins can list low-stock products
+            Returns:
+                The products below their reorder threshold
+                HTTP status code:
+                - 200: OK
+                - 400: Bad Request
+                - 403: Forbidden
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            product_namespace.abort(403, 'Unauthorized. Only admins can list low-stock products')
+        limit = request.args.get('limit', default=50, type=int)
+        if limit < 1 or limit > 200:
+            product_namespace.abort(400, 'limit must be between 1 and 200')
+        category = request.args.get('category')
+        if category and category not in ProductCategory.__members__:
+            product_namespace.abort(400, 'Invalid category. Category must be phone brands')
+        # The WHERE clause matches the partial index ix_products_low_stock, so only
+        # products already below their threshold are read.
+        query = Product.query.filter(Product.stock < Product.reorder_threshold)
+        if category:
+            query = query.filter(Product.category == ProductCategory[category])
+        products = query.order_by(Product.stock, Product.id).limit(limit).all()
+        return {"products": products, "limit": limit}
+
+
+@product_namespace.route('/low_stock/alerts')
+class LowStockAlerts(Resource):
+    @product_namespace.marshal_with(stock_alert_feed_model)
+    @product_namespace.doc(description="Feed of stock decrements that crossed a reorder threshold",
+                           params={'since_id': 'Return alerts after this id (default 0)',
+                                   'limit': 'Maximum number of alerts (1-500, default 100)'})
+    @jwt_required()
+    @read_only
+    def get(self):
+        """
+            Poll the low-stock alert feed
+            Alerts are returned oldest first; pass the returned last_id as since_id to get the next ones.
+            Only admins can read the feed
+            Returns:
+                The alerts after since_id
+                HTTP status code:
+                - 200: OK
+                - 400: Bad Request
+                - 403: Forbidden
+        """
+        jwt_data = get_jwt()
+        if jwt_data.get('role') != 'admin':
+            product_namespace.abort(403, 'Unauthorized. Only admins can read stock alerts')
+        since_id = request.args.get('since_id', default=0, type=int)
+        if since_id < 0:
+            product_namespace.abort(400, 'since_id cannot be negative')
+        limit = request.args.get('limit', default=100, type=int)
+        if limit < 1 or limit > 500:
+            product_namespace.abort(400, 'limit must be between 1 and 500')
+        alerts = (StockAlert.query.filter(StockAlert.id > since_id)
+                  .order_by(StockAlert.id).limit(limit).all())
+        return {"alerts": alerts, "last_id": alerts[-1].id if alerts else since_id}
+
+
+@product_namespace.route('/stream')
+class ProductStream(Resource):
+    @product_namespace.doc(description="Server-Sent Events stream of price and stock changes",
+                           params={'product_id': 'Comma separated product ids to watch',
+                                   'category': 'Comma separated phone brands to watch'})
+    def get(self):
+        """
+            Follow live price and stock changes instead of polling the product endpoint
+            The stream starts with the current state of every watched product, then sends an
+            event each time one of them, or any product of a watched category, is committed.
+            Returns:
+                A text/event-stream response
+                HTTP status code:
+                - 200: OK
+                - 400: Bad Request
+                - 503: Too many open streams
+        """
+        try:
+            product_ids = [int(value) for value in request.args.get('product_id', '').split(',') if value.strip()]
+        except ValueError:
+            product_namespace.abort(400, 'product_id must be a comma separated list of integers')
+        categories = [value.strip() for value in request.args.get('category', '').split(',') if value.strip()]
+        if not product_ids and not categories:
+            product_namespace.abort(400, 'Watch at least one product_id or category')
+        if any(category not in ProductCategory.__members__ for category in categories):
+            product_namespace.abort(400, 'Invalid category. Category must be phone brands')
+        if len(product_ids) + len(categories) > current_app.config['SSE_MAX_TOPICS']:
+            product_namespace.abort(400, f"Watch at most {current_app.config['SSE_MAX_TOPICS']} products and categories")
+
+        # Subscribe before reading the current state so no change can fall in between
+        topics = [product_topic(product_id) for product_id in product_ids] + \
+            [category_topic(category) for category in categories]
+        subscription = pubsub.subscribe(topics)
+        if subscription is None:
+            product_namespace.abort(503, 'Too many open streams, try again later')
+        try:
+            products = Product.query.filter(Product.id.in_(product_ids)).all() if product_ids else []
+        except Exception:
+            pubsub.unsubscribe(subscription)
+            raise
+        snapshots = [product_snapshot(product) for product in products]
+        # The stream can stay open for minutes: do not hold a database connection meanwhile
+        db.session.close()
+
+        config = current_app.config
+        events = stream_events(subscription, snapshots, heartbeat=config['SSE_HEARTBEAT_SECONDS'],
+                               linger=config['SSE_COALESCE_SECONDS'], max_seconds=config['SSE_MAX_STREAM_SECONDS'])
+        response = Response(stream_with_context(events), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        # The server closes the response however the stream ends, even when the client leaves
+        # before the generator starts and its finally would never run. No app context is
+        # left by then, so the hub is bound here.
+        hub = current_app.extensions['pubsub']
+        response.call_on_close(lambda: hub.unsubscribe(subscription))
+        return response
+
+
+@product_namespace.route('/facets')
+class ProductFacets(Resource):
+    @product_namespace.marshal_with(facets_model)
+    @product_namespace.doc(description="Number of in-stock products per brand and per price bucket")
+    @read_only
+    def get(self):
+        """
+            Facet counts for catalogue navigation
+            Served from memory; the counts are kept up to date on every product write.
+            Returns:
+                The in-stock product counts per category and per price bucket
+                HTTP status code:
+                - 200: OK
+        """
+        return current_app.extensions['facets'].get()
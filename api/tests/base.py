@@ -0,0 +1,55 @@
+import sqlite3
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+
+# Empty database with the full schema, built by the first test of each process.
+# Under pytest-xdist every worker is a process of its own, with its own template and databases.
+_template = None
+
+
+def clone_schema():
+    """
+        Give the app's in-memory database the full schema. The first call runs create_all()
+        and keeps a copy; later calls restore that copy through the SQLite backup API, which
+        is far cheaper than emitting the DDL again. Other databases get create_all().
+    """
+    global _template
+    if db.engine.url.database not in (None, '', ':memory:') or len(db.engines) > 1:
+        db.create_all()
+        return
+    connection = db.engine.raw_connection()
+    try:
+        if _template is None:
+            db.create_all()
+            _template = sqlite3.connect(':memory:', check_same_thread=False)
+            connection.driver_connection.backup(_template)
+        else:
+            _template.backup(connection.driver_connection)
+    finally:
+        connection.close()
+
+
+class AppTestCase(unittest.TestCase):
+    """
+        A fresh app on an in-memory database with the schema in place, its app context pushed
+        and a test client. Subclasses change `config` or extend setUp after calling super().
+    """
+    config = config_dict['test']
+
+    def setUp(self):
+        self.app = create_app(config=self.config)
+        self.appctx = self.app.app_context()
+        self.appctx.push()
+        self.client = self.app.test_client()
+        clone_schema()
+
+    def tearDown(self):
+        # Queued audit events are written before the database goes away
+        self.app.extensions['event_log'].close()
+        db.session.remove()
+        # Closing the connections discards the in-memory database, no DROP needed
+        for engine in db.engines.values():
+            engine.dispose()
+        self.appctx.pop()
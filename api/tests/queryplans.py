@@ -0,0 +1,60 @@
+import contextlib
+import re
+import threading
+from sqlalchemy import event
+
+# Tables that grow with traffic; a full scan or a sort on them is a regression
+LARGE_TABLES = ('products', 'cart_items', 'order_items', 'token_blocklist')
+
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+_READ = re.compile(r'^(?:SCAN|SEARCH) (?:TABLE )?(\w+)')
+_PLANNED = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+@contextlib.contextmanager
+def capture_statements(engine):
+    """
+        Collect the (statement, parameters) pairs the current thread runs on engine inside
+        the block. Statements of background threads (event log, job workers) are left out.
+    """
+    statements = []
+    thread = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread and statement.lstrip().upper().startswith(_PLANNED):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def explain(connection, statement, parameters):
+    """The SQLite EXPLAIN QUERY PLAN of statement as lines, children indented under their parent."""
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return lines
+
+
+def plan_problems(plan, tables=LARGE_TABLES):
+    """Full scans of tables, and temp B-tree sorts in plans that read one of tables."""
+    problems = []
+    reads_large_table = False
+    for line in plan:
+        detail = line.strip()
+        read = _READ.match(detail)
+        if read and read.group(1) in tables:
+            reads_large_table = True
+        scan = _FULL_SCAN.match(detail)
+        if scan and scan.group(1) in tables:
+            problems.append(f'full scan of {scan.group(1)}')
+    if reads_large_table:
+        problems.extend(f'sort in a temp B-tree ({line.strip()})' for line in plan
+                        if 'USE TEMP B-TREE' in line and 'ORDER BY' in line)
+    return problems
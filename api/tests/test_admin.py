@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+from .base import AppTestCase
+from ..utils import db
+from ..models.users import User
+from ..models.products import Product
+from ..models.carts import Cart
+from ..models.cartItems import CartItem
+from ..models.orders import Order
+from ..models.orderItems import OrderItem
+from ..models.purgeJobs import PurgeJob
+from ..admin.purge import start_purge, wait_for_purge
+from ..products.facets import reconcile_facets
+
+
+class TestAdminUsers(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.admin_data = {
+            "username": "admin",
+            "email": "admin@gmail.com",
+            "password": "admin"
+        }
+
+        # Insert users directly: hashing a password per user would dominate the test
+        for i in range(5):
+            db.session.add(User(username=f"user{i}", email=f"user{i}@{'shop' if i < 3 else 'mail'}.com",
+                                password_hash="not-a-hash", is_active=i != 1,
+                                created_at=datetime(2024, 1, i + 1)))
+        db.session.commit()
+
+        self.client.post("/admin/auth/register", json=self.admin_data)
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+
+    def list_users(self, **params):
+        response = self.client.get("/admin/all/users", query_string=params, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def test_keyset_pagination(self):
+        page = self.list_users(limit=2)
+        self.assertEqual([user['id'] for user in page['users']], [1, 2])
+        self.assertNotIn('password_hash', page['users'][0])
+        page = self.list_users(limit=2, cursor=page['next_cursor'])
+        self.assertEqual([user['id'] for user in page['users']], [3, 4])
+        page = self.list_users(limit=2, cursor=page['next_cursor'])
+        self.assertEqual([user['id'] for user in page['users']], [5])
+        self.assertIsNone(page['next_cursor'])
+
+    def test_filters(self):
+        page = self.list_users(is_active='false')
+        self.assertEqual([user['username'] for user in page['users']], ['user1'])
+        page = self.list_users(email='user2@')
+        self.assertEqual([user['username'] for user in page['users']], ['user2'])
+        page = self.list_users(created_after='2024-01-03', created_before='2024-01-05')
+        self.assertEqual([user['username'] for user in page['users']], ['user2', 'user3'])
+
+    def test_email_prefix_is_matched_literally(self):
+        db.session.add(User(username="under", email="a_b@shop.com", password_hash="not-a-hash"))
+        db.session.commit()
+        self.assertEqual([user['username'] for user in self.list_users(email='user%')['users']], [])
+        self.assertEqual([user['username'] for user in self.list_users(email='a_')['users']], ['under'])
+        self.assertEqual([user['username'] for user in self.list_users(email='u_')['users']], [])
+        self.assertEqual(self.list_users(email='user\U0010ffff')['users'], [])
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': '!!'}, {'limit': 500}, {'is_active': 'maybe'}, {'created_after': 'yesterday'}):
+            response = self.client.get("/admin/all/users", query_string=params, headers=self.headers)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_non_admin_is_rejected(self):
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        response = self.client.get("/admin/all/users", headers={"Authorization": f"Bearer {login.json['access_token']}"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_delete_runs_as_chunked_job(self):
+        self.app.config['USER_PURGE_CHUNK_SIZE'] = 2
+        self.app.config['USER_PURGE_PAUSE'] = 0
+        # Five of the ten units are held in the users' carts
+        product = Product(name="iphone 12", description="iphone 12 pro max", price=1000.0,
+                          quantity=10, stock=5, category="iphone")
+        db.session.add(product)
+        db.session.flush()
+        for user in User.query.all():
+            cart = Cart(user_id=user.id)
+            cart.items.append(CartItem(product_id=product.id, quantity=1, price=1000.0))
+            order = Order(user_id=user.id)
+            order.items.append(OrderItem(product_id=product.id, quantity=1, price=1000.0))
+            db.session.add_all([cart, order])
+        db.session.commit()
+
+        response = self.client.delete("/admin/all/users", headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json['job_id']
+        wait_for_purge(job_id, timeout=10)
+
+        response = self.client.get(response.json['status_url'], headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'completed')
+        self.assertEqual(response.json['total_users'], 5)
+        self.assertEqual(response.json['deleted_users'], 5)
+        self.assertEqual(response.json['deleted_carts'], 5)
+        self.assertEqual(response.json['deleted_orders'], 5)
+        for model in (User, Cart, CartItem, Order, OrderItem):
+            self.assertEqual(model.query.count(), 0, model.__name__)
+        self.assertEqual(Product.query.count(), 1)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Product, product.id).stock, 10)
+        self.assertEqual(reconcile_facets(fix=False), {})
+
+        response = self.client.get("/admin/jobs/purge/99", headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_only_one_purge_job_can_be_claimed(self):
+        # Left pending by a request that passed the running-job check at the same time
+        PurgeJob(status='pending', chunk_size=2).save()
+        self.assertIsNone(start_purge(self.app))
+        self.assertEqual(PurgeJob.query.count(), 1)
+
+        PurgeJob.query.update({'status': 'completed'})
+        db.session.commit()
+        job_id = start_purge(self.app)
+        self.assertIsNotNone(job_id)
+        wait_for_purge(job_id, timeout=10)
+        self.assertEqual(db.session.get(PurgeJob, job_id).status, 'completed')
+
+    def test_abandoned_purge_job_does_not_block_the_next_one(self):
+        self.app.config['USER_PURGE_TIMEOUT'] = 60
+        # Left running by a worker of another process
+        busy = PurgeJob(status='running', chunk_size=2, started_at=datetime.utcnow())
+        busy.save()
+        response = self.client.delete("/admin/all/users", headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+
+        busy.started_at = busy.updated_at = datetime.utcnow() - timedelta(minutes=5)
+        busy.save()
+        response = self.client.delete("/admin/all/users", headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        wait_for_purge(response.json['job_id'], timeout=10)
+        response = self.client.get(f"/admin/jobs/purge/{busy.id}", headers=self.headers)
+        self.assertEqual(response.json['status'], 'failed')
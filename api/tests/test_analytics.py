@@ -0,0 +1,91 @@
+from datetime import datetime
+from .base import AppTestCase
+from ..utils import db, jobs
+from ..models.products import Product
+from ..models.salesRollups import CategoryInventory, DailyCategorySales, DailyProductSales
+from ..analytics.rollups import backfill_rollups
+
+
+class TestSalesAnalytics(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.admin_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        self.user_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+
+        for name, category, price in (("iphone 12", "iphone", 1000.0), ("galaxy s21", "samsung", 800.0)):
+            response = self.client.post("/products/product", headers=self.admin_headers, json={
+                "name": name, "description": name, "quantity": 10, "price": price, "category": category})
+            self.assertEqual(response.status_code, 201)
+
+    def checkout(self, *lines):
+        for product_id, quantity in lines:
+            response = self.client.post("/cartItems/add", headers=self.user_headers,
+                                        json={"product_id": product_id, "quantity": quantity})
+            self.assertEqual(response.status_code, 201)
+        response = self.client.post("/orderItems/add_order_item", headers=self.user_headers)
+        self.assertEqual(response.status_code, 201)
+        # The rollups are updated by the job the checkout queued
+        self.assertEqual(jobs.run_pending(), 1)
+
+    def rollup_rows(self):
+        return {
+            'products': sorted((row.product_id, row.units, row.revenue) for row in DailyProductSales.query.all()),
+            'categories': sorted((row.category, row.units, row.revenue) for row in DailyCategorySales.query.all()),
+            'inventory': sorted((row.category, row.units, row.value) for row in CategoryInventory.query.all()),
+        }
+
+    def test_checkout_updates_rollups_incrementally(self):
+        self.checkout((1, 2), (2, 1))
+        self.checkout((1, 3))
+        today = datetime.utcnow().date()
+        self.assertEqual(DailyProductSales.query.get((today, 1)).units, 5)
+        self.assertEqual(DailyCategorySales.query.get((today, 'iphone')).revenue, 5000.0)
+        self.assertEqual(DailyCategorySales.query.get((today, 'samsung')).units, 1)
+        # Stock is reserved at add-to-cart time, so inventory reflects it already
+        self.assertEqual(CategoryInventory.query.get('iphone').units, 5)
+        self.assertEqual(CategoryInventory.query.get('samsung').value, 7200.0)
+
+    def test_backfill_matches_incremental_rollups(self):
+        self.checkout((1, 2), (2, 1))
+        product = Product.query.get(2)
+        product.price = 750.0
+        db.session.commit()
+        incremental = self.rollup_rows()
+        backfill_rollups()
+        db.session.expire_all()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_report_endpoints(self):
+        self.checkout((1, 2), (2, 3))
+
+        response = self.client.get("/admin/analytics/top_sellers", headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(p['name'], p['units']) for p in response.json['products']],
+                         [("galaxy s21", 3), ("iphone 12", 2)])
+
+        response = self.client.get("/admin/analytics/revenue", query_string={"group_by": "category"},
+                                   headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['revenue'], 4400.0)
+        self.assertEqual([point['category'] for point in response.json['series']], ['iphone', 'samsung'])
+
+        response = self.client.get("/admin/analytics/inventory", headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['units'], 15)
+        self.assertEqual(response.json['value'], 8000.0 + 5600.0)
+
+    def test_reports_are_admin_only_and_validated(self):
+        response = self.client.get("/admin/analytics/inventory", headers=self.user_headers)
+        self.assertEqual(response.status_code, 403)
+        for path, params in (("top_sellers", {"days": 0}), ("top_sellers", {"category": "phones"}),
+                             ("revenue", {"start": "2024-02-01", "end": "2024-01-01"}),
+                             ("revenue", {"group_by": "week"})):
+            response = self.client.get(f"/admin/analytics/{path}", query_string=params, headers=self.admin_headers)
+            self.assertEqual(response.status_code, 400, (path, params))
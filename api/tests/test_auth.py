@@ -1,26 +1,10 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
-from ..utils import db
-from werkzeug.security import generate_password_hash
+from .base import AppTestCase
 from ..models.users import User
-from ..models.logout import TokenBlockList
-from flask_jwt_extended import create_access_token
 
-class TestUserAuth(unittest.TestCase):
+class TestUserAuth(AppTestCase):
     
     def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-        self.appctx = self.app.app_context()
-        self.appctx.push()
-        
-        self.client = self.app.test_client()
-        db.create_all()
-    
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.appctx.pop()
+        super().setUp()
     
     def test_register_user(self):
         
@@ -113,4 +97,14 @@ class TestUserAuth(unittest.TestCase):
         
         
         
-        
\ No newline at end of file
+        
+    def test_admin_refresh_token(self):
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login_response = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        headers = {"Authorization": f"Bearer {login_response.json['refresh_token']}"}
+        response = self.client.post("/admin/auth/refresh", headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        # The new token still carries the admin role
+        headers = {"Authorization": f"Bearer {response.json['access_token']}"}
+        self.assertEqual(self.client.get("/admin/all/users", headers=headers).status_code, 200)
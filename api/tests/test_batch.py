@@ -0,0 +1,71 @@
+from flask import g
+from sqlalchemy import event
+from .base import AppTestCase
+from ..utils import cache, db
+from ..models.products import Product
+
+
+class TestBatch(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        @self.app.route('/_test/g')
+        def request_globals():
+            return {'keys': sorted(vars(g))}
+
+        for name in ("iphone 12", "iphone 13"):
+            db.session.add(Product(name=name, description=name, price=1000.0, quantity=10, stock=10, category="iphone"))
+        db.session.commit()
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        self.headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 1}, headers=self.headers)
+
+    def batch(self, *paths, headers=None):
+        return self.client.post("/batch", json={"requests": [{"path": path} for path in paths]},
+                                headers=headers or self.headers)
+
+    def test_runs_every_call_and_reports_its_status(self):
+        blocklist_queries = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            if 'token_blocklist' in statement:
+                blocklist_queries.append(statement)
+
+        # Start from a cold cache so the batch itself has to look the token up
+        cache.invalidate('blocklist')
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            response = self.batch("/products/product/1", "/products/product/2", "/products/product/99",
+                                  "/carts/cart_items/all?per_page=5")
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertEqual(response.status_code, 200)
+        calls = response.json['responses']
+        self.assertEqual([call['status'] for call in calls], [200, 200, 404, 200])
+        self.assertEqual(calls[1]['body']['name'], "iphone 13")
+        self.assertEqual(len(calls[3]['body']['cart_items']), 1)
+        # The token is checked against the blocklist once for the whole batch
+        self.assertEqual(len(blocklist_queries), 1)
+
+    def test_calls_do_not_see_each_others_request_globals(self):
+        response = self.batch("/products/product/1?fields=name", "/carts/cart_items/all", "/_test/g")
+        self.assertEqual([call['status'] for call in response.json['responses']], [200, 200, 200])
+        # Not the token decoded by the batch or an earlier call, nor its requested fields
+        self.assertEqual(response.json['responses'][2]['body'], {'keys': ['_jwt_blocklist_memo']})
+
+    def test_calls_without_a_token_are_unauthorised_individually(self):
+        response = self.client.post("/batch", json={"requests": [{"path": "/products/product/1"},
+                                                                 {"path": "/carts/cart_items/all"}]})
+        self.assertEqual([call['status'] for call in response.json['responses']], [200, 401])
+
+    def test_invalid_batches_are_rejected(self):
+        self.app.config['BATCH_MAX_REQUESTS'] = 2
+        for body in ({"requests": []},
+                     {"requests": [{"path": "products"}]},
+                     {"requests": [{"method": "POST", "path": "/cartItems/add"}]},
+                     {"requests": [{"path": "/batch"}]},
+                     {"requests": [{"path": "/products/product/1"}] * 3}):
+            response = self.client.post("/batch", json=body, headers=self.headers)
+            self.assertEqual(response.status_code, 400, body)
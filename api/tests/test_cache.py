@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sqlalchemy import event
+from .base import AppTestCase
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import cache, db
+from ..models.products import Product
+
+
+class TestSharedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        class SharedCacheConfig(config_dict['test']):
+            SQLALCHEMY_ECHO = False
+            CACHE_BACKEND = 'sqlite'
+            CACHE_SQLITE_PATH = os.path.join(self.tmpdir, 'cache.sqlite3')
+
+        # Two apps on one cache file stand in for two worker processes
+        self.workers = [create_app(config=SharedCacheConfig) for _ in range(2)]
+        self.loads = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get(self, worker, key, value):
+        def load():
+            self.loads.append((worker, key))
+            return value
+        with self.workers[worker].app_context():
+            return cache.get_or_load('product', key, load)
+
+    def invalidate(self, worker, key=None):
+        with self.workers[worker].app_context():
+            cache.invalidate('product', key)
+
+    def test_entries_and_invalidations_are_shared_between_workers(self):
+        self.assertEqual(self.get(0, 1, {'price': 10.0}), {'price': 10.0})
+        self.assertEqual(self.get(1, 1, {'price': 99.0}), {'price': 10.0})
+        self.assertEqual(self.loads, [(0, 1)])
+
+        self.invalidate(1, 1)
+        self.assertEqual(self.get(0, 1, {'price': 12.0}), {'price': 12.0})
+        self.assertEqual(self.get(0, 2, {'price': 20.0}), {'price': 20.0})
+        self.invalidate(0)
+        self.assertEqual(self.get(1, 1, {'price': 13.0}), {'price': 13.0})
+        self.assertEqual(self.get(1, 2, {'price': 21.0}), {'price': 21.0})
+        self.assertEqual(self.loads, [(0, 1), (0, 1), (0, 2), (1, 1), (1, 2)])
+        with self.workers[1].app_context():
+            stats = cache.stats()
+        self.assertEqual(stats['backend'], 'SQLiteBackend')
+        self.assertEqual(stats['namespaces'], [{'namespace': 'product', 'hits': 1, 'misses': 2, 'hit_rate': 1 / 3}])
+
+    def test_a_value_loaded_during_a_write_is_never_served(self):
+        def load_while_another_worker_writes():
+            self.invalidate(1, 1)
+            return {'price': 10.0}
+
+        with self.workers[0].app_context():
+            cache.get_or_load('product', 1, load_while_another_worker_writes)
+        self.assertEqual(self.get(0, 1, {'price': 11.0}), {'price': 11.0})
+
+
+class TestCachedLookups(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        self.client.post("/products/product", headers=self.headers, json={
+            "name": "iphone 12", "description": "iphone 12", "quantity": 10, "price": 1000.0, "category": "iphone"})
+
+    def count_queries(self, table, func):
+        queries = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if table in statement:
+                queries.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        return result, len(queries)
+
+    def test_product_reads_are_cached_until_the_product_changes(self):
+        first = self.client.get("/products/product/1")
+        response, queries = self.count_queries('FROM products', lambda: self.client.get("/products/product/1?fields=name,price"))
+        self.assertEqual(queries, 0)
+        self.assertEqual(response.json, {'name': 'iphone 12', 'price': 1000.0})
+
+        # A rolled back write leaves the cached product alone
+        db.session.get(Product, 1).price = 1.0
+        db.session.flush()
+        db.session.rollback()
+        _, queries = self.count_queries('FROM products', lambda: self.client.get("/products/product/1"))
+        self.assertEqual(queries, 0)
+
+        self.client.put("/products/product/1", headers=self.headers, json={
+            "name": "iphone 12", "description": "iphone 12", "quantity": 1, "price": 900.0, "category": "iphone"})
+        response = self.client.get("/products/product/1")
+        self.assertEqual((response.json['price'], response.json['stock']), (900.0, first.json['stock'] + 1))
+        self.assertEqual(response.json['category'], first.json['category'])
+
+    def test_logging_out_invalidates_the_cached_blocklist_check(self):
+        _, queries = self.count_queries('token_blocklist', lambda: self.client.get("/admin/jobs", headers=self.headers))
+        self.assertEqual(queries, 0)
+        self.assertEqual(self.client.post("/logout/user", headers=self.headers).status_code, 200)
+        self.assertEqual(self.client.get("/admin/jobs", headers=self.headers).status_code, 401)
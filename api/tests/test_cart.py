@@ -1,18 +1,9 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
-from ..utils import db
-from ..models.users import User
-from ..models.carts import Cart
+from .base import AppTestCase
 
-class TestCart(unittest.TestCase):
+class TestCart(AppTestCase):
     
     def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-        self.appctx = self.app.app_context()
-        self.appctx.push()        
-        self.client = self.app.test_client()
-        db.create_all()
+        super().setUp()
         
         self.user_data = {
             "username": "testapi",
@@ -43,11 +34,6 @@ class TestCart(unittest.TestCase):
             "price": 100.0,
             "category": "iphone"
         }
-    
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.appctx.pop()
         
     def test_create_cart(self):
         # Register a user
@@ -157,7 +143,6 @@ class TestCart(unittest.TestCase):
         cart_response = self.client.post("/carts/create_cart", headers={"Authorization": f"Bearer {access_token}"})
         self.assertEqual(cart_response.status_code, 201)
         cart_id = cart_response.json['id']
-        cart_user_id = cart_response.json['user_id']
         
         # Test: Create a product
         product_response = self.client.post("/products/product", headers={"Authorization": f"Bearer {admin_access_token}"}, json=self.product_data)
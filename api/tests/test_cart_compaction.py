@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, select, update
+from .base import AppTestCase
+from ..utils import db
+from ..models.carts import Cart
+from ..models.cartItems import CartItem
+from ..models.products import Product, category_name
+from ..models.salesRollups import CategoryInventory
+from ..admin.purge import wait_for_purge
+from ..products.facets import reconcile_facets
+from ..carts.compaction import compact_stale_carts
+
+
+class TestCartCompaction(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.admin_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        for name, quantity in (("iphone 12", 10), ("iphone se", 2)):
+            self.client.post("/products/product", headers=self.admin_headers, json={
+                "name": name, "description": name, "quantity": quantity, "price": 500.0, "category": "iphone"})
+        for index, lines in enumerate(([(1, 3), (2, 2)], [(1, 1)], [(1, 2)])):
+            email = f"user{index}@gmail.com"
+            self.client.post("/auth/register", json={"username": f"user{index}", "email": email, "password": "secret"})
+            login = self.client.post("/auth/login", json={"email": email, "password": "secret"})
+            headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+            for product_id, quantity in lines:
+                self.client.post("/cartItems/add", json={"product_id": product_id, "quantity": quantity}, headers=headers)
+        self.user_headers = headers
+
+    def age_carts(self, *cart_ids, days=4):
+        then = datetime.utcnow() - timedelta(days=days)
+        db.session.execute(update(Cart.__table__).where(Cart.id.in_(cart_ids)).values(created_at=then, updated_at=then))
+        db.session.commit()
+
+    def test_stale_carts_release_their_stock_in_batches(self):
+        self.age_carts(1, 2)
+        self.assertEqual(self.client.get("/products/product/2").json['stock'], 0)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('UPDATE products'):
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            result = compact_stale_carts(batch_size=1)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(result, {'carts': 2, 'items': 3, 'units': 6})
+        # One aggregated stock update per batch
+        self.assertEqual(len(statements), 2)
+
+        db.session.expire_all()
+        self.assertEqual([cart.id for cart in Cart.query.all()], [3])
+        self.assertEqual(CartItem.query.count(), 1)
+        self.assertEqual([db.session.get(Product, product_id).stock for product_id in (1, 2)], [8, 2])
+        self.assertEqual(self.client.get("/products/product/2").json['stock'], 2)
+        self.assertEqual(reconcile_facets(fix=False), {})
+
+        response = self.client.get("/admin/stats/cart_compaction", headers=self.admin_headers)
+        self.assertEqual((response.json['runs'], response.json['carts'], response.json['units']), (1, 2, 6))
+
+    def assert_inventory_matches_products(self):
+        db.session.expire_all()
+        stored = {row.category: (row.units, row.value) for row in CategoryInventory.query.all()}
+        actual = {category_name(category): (units, value) for category, units, value in db.session.execute(
+            select(Product.category, func.sum(Product.stock), func.sum(Product.stock * Product.price))
+            .group_by(Product.category)).all()}
+        self.assertEqual(stored, actual)
+
+    def test_released_stock_is_added_to_the_category_inventory(self):
+        self.assert_inventory_matches_products()
+        self.age_carts(1)
+        self.assertEqual(compact_stale_carts()['units'], 5)
+        self.assertEqual(db.session.get(CategoryInventory, 'iphone').units, 9)
+        self.assert_inventory_matches_products()
+
+        # The purge releases the carts it deletes the same way
+        response = self.client.delete("/admin/all/users", headers=self.admin_headers)
+        self.assertEqual(response.status_code, 202)
+        wait_for_purge(response.json['job_id'], timeout=10)
+        self.assertEqual(db.session.get(CategoryInventory, 'iphone').units, 12)
+        self.assert_inventory_matches_products()
+
+    def test_adding_to_a_cart_keeps_it_from_going_stale(self):
+        self.age_carts(3)
+        self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 1}, headers=self.user_headers)
+        self.assertEqual(compact_stale_carts()['carts'], 0)
+
+        self.age_carts(3)
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['carts-compact', '--max-age-hours', '24'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Deleted 1 carts and 1 items, releasing 3 units of stock", result.output)
+
+    def test_repeat_adds_release_all_their_stock(self):
+        self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 1}, headers=self.user_headers)
+        self.assertEqual(self.client.get("/products/product/1").json['stock'], 3)
+        self.age_carts(1, 2, 3)
+        self.assertEqual(compact_stale_carts()['units'], 9)
+        db.session.expire_all()
+        self.assertEqual([db.session.get(Product, product_id).stock for product_id in (1, 2)], [10, 2])
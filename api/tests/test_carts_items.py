@@ -1,21 +1,10 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
-from ..utils import db
-from ..models.users import Admin, User
-from ..models.products import Product
-from ..models.carts import Cart
-from ..models.cartItems import CartItem
+from .base import AppTestCase
 
 
-class TestUserCartItems(unittest.TestCase):
+class TestUserCartItems(AppTestCase):
     
     def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-        self.appctx = self.app.app_context()
-        self.appctx.push()
-        self.client = self.app.test_client()
-        db.create_all()
+        super().setUp()
         
         self.user_data = {
                 "username": "testapi",
@@ -53,11 +42,6 @@ class TestUserCartItems(unittest.TestCase):
             "quantity": 2,
             "price": 199.99
             }
-                   
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.appctx.pop()
         
     def test_add_cart_item(self):
         # Create user
@@ -0,0 +1,60 @@
+import gzip
+import json
+import zlib
+from flask import Response
+from .base import AppTestCase
+from ..utils import db
+from ..models.products import Product
+
+
+class TestCompression(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        @self.app.route('/_test/stream')
+        def stream():
+            return Response((f'line {i}\n' for i in range(3)), mimetype='text/plain')
+
+        for i in range(50):
+            db.session.add(Product(name=f"phone {i}", description="a phone with a long description " * 3,
+                                   price=100.0 + i, quantity=10, stock=10, category="iphone"))
+        db.session.commit()
+
+    def get_products(self, accept_encoding, per_page=50):
+        return self.client.get("/products/product", query_string={"per_page": per_page},
+                               headers={"Accept-Encoding": accept_encoding})
+
+    def test_gzip_large_json(self):
+        response = self.get_products("gzip, deflate")
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn('compress;dur=', response.headers['Server-Timing'])
+        body = gzip.decompress(response.get_data())
+        self.assertEqual(len(json.loads(body)['products']), 50)
+        self.assertLess(len(response.get_data()), len(body) / 4)
+
+    def test_negotiation(self):
+        response = self.get_products("gzip;q=0.5, deflate")
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(len(json.loads(zlib.decompress(response.get_data()))['products']), 50)
+        for accept_encoding in ("identity", "gzip;q=0, br"):
+            response = self.get_products(accept_encoding)
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertEqual(len(response.json['products']), 50)
+
+    def test_small_bodies_are_not_compressed(self):
+        response = self.client.get("/products/product/1", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(self.app.extensions['compression'].snapshot()['skipped_small'], 1)
+
+    def test_streamed_response_is_compressed_chunk_by_chunk(self):
+        response = self.client.get('/_test/stream', headers={"Accept-Encoding": "gzip"}, buffered=False)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = iter(response.response)
+        # Every chunk decodes on its own, without waiting for the end of the stream
+        self.assertEqual(decompressor.decompress(next(chunks)), b'line 0\n')
+        self.assertEqual(decompressor.decompress(b''.join(chunks)), b'line 1\nline 2\n')
+        response.close()
+        self.assertEqual(self.app.extensions['compression'].snapshot()['bytes_in'], 21)
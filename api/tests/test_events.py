@@ -0,0 +1,67 @@
+import json
+from unittest import mock
+from .base import AppTestCase
+from ..utils import event_log
+from ..utils.eventlog import _EventWriter
+from ..models.events import AuditEvent
+
+
+class TestEventLog(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.user_data = {
+            "username": "testapi",
+            "email": "testapi@gmail.com",
+            "password": "testapi"
+        }
+
+        self.admin_data = {
+            "username": "admin",
+            "email": "admin@gmail.com",
+            "password": "admin"
+        }
+
+        self.product_data = {
+            "name": "iphone 12",
+            "description": "iphone 12 pro max",
+            "quantity": 10,
+            "price": 1000.00,
+            "category": "iphone"
+        }
+
+    def test_cart_and_checkout_events_are_written(self):
+        self.client.post("/auth/register", json=self.user_data)
+        self.client.post("/admin/auth/register", json=self.admin_data)
+        user_token = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"}).json['access_token']
+        admin_token = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"}).json['access_token']
+        self.client.post("/products/product", json=self.product_data, headers={"Authorization": f"Bearer {admin_token}"})
+
+        headers = {"Authorization": f"Bearer {user_token}"}
+        response = self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 2}, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post("/orderItems/add_order_item", headers=headers)
+        self.assertEqual(response.status_code, 201)
+
+        event_log.flush(timeout=5)
+        events = AuditEvent.query.order_by(AuditEvent.id).all()
+        self.assertEqual([event.event_type for event in events], ['cart_item.added', 'order.checked_out'])
+        self.assertEqual(events[0].user_id, 1)
+        self.assertEqual(json.loads(events[0].payload)['quantity'], 2)
+
+    def test_close_flushes_queued_events(self):
+        for i in range(5):
+            self.assertTrue(event_log.record('cart.deleted', user_id=1, cart_id=i))
+        self.app.extensions['event_log'].close()
+        self.assertEqual(AuditEvent.query.count(), 5)
+
+    def test_full_queue_drops_events(self):
+        self.app.config['EVENT_LOG_QUEUE_SIZE'] = 2
+        writer = _EventWriter(self.app)
+        self.app.extensions['event_log'] = writer
+        # Keep the writer thread from draining the queue so it stays full
+        with mock.patch.object(_EventWriter, '_ensure_started'):
+            results = [event_log.record('cart.deleted', cart_id=i) for i in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(event_log.dropped, 1)
@@ -0,0 +1,116 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from sqlalchemy import event
+from .base import AppTestCase
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..models.productFacets import ProductFacet
+from ..products.facets import price_bucket, reconcile_facets
+
+
+class TestProductFacets(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.admin_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        for name, category, price, quantity in (("iphone 12", "iphone", 1200.0, 2), ("iphone se", "iphone", 450.0, 5),
+                                                 ("galaxy a5", "samsung", 180.0, 3)):
+            response = self.client.post("/products/product", headers=self.admin_headers, json={
+                "name": name, "description": name, "quantity": quantity, "price": price, "category": category})
+            self.assertEqual(response.status_code, 201)
+
+    def facets(self):
+        response = self.client.get("/products/facets")
+        self.assertEqual(response.status_code, 200)
+        return {facet: {row['value']: row['count'] for row in rows} for facet, rows in response.json.items()}
+
+    def test_price_buckets(self):
+        self.assertEqual([price_bucket(price) for price in (0, 99.99, 100, 999, 1000, 5000)],
+                         ['0-100', '0-100', '100-250', '500-1000', '1000+', '1000+'])
+
+    def test_counts_follow_product_writes_and_stock_changes(self):
+        self.assertEqual(self.facets(), {'category': {'iphone': 2, 'samsung': 1},
+                                         'price': {'100-250': 1, '250-500': 1, '1000+': 1}})
+
+        # Selling out the iphone 12 removes it from every facet
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        response = self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 2},
+                                    headers={"Authorization": f"Bearer {login.json['access_token']}"})
+        self.assertEqual(response.status_code, 201)
+        self.client.put("/products/product/2", headers=self.admin_headers, json={"quantity": 0, "price": 1500.0})
+        self.client.delete("/products/product/3", headers=self.admin_headers)
+
+        self.assertEqual(self.facets(), {'category': {'iphone': 1}, 'price': {'1000+': 1}})
+        self.assertEqual(reconcile_facets(fix=False), {})
+
+    def test_reconcile_fixes_drift(self):
+        db.session.get(ProductFacet, ('category', 'samsung')).count = 7
+        db.session.commit()
+        self.assertEqual(reconcile_facets(), {('category', 'samsung'): (7, 1)})
+        self.assertEqual(self.facets()['category']['samsung'], 1)
+        self.assertEqual(reconcile_facets(fix=False), {})
+
+
+class TestFacetReconcileLock(AppTestCase):
+
+    def setUp(self):
+        # A database file, so a second connection can try to write while the recount runs
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'shop.sqlite3')
+
+        class FileConfig(config_dict['test']):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + self.path
+
+        self.config = FileConfig
+        super().setUp()
+        db.session.add(ProductFacet(facet='category', value='samsung', count=7))
+        db.session.commit()
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_product_writes_wait_for_the_reconciliation(self):
+        blocked = []
+
+        def write_meanwhile(conn, cursor, statement, parameters, context, executemany):
+            if 'FROM product_facets' in statement and not blocked:
+                other = sqlite3.connect(self.path, timeout=0)
+                try:
+                    other.execute("UPDATE product_facets SET count = count + 1")
+                except sqlite3.OperationalError as e:
+                    blocked.append(str(e))
+                finally:
+                    other.close()
+
+        event.listen(db.engine, 'before_cursor_execute', write_meanwhile)
+        try:
+            self.assertEqual(reconcile_facets(), {('category', 'samsung'): (7, 0)})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', write_meanwhile)
+        self.assertEqual(blocked, ['database is locked'])
+        self.assertEqual(reconcile_facets(fix=False), {})
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_runs_jobs_periodically_in_an_app_context(self):
+        app = create_app(config=config_dict['test'])
+        runs = []
+        app.extensions['scheduler'].add('tick', 0.01, lambda: runs.append(app.name))
+        try:
+            deadline = time.monotonic() + 5
+            while len(runs) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            app.extensions['scheduler'].close()
+        self.assertGreaterEqual(len(runs), 2)
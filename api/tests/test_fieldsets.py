@@ -0,0 +1,58 @@
+from sqlalchemy import event
+from .base import AppTestCase
+from ..utils import db
+from ..models.products import Product
+
+
+class TestSparseFieldsets(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        for i in range(3):
+            db.session.add(Product(name=f"phone {i}", description="long description " * 20, price=100.0 + i,
+                                   quantity=10, stock=10, category="iphone"))
+        db.session.commit()
+        # Start from an empty identity map so the requests below load products themselves
+        db.session.expunge_all()
+
+    def capture_selects(self):
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            # The pagination count wraps the query in a subquery; only the row fetch matters here
+            if statement.startswith('SELECT products.') and 'FROM products' in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute', capture)
+        return statements
+
+    def test_list_returns_and_loads_only_requested_fields(self):
+        statements = self.capture_selects()
+        response = self.client.get("/products/product", query_string={"fields": "id,name,price", "per_page": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['products'][0], {"id": 1, "name": "phone 0", "price": 100.0})
+        self.assertEqual(response.json['pagination']['total'], 3)
+        self.assertTrue(statements)
+        self.assertFalse(any('products.description' in statement for statement in statements))
+
+    def test_detail_and_default_output(self):
+        response = self.client.get("/products/product/2", query_string={"fields": "stock"})
+        self.assertEqual(response.json, {"stock": 10})
+        response = self.client.get("/products/product/2")
+        self.assertIn("description", response.json)
+
+    def test_cart_items_fields(self):
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 2}, headers=headers)
+        response = self.client.get("/carts/cart_items/all", query_string={"fields": "product_id,quantity"},
+                                   headers=headers)
+        self.assertEqual(response.json['cart_items'], [{"product_id": 1, "quantity": 2}])
+
+    def test_unknown_fields_are_rejected(self):
+        for value in ("id,password", ","):
+            response = self.client.get("/products/product", query_string={"fields": value})
+            self.assertEqual(response.status_code, 400, value)
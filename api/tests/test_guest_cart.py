@@ -0,0 +1,88 @@
+from sqlalchemy import event
+from .base import AppTestCase
+from ..utils import db
+from ..models.carts import Cart
+from ..models.products import Product
+
+
+class TestGuestCart(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        admin_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        for name, price, quantity in (("iphone 12", 1000.0, 10), ("iphone se", 400.0, 5), ("iphone 8", 200.0, 1)):
+            self.client.post("/products/product", headers=admin_headers, json={
+                "name": name, "description": name, "quantity": quantity, "price": price, "category": "iphone"})
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+
+    def test_browsing_with_a_guest_cart_writes_nothing(self):
+        writes = []
+
+        def record_write(conn, cursor, statement, parameters, context, executemany):
+            if not statement.lstrip().upper().startswith('SELECT'):
+                writes.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record_write)
+        try:
+            response = self.client.post("/carts/guest/items", json={"product_id": 1, "quantity": 2})
+            self.assertEqual(response.status_code, 200)
+            self.client.post("/carts/guest/items", json={"product_id": 2, "quantity": 1})
+            self.client.post("/carts/guest/items", json={"product_id": 1, "quantity": 1})
+            response = self.client.delete("/carts/guest/items/2")
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get("/carts/guest")
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record_write)
+        self.assertEqual(writes, [])
+        self.assertEqual([(line['product_id'], line['quantity']) for line in response.json['items']], [(1, 3)])
+        self.assertEqual(response.json['total'], 3000.0)
+        self.assertEqual(Cart.query.count(), 0)
+
+    def test_tampered_oversized_and_overstocked_carts_are_refused(self):
+        response = self.client.get("/carts/guest", headers={"X-Guest-Cart": "W1sxLDUwXV0.forged.signature"})
+        self.assertEqual(response.json['items'], [])
+        response = self.client.post("/carts/guest/items", json={"product_id": 3, "quantity": 2})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/carts/guest/items", json={"product_id": 9, "quantity": 1})
+        self.assertEqual(response.status_code, 404)
+
+        self.app.config['GUEST_CART_MAX_ITEMS'] = 1
+        self.client.post("/carts/guest/items", json={"product_id": 1, "quantity": 1})
+        response = self.client.post("/carts/guest/items", json={"product_id": 2, "quantity": 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_login_merges_the_guest_cart_in_one_transaction(self):
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 1}, headers=headers)
+
+        # A fresh client: the visitor's cart lives only in their token
+        guest = self.app.test_client()
+        guest.post("/carts/guest/items", json={"product_id": 1, "quantity": 2})
+        guest.post("/carts/guest/items", json={"product_id": 2, "quantity": 2})
+        token = guest.post("/carts/guest/items", json={"product_id": 3, "quantity": 1}).json['guest_cart']
+        # Someone else buys the last iphone 8 before the visitor logs in
+        db.session.get(Product, 3).stock = 0
+        db.session.commit()
+
+        commits = []
+        record_commit = commits.append
+        event.listen(db.session, 'after_commit', record_commit)
+        try:
+            response = guest.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"},
+                                  headers={"X-Guest-Cart": token})
+        finally:
+            event.remove(db.session, 'after_commit', record_commit)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['guest_cart'], {'merged': [1, 2], 'skipped': [3]})
+        self.assertEqual(len(commits), 1)
+        self.assertIn('guest_cart=;', response.headers['Set-Cookie'])
+
+        db.session.expire_all()
+        cart = Cart.query.filter_by(user_id=1).one()
+        self.assertEqual(sorted((item.product_id, item.quantity, item.price) for item in cart.items),
+                         [(1, 3, 3000.0), (2, 2, 800.0)])
+        self.assertEqual([db.session.get(Product, product_id).stock for product_id in (1, 2)], [7, 3])
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from .base import AppTestCase
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db
+from ..models.cartItems import CartItem
+from ..models.idempotencyKeys import IdempotencyKey
+from ..models.orderItems import OrderItem
+from ..models.products import Product
+from ..utils.idempotency import _fingerprint, claim, complete
+
+
+class TestIdempotencyKeys(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        db.session.add(Product(name="iphone 12", description="iphone 12", price=1000.0, quantity=10, stock=10,
+                               category="iphone"))
+        db.session.commit()
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        self.token = login.json['access_token']
+
+    def add_to_cart(self, key, quantity=2):
+        return self.client.post("/cartItems/add", json={"product_id": 1, "quantity": quantity},
+                                headers={"Authorization": f"Bearer {self.token}", "Idempotency-Key": key})
+
+    def test_retried_add_to_cart_is_replayed(self):
+        first = self.add_to_cart("add-1")
+        retry = self.add_to_cart("add-1")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.json), (201, first.json))
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(CartItem.query.one().quantity, 2)
+        self.assertEqual(db.session.get(Product, 1).stock, 8)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.add_to_cart("add-1")
+        self.assertEqual(self.add_to_cart("add-1", quantity=3).status_code, 422)
+
+    def test_retried_checkout_places_one_order(self):
+        self.add_to_cart("add-1")
+        headers = {"Authorization": f"Bearer {self.token}", "Idempotency-Key": "checkout-1"}
+        first = self.client.post("/orderItems/add_order_item", headers=headers)
+        retry = self.client.post("/orderItems/add_order_item", headers=headers)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.json), (201, first.json))
+        self.assertEqual(OrderItem.query.count(), 1)
+
+        # Without the key the retry runs again and finds the cart gone
+        headers.pop("Idempotency-Key")
+        self.assertEqual(self.client.post("/orderItems/add_order_item", headers=headers).status_code, 404)
+
+
+class TestIdempotencyAcrossWorkers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        class WorkerConfig(config_dict['test']):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.tmpdir, 'shop.sqlite3')
+            IDEMPOTENCY_WAIT_SECONDS = 0.2
+
+        # Two apps on one database stand for two worker processes
+        self.workers = [create_app(config=WorkerConfig) for _ in range(2)]
+        with self.workers[0].app_context():
+            db.create_all()
+            db.session.add(Product(name="iphone 12", description="iphone 12", price=1000.0, quantity=10, stock=10,
+                                   category="iphone"))
+            db.session.commit()
+        client = self.workers[0].test_client()
+        client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        self.token = login.json['access_token']
+        self.body = {"product_id": 1, "quantity": 2}
+
+    def tearDown(self):
+        for app in self.workers:
+            app.extensions['event_log'].close()
+            with app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def add_to_cart(self, worker, key):
+        return self.workers[worker].test_client().post(
+            "/cartItems/add", json=self.body, headers={"Authorization": f"Bearer {self.token}", "Idempotency-Key": key})
+
+    def claim_on_first_worker(self, key):
+        """Claim key on worker 0 as a request that is still running would."""
+        with self.workers[0].test_request_context("/cartItems/add", method="POST", json=self.body):
+            entry_id, owner = claim(("testapi@gmail.com", "POST", "/cartItems/add", key), _fingerprint())
+        self.assertTrue(owner)
+        return entry_id
+
+    def stock(self):
+        with self.workers[0].app_context():
+            return db.session.get(Product, 1).stock
+
+    def test_retry_on_another_worker_is_replayed(self):
+        first = self.add_to_cart(0, "add-1")
+        retry = self.add_to_cart(1, "add-1")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.json), (201, first.json))
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.stock(), 8)
+
+    def test_retry_waits_for_the_request_running_on_another_worker(self):
+        entry_id = self.claim_on_first_worker("add-1")
+        self.assertEqual(self.add_to_cart(1, "add-1").status_code, 409)
+
+        with self.workers[0].app_context():
+            complete(entry_id, ({'message': 'Product added to cart'}, 201, {}))
+        retry = self.add_to_cart(1, "add-1")
+        self.assertEqual((retry.status_code, retry.json), (201, {'message': 'Product added to cart'}))
+        self.assertEqual(self.stock(), 10)
+
+    def test_claim_of_a_dead_worker_is_taken_over_after_its_lease(self):
+        entry_id = self.claim_on_first_worker("add-1")
+        with self.workers[0].app_context():
+            db.session.execute(update(IdempotencyKey).where(IdempotencyKey.id == entry_id)
+                               .values(locked_until=datetime.utcnow() - timedelta(seconds=1)))
+            db.session.commit()
+        self.assertEqual(self.add_to_cart(1, "add-1").status_code, 201)
+        self.assertEqual(self.stock(), 8)
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from .base import AppTestCase
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db, jobs
+from ..models.jobs import Job
+
+calls = []
+
+
+@jobs.task('tests.flaky')
+def flaky_task(fail_times):
+    calls.append(datetime.utcnow())
+    if len(calls) <= fail_times:
+        raise RuntimeError(f"failure {len(calls)}")
+    db.session.add(Job(name='tests.marker', max_attempts=1, status='done'))
+
+
+class TestJobQueue(AppTestCase):
+
+    def setUp(self):
+        calls.clear()
+        super().setUp()
+        self.app.config.update(JOBS_MAX_ATTEMPTS=3, JOBS_BACKOFF_SECONDS=0)
+
+    def test_checkout_queues_the_rollup_update(self):
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.client.post("/products/product", headers={"Authorization": f"Bearer {login.json['access_token']}"}, json={
+            "name": "iphone 12", "description": "iphone 12", "quantity": 10, "price": 1000.0, "category": "iphone"})
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 2}, headers=headers)
+        response = self.client.post("/orderItems/add_order_item", headers=headers)
+        self.assertEqual(response.status_code, 201)
+
+        job = Job.query.one()
+        self.assertEqual((job.name, job.status), ('analytics.record_sales', 'queued'))
+        self.assertEqual(jobs.run_pending(), 1)
+        db.session.expire_all()
+        self.assertEqual((job.status, job.attempts), ('done', 1))
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_failed_jobs_are_retried_then_dead_lettered(self):
+        jobs.enqueue('tests.flaky', fail_times=1)
+        db.session.commit()
+        self.assertEqual(jobs.run_pending(), 2)
+        job = Job.query.filter_by(name='tests.flaky').one()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('done', 2, None))
+        # The task's writes are committed with its successful attempt only
+        self.assertEqual(Job.query.filter_by(name='tests.marker').count(), 1)
+
+        calls.clear()
+        self.app.config['JOBS_BACKOFF_SECONDS'] = 60
+        jobs.enqueue('tests.flaky', fail_times=10)
+        db.session.commit()
+        self.assertEqual(jobs.run_pending(), 1)
+        job = Job.query.filter_by(name='tests.flaky', status='queued').one()
+        self.assertGreater(job.run_at, datetime.utcnow())
+        self.assertEqual(job.last_error, 'RuntimeError: failure 1')
+
+        self.app.config['JOBS_BACKOFF_SECONDS'] = 0
+        job.run_at = datetime.utcnow()
+        db.session.commit()
+        self.assertEqual(jobs.run_pending(), 2)
+        db.session.expire_all()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('dead', 3, 'RuntimeError: failure 3'))
+
+    def test_admins_list_and_retry_dead_jobs(self):
+        jobs.enqueue('tests.flaky', fail_times=3)
+        db.session.commit()
+        jobs.run_pending()
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+
+        response = self.client.get("/admin/jobs", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(job['name'], job['attempts']) for job in response.json['jobs']], [('tests.flaky', 3)])
+        job_id = response.json['jobs'][0]['id']
+        self.assertEqual(self.client.post(f"/admin/jobs/{job_id}/retry", headers=headers).status_code, 200)
+        self.assertEqual(self.client.post(f"/admin/jobs/{job_id}/retry", headers=headers).status_code, 409)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(db.session.get(Job, job_id).status, 'done')
+
+
+class TestJobWorkers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        class WorkerTestConfig(config_dict['test']):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.tmpdir, 'jobs.sqlite3')
+            SQLALCHEMY_ECHO = False
+            JOBS_WORKERS = 2
+
+        calls.clear()
+        self.app = create_app(config=WorkerTestConfig)
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        self.app.extensions['jobs'].close()
+        self.app.extensions['scheduler'].close()
+        with self.app.app_context():
+            db.drop_all()
+            for engine in db.engines.values():
+                engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def test_workers_run_jobs_once_committed(self):
+        with self.app.app_context():
+            for _ in range(5):
+                jobs.enqueue('tests.flaky', fail_times=0)
+            db.session.commit()
+            deadline = time.monotonic() + 10
+            while Job.query.filter_by(name='tests.flaky', status='done').count() < 5 and time.monotonic() < deadline:
+                time.sleep(0.05)
+                db.session.remove()
+            self.assertEqual(Job.query.filter_by(name='tests.flaky', status='done').count(), 5)
+        self.assertEqual(len(calls), 5)
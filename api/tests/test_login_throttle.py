@@ -0,0 +1,103 @@
+from unittest import mock
+from sqlalchemy import event
+from .base import AppTestCase
+from ..config.config import config_dict
+from ..utils import db
+
+
+class TestLoginThrottle(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        self.throttle = self.app.extensions['login_throttle']
+        self.throttle.clock = lambda: self.now
+
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+
+    def login(self, password, email="testapi@gmail.com", path="/auth/login", ip="10.0.0.1"):
+        return self.client.post(path, json={"email": email, "password": password},
+                                environ_base={'REMOTE_ADDR': ip})
+
+    def test_failures_back_off_then_lock_the_account_out(self):
+        for _ in range(3):
+            self.assertEqual(self.login("wrong").status_code, 401)
+        self.assertEqual(self.login("wrong").status_code, 401)
+        # Fourth failure: one second before the next attempt, then two after the fifth
+        response = self.login("testapi")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.now += 1
+        self.assertEqual(self.login("wrong").status_code, 401)
+        self.assertEqual(self.login("wrong").headers['Retry-After'], '2')
+
+        for _ in range(5):
+            self.now += 60
+            self.assertEqual(self.login("wrong").status_code, 401)
+        response = self.login("testapi")
+        self.assertEqual((response.status_code, response.headers['Retry-After']), (429, '900'))
+        # Other accounts from the same address are not affected
+        self.assertEqual(self.login("admin", email="admin@gmail.com", path="/admin/auth/login").status_code, 200)
+
+        self.now += 900
+        self.assertEqual(self.login("testapi").status_code, 200)
+
+    def test_rejected_attempts_skip_the_database_and_the_hash(self):
+        for _ in range(10):
+            self.now += 60
+            self.login("wrong", email="admin@gmail.com", path="/admin/auth/login")
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            with mock.patch('api.models.users.check_password_hash') as check_password_hash:
+                response = self.login("admin", email="Admin@gmail.com", path="/admin/auth/login")
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(statements, [])
+        check_password_hash.assert_not_called()
+
+    def test_credential_stuffing_from_one_address_is_slowed_down(self):
+        statuses = []
+        for index in range(30):
+            self.now += 0.1
+            statuses.append(self.login("secret", email=f"victim{index}@gmail.com").status_code)
+        # Twenty free failures, one more that starts the backoff, then turned away
+        self.assertEqual(statuses, [404] * 21 + [429] * 9)
+        self.assertEqual(self.login("testapi").status_code, 429)
+        self.assertEqual(self.login("testapi", ip="10.0.0.2").status_code, 200)
+
+        login = self.login("admin", email="admin@gmail.com", path="/admin/auth/login", ip="10.0.0.2")
+        response = self.client.get("/admin/stats/login_throttle", headers={"Authorization": f"Bearer {login.json['access_token']}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({key: response.json[key] for key in ('failures', 'rejected', 'lockouts')},
+                         {'failures': 21, 'rejected': 10, 'lockouts': 0})
+
+
+class TestLoginThrottleBehindProxy(AppTestCase):
+
+    class config(config_dict['test']):
+        PROXY_FIX_X_FOR = 1
+
+    def setUp(self):
+        super().setUp()
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+
+    def login(self, email, forwarded_for):
+        # Every request reaches the app from the proxy's address
+        return self.client.post("/auth/login", json={"email": email, "password": "secret"},
+                                environ_base={'REMOTE_ADDR': '10.0.0.1'},
+                                headers={'X-Forwarded-For': forwarded_for})
+
+    def test_clients_are_keyed_on_the_forwarded_address(self):
+        statuses = [self.login(f"victim{index}@gmail.com", "198.51.100.7").status_code for index in range(22)]
+        self.assertEqual(statuses, [404] * 21 + [429])
+        # Another client behind the same proxy is not affected
+        self.assertEqual(self.login("testapi@gmail.com", "203.0.113.9").status_code, 401)
+        # Only the hop added by the proxy is trusted, not an address the client made up
+        self.assertEqual(self.login("victim0@gmail.com", "203.0.113.9, 198.51.100.7").status_code, 429)
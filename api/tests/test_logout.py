@@ -1,19 +1,9 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
-from ..utils import db
-from werkzeug.security import generate_password_hash
-from ..models.users import User
+from .base import AppTestCase
 from ..models.logout import TokenBlockList
-from flask_jwt_extended import create_access_token, get_jwt
 
-class TestLogOut(unittest.TestCase):
+class TestLogOut(AppTestCase):
     def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-        self.appctx = self.app.app_context()
-        self.appctx.push()   
-        self.client = self.app.test_client()
-        db.create_all()
+        super().setUp()
         self.token_block_list = TokenBlockList.query.all()
         self.assertEqual(len(self.token_block_list), 0)
         
@@ -27,15 +17,10 @@ class TestLogOut(unittest.TestCase):
             "email": "testapi@gmail.com",
             "password": "testapi"
         }
-    
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.appctx.pop()
         
     def test_logout_user(self):
         # Register a user
-        register_response = self.client.post("/auth/register", json=self.user_data)
+        self.client.post("/auth/register", json=self.user_data)
         
         # Login the user
         login_response = self.client.post("/auth/login", json=self.login_user)
@@ -0,0 +1,68 @@
+from sqlalchemy import select
+from .base import AppTestCase
+from ..utils import db
+from ..models.products import Product
+
+
+class TestLowStock(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.admin_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        self.user_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+
+        response = self.client.post("/products/product", headers=self.admin_headers, json={
+            "name": "iphone 12", "description": "iphone 12", "quantity": 10, "price": 1000.0,
+            "category": "iphone", "reorder_threshold": 4})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['reorder_threshold'], 4)
+        response = self.client.post("/products/product", headers=self.admin_headers, json={
+            "name": "galaxy s21", "description": "galaxy s21", "quantity": 3, "price": 800.0, "category": "samsung"})
+        self.assertEqual(response.json['reorder_threshold'], 5)
+
+    def low_stock(self, **params):
+        response = self.client.get("/products/low_stock", query_string=params, headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.json['products']]
+
+    def alerts(self, since_id=0):
+        response = self.client.get("/products/low_stock/alerts", query_string={"since_id": since_id},
+                                   headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def test_lists_products_below_threshold(self):
+        self.assertEqual(self.low_stock(), ["galaxy s21"])
+        response = self.client.put("/products/product/2", headers=self.admin_headers,
+                                   json={"quantity": 0, "price": 800.0, "reorder_threshold": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.low_stock(), [])
+        response = self.client.get("/products/low_stock", headers=self.user_headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_low_stock_query_uses_partial_index(self):
+        query = select(Product.id).where(Product.stock < Product.reorder_threshold).order_by(Product.stock, Product.id)
+        sql = str(query.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")))
+        self.assertIn('ix_products_low_stock', plan)
+
+    def test_crossing_threshold_emits_one_alert(self):
+        response = self.client.post("/cartItems/add", headers=self.user_headers, json={"product_id": 1, "quantity": 5})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.alerts()['alerts'], [])
+
+        # The second add takes the stock from 5 to 3, below the threshold of 4
+        response = self.client.post("/cartItems/add", headers=self.user_headers, json={"product_id": 1, "quantity": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get("/products/product/1").json['stock'], 3)
+        feed = self.alerts()
+        self.assertEqual([(a['product_id'], a['reorder_threshold']) for a in feed['alerts']], [(1, 4)])
+        self.assertEqual(self.alerts(since_id=feed['last_id'])['alerts'], [])
+        # Both at a stock of 3, in id order
+        self.assertEqual(self.low_stock(), ["iphone 12", "galaxy s21"])
@@ -1,17 +1,10 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
-from ..utils import db
-from ..models.users import Admin, User
+from .base import AppTestCase
 from ..models.orders import Order
+from ..utils import db
 
-class TestUserOrder(unittest.TestCase):
+class TestUserOrder(AppTestCase):
     def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-        self.appctx = self.app.app_context()
-        self.appctx.push()
-        self.client = self.app.test_client()
-        db.create_all()
+        super().setUp()
 
         self.user_data = {
             "username": "testapi",
@@ -24,11 +17,6 @@ class TestUserOrder(unittest.TestCase):
             "password": "testapi"
         }
     
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.appctx.pop()
-    
     def test_create_order(self):
         # Create a user
         response = self.client.post('/auth/register', json=self.user_data)
@@ -65,12 +53,40 @@ class TestUserOrder(unittest.TestCase):
         response = self.client.post('/orders/create_order', headers={'Authorization': f"Bearer {access_token}"})
         self.assertEqual(response.status_code, 201)
         
-        # Cancel the order
-        response = self.client.delete('/orders/cancel_order', headers={'Authorization': f"Bearer {access_token}"})
+        order_id = Order.query.one().id
+
+        # Cancel the order: it is kept, in the cancelled status
+        response = self.client.delete(f'/orders/cancel_order?order_id={order_id}', headers={'Authorization': f"Bearer {access_token}"})
         self.assertEqual(response.status_code, 200)
         data = response.get_json()
         self.assertIn('message', data)
-        self.assertEqual(data['message'], 'Order deleted successfully')
-        
-        order = Order.query.first()
-        self.assertIsNone(order)
\ No newline at end of file
+        self.assertEqual(data['message'], 'Order cancelled successfully')
+
+        db.session.expire_all()
+        self.assertEqual(Order.query.one().status, 'cancelled')
+
+        # A cancelled order cannot be cancelled again, and other orders are not touched
+        response = self.client.delete(f'/orders/cancel_order?order_id={order_id}', headers={'Authorization': f"Bearer {access_token}"})
+        self.assertEqual(response.status_code, 409)
+        response = self.client.delete('/orders/cancel_order?order_id=99', headers={'Authorization': f"Bearer {access_token}"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_shipped_orders_cannot_be_cancelled(self):
+        self.client.post('/auth/register', json=self.user_data)
+        access_token = self.client.post('/auth/login', json=self.login_user).get_json()['access_token']
+        headers = {'Authorization': f"Bearer {access_token}"}
+        # One order paid, one shipped and one delivered, each moved along its valid transitions
+        for steps in (['paid'], ['paid', 'shipped'], ['paid', 'shipped', 'delivered']):
+            self.client.post('/orders/create_order', headers=headers)
+            order = Order.query.order_by(Order.id.desc()).first()
+            for status in steps:
+                order.status = status
+            db.session.commit()
+        orders = Order.query.order_by(Order.id).all()
+
+        statuses = [self.client.delete(f'/orders/cancel_order?order_id={order.id}', headers=headers).status_code
+                    for order in orders]
+        self.assertEqual(statuses, [200, 409, 409])
+        db.session.expire_all()
+        self.assertEqual([order.status for order in Order.query.order_by(Order.id)], ['cancelled', 'shipped', 'delivered'])
+        self.assertEqual(self.client.delete('/orders/cancel_order', headers=headers).status_code, 400)
@@ -1,18 +1,10 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
-from ..utils import db
-from ..models.users import Admin, User
+from .base import AppTestCase
 from ..models.cartItems import CartItem
 
 
-class TestUserOrderItems(unittest.TestCase):
+class TestUserOrderItems(AppTestCase):
     def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-        self.appctx = self.app.app_context()
-        self.appctx.push()
-        self.client = self.app.test_client()
-        db.create_all()
+        super().setUp()
 
         self.user_data = {
             "username": "testapi",
@@ -51,12 +43,6 @@ class TestUserOrderItems(unittest.TestCase):
             "price": 199.99
             }
         
-        
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.appctx.pop()
-        
 
     def test_place_an_order(self):
         # Create a user
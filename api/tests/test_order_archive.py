@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from .base import AppTestCase
+from ..utils import db
+from ..models.archivedOrders import ArchivedOrder
+from ..models.orderItems import OrderItem
+from ..models.orders import Order
+from ..orders.archive import archive_orders
+
+
+class TestOrderArchive(AppTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        super().setUp()
+        self.app.config.update(ORDER_ARCHIVE_DIR=self.tmpdir, ORDER_ARCHIVE_BLOCK_SIZE=2)
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.admin_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        for name in ("iphone 12", "iphone se"):
+            self.client.post("/products/product", headers=self.admin_headers, json={
+                "name": name, "description": name, "quantity": 20, "price": 500.0, "category": "iphone"})
+        self.user_headers = []
+        for index in range(2):
+            email = f"user{index}@gmail.com"
+            self.client.post("/auth/register", json={"username": f"user{index}", "email": email, "password": "secret"})
+            login = self.client.post("/auth/login", json={"email": email, "password": "secret"})
+            self.user_headers.append({"Authorization": f"Bearer {login.json['access_token']}"})
+        # Orders 1-4 belong to user0, order 5 to user1
+        for user_id in (1, 1, 1, 1, 2):
+            order = Order(user_id=user_id)
+            order.items = [OrderItem(product_id=1, quantity=1, price=500.0),
+                           OrderItem(product_id=2, quantity=2, price=1000.0)]
+            db.session.add(order)
+        db.session.commit()
+        old = datetime.utcnow() - timedelta(days=400)
+        db.session.execute(update(Order.__table__).values(status='delivered', created_at=old))
+        db.session.execute(update(Order.__table__).where(Order.id == 3).values(status='paid'))
+        db.session.commit()
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.tmpdir)
+
+    def test_old_final_orders_move_to_compressed_segments(self):
+        result = archive_orders(datetime.utcnow() - timedelta(days=365), chunk_size=3)
+        self.assertEqual((result['orders'], result['items']), (4, 8))
+        self.assertEqual(len(result['segments']), 1)
+
+        self.assertEqual([order.id for order in Order.query.all()], [3])
+        self.assertEqual({item.order_id for item in OrderItem.query.all()}, {3})
+        entries = ArchivedOrder.query.order_by(ArchivedOrder.order_id).all()
+        self.assertEqual([entry.order_id for entry in entries], [1, 2, 4, 5])
+        # Chunks of 3 orders in blocks of 2: blocks of orders 1-2, 4 and 5
+        self.assertEqual(len({entry.offset for entry in entries}), 3)
+
+        with gzip.open(os.path.join(self.tmpdir, result['segments'][0]), 'rt') as segment:
+            records = [json.loads(line) for line in segment]
+        self.assertEqual([record['id'] for record in records], [1, 2, 4, 5])
+        self.assertEqual([(item['product_id'], item['quantity']) for item in records[3]['items']], [(1, 1), (2, 2)])
+        self.assertEqual(archive_orders(datetime.utcnow())['orders'], 0)
+
+    def test_archived_orders_are_read_back_by_id(self):
+        archive_orders(datetime.utcnow() - timedelta(days=365))
+        response = self.client.get("/orders/archive/4", headers=self.user_headers[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json['id'], response.json['user_id'], response.json['status']), (4, 1, 'delivered'))
+        self.assertEqual([item['price'] for item in response.json['items']], [500.0, 1000.0])
+        self.assertEqual(self.client.get("/orders/archive/4", headers=self.user_headers[1]).status_code, 404)
+        self.assertEqual(self.client.get("/orders/archive/3", headers=self.user_headers[0]).status_code, 404)
+        self.assertEqual(self.client.get("/orders/archive/5", headers=self.admin_headers).json['user_id'], 2)
+
+    def test_cli_archives_with_the_configured_age(self):
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['orders-archive', '--older-than-days', '500'])
+        self.assertIn("Archived 0 orders and 0 items", result.output)
+        result = runner.invoke(args=['orders-archive'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Archived 4 orders and 8 items into orders-main-", result.output)
@@ -0,0 +1,98 @@
+from .base import AppTestCase
+from ..utils import db
+from ..models.orders import InvalidTransition, Order
+from ..orders import transitions
+
+
+class TestOrderTransitions(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.admin_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        self.client.post("/auth/register", json={"username": "testapi", "email": "testapi@gmail.com", "password": "testapi"})
+        login = self.client.post("/auth/login", json={"email": "testapi@gmail.com", "password": "testapi"})
+        self.user_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+
+        # Orders 1-4 pending, 5 shipped
+        db.session.add_all([Order(user_id=1) for _ in range(4)] + [Order(user_id=1, status='pending')])
+        db.session.commit()
+        order = db.session.get(Order, 5)
+        order.status = 'paid'
+        order.status = 'shipped'
+        db.session.commit()
+
+    def statuses(self):
+        db.session.expire_all()
+        return [order.status for order in Order.query.order_by(Order.id)]
+
+    def test_orm_writes_follow_the_state_machine(self):
+        order = db.session.get(Order, 1)
+        with self.assertRaises(InvalidTransition):
+            order.status = 'delivered'
+        with self.assertRaises(InvalidTransition):
+            order.status = 'lost'
+        order.status = 'cancelled'
+        with self.assertRaises(InvalidTransition):
+            order.status = 'paid'
+
+    def test_bulk_transition_reports_rejected_orders(self):
+        response = self.client.post("/orders/transitions", headers=self.admin_headers,
+                                    json={"order_ids": [1, 2, 3, 5, 99], "status": "paid"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['updated'], 3)
+        self.assertEqual(response.json['rejected'], [{'id': 5, 'status': 'shipped'}, {'id': 99, 'status': None}])
+        self.assertEqual(self.statuses(), ['paid', 'paid', 'paid', 'pending', 'shipped'])
+
+        response = self.client.post("/orders/transitions", headers=self.admin_headers,
+                                    json={"order_ids": [1, 4, 5], "status": "shipped"})
+        self.assertEqual(response.json['updated'], 1)
+        self.assertEqual([row['id'] for row in response.json['rejected']], [4, 5])
+
+        response = self.client.post("/orders/transitions", headers=self.user_headers,
+                                    json={"order_ids": [1], "status": "delivered"})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post("/orders/transitions", headers=self.admin_headers,
+                                    json={"order_ids": [1], "status": "lost"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_transition_chunks_large_batches(self):
+        db.session.add_all([Order(user_id=1) for _ in range(20)])
+        db.session.commit()
+        chunk_size, transitions.CHUNK_SIZE = transitions.CHUNK_SIZE, 7
+        try:
+            updated, rejected = transitions.bulk_transition(list(range(1, 26)), 'cancelled')
+        finally:
+            transitions.CHUNK_SIZE = chunk_size
+        db.session.commit()
+        self.assertEqual(updated, [order_id for order_id in range(1, 26) if order_id != 5])
+        self.assertEqual(rejected, {5: 'shipped'})
+
+    def test_queue_pages_through_one_status(self):
+        response = self.client.get("/orders/queue?status=pending&limit=3", headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order['id'] for order in response.json['orders']], [1, 2, 3])
+        response = self.client.get(f"/orders/queue?status=pending&limit=3&cursor={response.json['next_cursor']}",
+                                   headers=self.admin_headers)
+        self.assertEqual([order['id'] for order in response.json['orders']], [4])
+        self.assertIsNone(response.json['next_cursor'])
+
+    def test_checkout_after_a_transition_starts_a_new_order(self):
+        self.client.post("/products/product", headers=self.admin_headers, json={
+            "name": "iphone 12", "description": "iphone 12", "quantity": 10, "price": 500.0, "category": "iphone"})
+        # Order 1 is the user's oldest pending order; checkout adds to the newest one
+        self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 1}, headers=self.user_headers)
+        self.assertEqual(self.client.post("/orderItems/add_order_item", headers=self.user_headers).status_code, 201)
+        self.assertEqual(len(db.session.get(Order, 4).items), 1)
+
+        self.client.post("/orders/transitions", headers=self.admin_headers, json={"order_ids": [1, 2, 3, 4], "status": "paid"})
+        self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 2}, headers=self.user_headers)
+        response = self.client.post("/orderItems/add_order_item", headers=self.user_headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("order.id:6", response.json['message'])
+        db.session.expire_all()
+        self.assertEqual([item.quantity for item in db.session.get(Order, 4).items], [1])
+        self.assertEqual((db.session.get(Order, 6).status, [item.quantity for item in db.session.get(Order, 6).items]),
+                         ('pending', [2]))
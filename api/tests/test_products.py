@@ -1,24 +1,11 @@
-import unittest
-from .. import create_app
-from ..config.config import config_dict
-from ..utils import db
+from .base import AppTestCase
 from ..models.users import Admin
 from ..models.products import Product
 
-class TestUserProduct(unittest.TestCase):
+class TestUserProduct(AppTestCase):
     
     def setUp(self):
-        self.app = create_app(config=config_dict['test'])
-        self.appctx = self.app.app_context()
-        self.appctx.push()
-        
-        self.client = self.app.test_client()
-        db.create_all()
-    
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.appctx.pop()
+        super().setUp()
     
     # Test to add a product
     def test_add_product(self):
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import db, replicas
+from ..utils.replicas import STICKY_COOKIE, STICKY_HEADER
+
+
+class TestReadReplicas(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        primary = os.path.join(self.tmpdir, 'primary.sqlite3')
+        replica = os.path.join(self.tmpdir, 'replica.sqlite3')
+
+        class ReplicaTestConfig(config_dict['test']):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + primary
+            REPLICA_DATABASE_URIS = ['sqlite:///' + replica]
+            REPLICA_STICKY_SECONDS = 60
+
+        # No app context is kept pushed, so every request gets its own g like in production
+        self.config = ReplicaTestConfig
+        self.app = create_app(config=ReplicaTestConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+        replicas.sync(self.app)
+
+        self.admin_data = {
+            "username": "admin",
+            "email": "admin@gmail.com",
+            "password": "admin"
+        }
+
+        self.product_data = {
+            "name": "iphone 12",
+            "description": "iphone 12 pro max",
+            "quantity": 10,
+            "price": 1000.00,
+            "category": "iphone"
+        }
+
+    def tearDown(self):
+        self.app.extensions['event_log'].close()
+        with self.app.app_context():
+            db.drop_all()
+            for engine in db.engines.values():
+                engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def test_reads_go_to_replica_and_writers_stick_to_primary(self):
+        self.client.post("/admin/auth/register", json=self.admin_data)
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        response = self.client.post("/products/product", json=self.product_data, headers=headers)
+        self.assertEqual(response.status_code, 201)
+
+        # Anonymous reads hit the replica, which has not caught up yet
+        response = self.client.get("/products/product")
+        self.assertEqual(response.json['pagination']['total'], 0)
+
+        # The admin who just wrote reads their own write from the primary
+        response = self.client.get("/products/product", headers=headers)
+        self.assertEqual(response.json['pagination']['total'], 1)
+
+        replicas.sync(self.app)
+        response = self.client.get("/products/product")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['products'][0]['name'], "iphone 12")
+
+    def test_writers_stick_to_primary_on_another_worker(self):
+        # A second worker on the same databases, which never saw the write
+        other = create_app(config=self.config)
+        other_client = other.test_client()
+        try:
+            self.client.post("/admin/auth/register", json=self.admin_data)
+            login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+            headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+            response = self.client.post("/products/product", json=self.product_data, headers=headers)
+            self.assertEqual(response.status_code, 201)
+            token = response.headers[STICKY_HEADER]
+
+            # Without the marker the other worker reads the stale replica
+            response = other_client.get("/products/product", headers=headers)
+            self.assertEqual(response.json['pagination']['total'], 0)
+
+            response = other_client.get("/products/product",
+                                        headers={**headers, STICKY_HEADER: token})
+            self.assertEqual(response.json['pagination']['total'], 1)
+
+            other_client.set_cookie(STICKY_COOKIE, self.client.get_cookie(STICKY_COOKIE).value)
+            response = other_client.get("/products/product", headers=headers)
+            self.assertEqual(response.json['pagination']['total'], 1)
+
+            # The marker is only honoured for the user it was issued to
+            response = other_client.get("/products/product")
+            self.assertEqual(response.json['pagination']['total'], 0)
+        finally:
+            other.extensions['event_log'].close()
+            with other.app_context():
+                for engine in db.engines.values():
+                    engine.dispose()
+
+    def test_cache_misses_are_filled_from_the_primary(self):
+        self.client.post("/admin/auth/register", json=self.admin_data)
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        self.client.post("/products/product", json=self.product_data, headers=headers)
+        replicas.sync(self.app)
+        self.assertEqual(self.client.get("/products/product/1").json['price'], 1000.0)
+
+        response = self.client.put("/products/product/1", headers=headers, json={**self.product_data, "price": 555.0})
+        self.assertEqual(response.status_code, 200)
+        # The replica still has the old price; the anonymous miss must not cache it
+        self.assertEqual(self.client.get("/products/product/1").json['price'], 555.0)
+        self.assertEqual(self.client.get("/products/product/1", headers=headers).json['price'], 555.0)
+
+    def test_without_replicas_reads_use_primary(self):
+        app = create_app(config=config_dict['test'])
+        self.assertEqual(app.extensions['replicas'].keys, [])
+        with app.app_context():
+            db.create_all()
+            response = app.test_client().get("/products/product")
+            self.assertEqual(response.status_code, 200)
+            db.session.remove()
+            db.drop_all()
@@ -0,0 +1,61 @@
+from .base import AppTestCase
+from ..utils import db
+from ..models.products import Product
+from ..products.search import build_match_expression, rebuild_search_index
+
+
+class TestProductSearch(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        for name, description, category in [
+            ("Galaxy S21", "Android flagship", "samsung"),
+            ("iPhone 12", "Apple phone", "iphone"),
+            ("Pixel 7", "Android phone from Google, rivals the galaxy", "google"),
+        ]:
+            db.session.add(Product(name=name, description=description, price=500.0,
+                                   quantity=5, stock=5, category=category))
+        db.session.commit()
+
+    def search(self, **params):
+        response = self.client.get("/products/search", query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.json['products']]
+
+    def test_prefix_search_ranks_name_matches_first(self):
+        self.assertEqual(self.search(q="gal"), ["Galaxy S21", "Pixel 7"])
+
+    def test_category_filter(self):
+        self.assertEqual(self.search(q="android", category="google"), ["Pixel 7"])
+        response = self.client.get("/products/search", query_string={"q": "android", "category": "apple"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_updates_and_deletes(self):
+        product = Product.query.filter_by(name="iPhone 12").first()
+        product.name = "iPhone 15"
+        db.session.commit()
+        self.assertEqual(self.search(q="iphone 15"), ["iPhone 15"])
+        self.assertEqual(self.search(q="12"), [])
+
+        product.delete()
+        self.assertEqual(self.search(q="iphone"), [])
+
+    def test_pagination(self):
+        response = self.client.get("/products/search", query_string={"q": "android", "per_page": 1})
+        self.assertEqual(response.json['next_page'], 2)
+        response = self.client.get("/products/search", query_string={"q": "android", "per_page": 1, "page": 2})
+        self.assertIsNone(response.json['next_page'])
+        self.assertEqual(len(response.json['products']), 1)
+
+    def test_rebuild_command(self):
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('delete-all')")
+        self.assertEqual(self.search(q="pixel"), [])
+        result = self.app.test_cli_runner().invoke(rebuild_search_index)
+        self.assertIn("3 products", result.output)
+        self.assertEqual(self.search(q="pixel"), ["Pixel 7"])
+
+    def test_match_expression_quotes_user_input(self):
+        self.assertEqual(build_match_expression('iph" OR x'), '{name description} : ("iph"* AND "or"* AND "x"*)')
+        self.assertIsNone(build_match_expression('"*'))
@@ -0,0 +1,63 @@
+from sqlalchemy import delete, func, select
+from .base import AppTestCase
+from ..utils import db
+from ..utils.seed import seed_database
+from ..models.cartItems import CartItem
+from ..models.carts import Cart
+from ..models.orderItems import OrderItem
+from ..models.orders import Order, ORDER_TRANSITIONS
+from ..models.products import Product
+from ..models.users import User
+from ..products.facets import reconcile_facets
+
+TABLES = (OrderItem, Order, CartItem, Cart, User, Product)
+
+
+class TestSeed(AppTestCase):
+
+    def snapshot(self):
+        return {
+            'products': db.session.execute(select(Product.name, Product.price, Product.category, Product.stock)
+                                           .order_by(Product.id)).all(),
+            'orders': db.session.execute(select(Order.user_id, Order.status).order_by(Order.id)).all(),
+            'items': db.session.execute(select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity)
+                                        .order_by(OrderItem.id)).all(),
+            'carts': db.session.execute(select(CartItem.cart_id, CartItem.product_id, CartItem.quantity)
+                                        .order_by(CartItem.id)).all(),
+        }
+
+    def clear(self):
+        for model in TABLES:
+            db.session.execute(delete(model.__table__))
+        db.session.commit()
+
+    def test_seeded_data_is_consistent(self):
+        result = self.app.test_cli_runner().invoke(args=[
+            'seed', '--products', '300', '--users', '120', '--seed', '3', '--batch-size', '50'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("products: 300", result.output)
+        self.assertIn("users: 120", result.output)
+
+        self.assertEqual(Product.query.count(), 300)
+        self.assertGreater(Order.query.count(), 120)
+        self.assertEqual(reconcile_facets(fix=False), {})
+        # Stock held in carts is taken off the products
+        held = db.session.scalar(select(func.sum(CartItem.quantity)))
+        self.assertEqual(held, db.session.scalar(select(func.sum(Product.quantity - Product.stock))))
+        self.assertEqual(db.session.scalar(select(func.count()).where(Product.stock < 0)), 0)
+        self.assertTrue({order.status for order in Order.query.all()} <= set(ORDER_TRANSITIONS))
+        self.assertEqual(db.session.scalar(select(func.count(Order.id)).where(~Order.items.any())), 0)
+
+        # Seeded users log in with the shared password
+        response = self.client.post("/auth/login", json={"email": "seed1@example.com", "password": "password"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_the_same_seed_gives_the_same_rows(self):
+        seed_database(products=100, users=50, seed=11, batch_size=32)
+        first = self.snapshot()
+        self.clear()
+        seed_database(products=100, users=50, seed=11, batch_size=7)
+        self.assertEqual(self.snapshot(), first)
+        self.clear()
+        seed_database(products=100, users=50, seed=12)
+        self.assertNotEqual(self.snapshot()['products'], first['products'])
@@ -0,0 +1,122 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from .. import create_app
+from ..config.config import config_dict
+from ..admin.purge import wait_for_purge
+from ..analytics.rollups import backfill_rollups
+from ..utils import db, shards
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        primary = os.path.join(self.tmpdir, 'primary.sqlite3')
+        self.shard_files = [os.path.join(self.tmpdir, f'shard{index}.sqlite3') for index in range(2)]
+
+        class ShardTestConfig(config_dict['test']):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + primary
+            SHARD_DATABASE_URIS = ['sqlite:///' + path for path in self.shard_files]
+
+        # No app context is kept pushed, so every request gets its own g like in production
+        self.app = create_app(config=ShardTestConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+        shards.create_schema(db, self.app)
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.admin_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        response = self.client.post("/products/product", headers=self.admin_headers, json={
+            "name": "iphone 12", "description": "iphone 12 pro max", "quantity": 10, "price": 1000.0, "category": "iphone"})
+        self.assertEqual(response.status_code, 201)
+
+        # Users 1 and 3 land on shard 1, user 2 on shard 0
+        self.user_headers = []
+        for name in ("ada", "bob", "cy"):
+            self.client.post("/auth/register", json={"username": name, "email": f"{name}@gmail.com", "password": name})
+            login = self.client.post("/auth/login", json={"email": f"{name}@gmail.com", "password": name})
+            headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+            response = self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 1}, headers=headers)
+            self.assertEqual(response.status_code, 201)
+            self.user_headers.append(headers)
+
+    def tearDown(self):
+        self.app.extensions['event_log'].close()
+        shards.drop_schema(db, self.app)
+        with self.app.app_context():
+            db.drop_all()
+            for engine in db.engines.values():
+                engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def cart_owners(self, path):
+        connection = sqlite3.connect(path)
+        try:
+            return sorted(row[0] for row in connection.execute("SELECT user_id FROM carts"))
+        finally:
+            connection.close()
+
+    def test_user_data_goes_to_the_users_shard(self):
+        self.assertEqual(self.cart_owners(self.shard_files[0]), [2])
+        self.assertEqual(self.cart_owners(self.shard_files[1]), [1, 3])
+
+        # Each user reads back their own cart from their shard; products stay on the primary
+        response = self.client.get("/carts/cart_items/all", headers=self.user_headers[1])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['product_id'] for item in response.json['cart_items']], [1])
+        with self.app.app_context():
+            self.assertEqual(db.session.execute(db.text("SELECT stock FROM products")).scalar(), 7)
+
+    def test_checkout_and_rollup_backfill_read_the_shards(self):
+        for headers in self.user_headers:
+            response = self.client.post("/orderItems/add_order_item", headers=headers)
+            self.assertEqual(response.status_code, 201)
+        with self.app.app_context():
+            self.assertEqual(backfill_rollups(), 1)
+            self.assertEqual(db.session.execute(
+                db.text("SELECT units, revenue FROM daily_product_sales")).one(), (3, 3000.0))
+
+    def test_listing_all_carts_fans_out_over_every_shard(self):
+        response = self.client.get("/carts/cart/all?per_page=2", headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['pagination']['total'], 3)
+        self.assertEqual(response.json['pagination']['pages'], 2)
+        first_page = [cart[0]['user_id'] for cart in response.json['carts']]
+
+        response = self.client.get("/carts/cart/all?per_page=2&page=2", headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        second_page = [cart[0]['user_id'] for cart in response.json['carts']]
+        self.assertEqual(sorted(first_page + second_page), [1, 2, 3])
+
+    def test_purging_users_removes_their_rows_from_every_shard(self):
+        response = self.client.delete("/admin/all/users", headers=self.admin_headers)
+        self.assertEqual(response.status_code, 202)
+        wait_for_purge(response.json['job_id'], timeout=10)
+        for path in self.shard_files:
+            self.assertEqual(self.cart_owners(path), [])
+        response = self.client.get(f"/admin/jobs/purge/{response.json['job_id']}", headers=self.admin_headers)
+        self.assertEqual((response.json['status'], response.json['deleted_users'], response.json['deleted_carts']),
+                         ('completed', 3, 3))
+
+    def test_deleting_a_user_removes_their_rows_from_their_shard(self):
+        # Bob, on shard 0, checks out his cart and starts a new one
+        response = self.client.post("/orderItems/add_order_item", headers=self.user_headers[1])
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post("/cartItems/add", json={"product_id": 1, "quantity": 1}, headers=self.user_headers[1])
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.delete("/admin/users/2", headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get("/admin/users/2", headers=self.admin_headers).status_code, 404)
+        connection = sqlite3.connect(self.shard_files[0])
+        try:
+            for table in ("carts", "cart_items", "orders", "order_items"):
+                self.assertEqual(connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0], 0, table)
+        finally:
+            connection.close()
+        self.assertEqual(self.cart_owners(self.shard_files[1]), [1, 3])
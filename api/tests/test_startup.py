@@ -0,0 +1,79 @@
+import gc
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import weakref
+from .. import create_app
+from ..config.config import config_dict
+from ..utils import shutdown
+from ..utils.openapi import export_openapi
+
+
+class TestStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.spec_path = os.path.join(self.tmpdir, 'swagger.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_app(self, **settings):
+        config = type('StartupTestConfig', (config_dict['test'],), settings)
+        return create_app(config=config)
+
+    def test_lazy_namespaces_register_on_first_request(self):
+        app = self.make_app(LAZY_NAMESPACES=True)
+        self.assertFalse(app.extensions['namespaces'].registered)
+        self.assertNotIn('/products/product', [rule.rule for rule in app.url_map.iter_rules()])
+
+        response = app.test_client().get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(app.extensions['namespaces'].registered)
+        self.assertIn('/products/product', response.json['paths'])
+
+    def test_exported_spec_is_served(self):
+        app = self.make_app(LAZY_NAMESPACES=True)
+        result = app.test_cli_runner().invoke(export_openapi, ['--output', self.spec_path])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with open(self.spec_path) as spec_file:
+            spec = json.load(spec_file)
+        self.assertIn('/auth/login', spec['paths'])
+
+        spec['info']['title'] = 'Prebuilt'
+        with open(self.spec_path, 'w') as spec_file:
+            json.dump(spec, spec_file)
+        app = self.make_app(SWAGGER_SPEC_PATH=self.spec_path)
+        response = app.test_client().get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['info']['title'], 'Prebuilt')
+
+    def test_docs_can_be_disabled(self):
+        self.assertEqual(self.make_app().test_client().get('/').status_code, 200)
+        app = self.make_app(SWAGGER_UI_ENABLED=False)
+        self.assertEqual(app.test_client().get('/').status_code, 404)
+        self.assertEqual(app.test_client().get('/swagger.json').status_code, 200)
+
+    def test_exit_hook_does_not_keep_dropped_apps_alive(self):
+        app = self.make_app()
+        for name in ('event_log', 'jobs', 'scheduler'):
+            self.assertIn(app.extensions[name], shutdown._open)
+
+        dropped = weakref.ref(app.extensions['event_log'])
+        app.extensions.clear()
+        gc.collect()
+        self.assertIsNone(dropped())
+
+    def test_exit_hook_closes_what_is_still_open(self):
+        class Resource:
+            closed = False
+
+            def close(self):
+                self.closed = True
+
+        resource = Resource()
+        shutdown.close_at_exit(resource)
+        shutdown._close_all()
+        self.assertTrue(resource.closed)
@@ -0,0 +1,75 @@
+import json
+import unittest
+from werkzeug.test import EnvironBuilder
+from .base import AppTestCase
+from ..utils.pubsub import Subscription
+
+
+class TestSubscription(unittest.TestCase):
+
+    def test_rapid_updates_are_coalesced(self):
+        subscription = Subscription(['product:1'], buffer_size=10)
+        for stock in (9, 8, 7):
+            subscription.offer(1, {'id': 1, 'stock': stock})
+        subscription.offer(2, {'id': 2, 'stock': 3})
+        self.assertEqual(subscription.get(timeout=0.1), (False, [{'id': 1, 'stock': 7}, {'id': 2, 'stock': 3}]))
+        self.assertEqual(subscription.get(timeout=0.01), (False, []))
+
+    def test_full_buffer_reports_overflow(self):
+        subscription = Subscription(['category:iphone'], buffer_size=2)
+        for product_id in range(3):
+            subscription.offer(product_id, {'id': product_id})
+        self.assertEqual(subscription.get(timeout=0.1), (True, []))
+        subscription.close()
+        self.assertIsNone(subscription.get(timeout=0.1))
+
+
+class TestProductStream(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.app.config.update(SSE_HEARTBEAT_SECONDS=0.05, SSE_COALESCE_SECONDS=0.0, SSE_MAX_STREAM_SECONDS=5.0)
+
+        self.client.post("/admin/auth/register", json={"username": "admin", "email": "admin@gmail.com", "password": "admin"})
+        login = self.client.post("/admin/auth/login", json={"email": "admin@gmail.com", "password": "admin"})
+        self.admin_headers = {"Authorization": f"Bearer {login.json['access_token']}"}
+        self.client.post("/products/product", headers=self.admin_headers, json={
+            "name": "iphone 12", "description": "iphone 12", "quantity": 10, "price": 1000.0, "category": "iphone"})
+
+    def next_event(self, chunks):
+        for chunk in chunks:
+            chunk = chunk.decode()
+            if chunk.startswith('event: product'):
+                return json.loads(chunk.split('data: ', 1)[1])
+
+    def test_stream_sends_snapshot_then_committed_changes(self):
+        response = self.client.get("/products/stream", query_string={"product_id": "1"}, buffered=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = iter(response.response)
+        self.assertEqual(self.next_event(chunks)['stock'], 10)
+
+        self.client.put("/products/product/1", headers=self.admin_headers, json={"quantity": 5, "price": 900.0})
+        event = self.next_event(chunks)
+        self.assertEqual((event['price'], event['stock']), (900.0, 15))
+        response.close()
+        self.assertEqual(self.app.extensions['pubsub'].subscribers, 0)
+
+    def test_stream_closed_before_it_starts_releases_its_subscription(self):
+        # Called as a WSGI server would, without the test client reading the first chunk
+        environ = EnvironBuilder(path="/products/stream", query_string={"category": "iphone"}).get_environ()
+        statuses = []
+        body = self.app(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        self.assertEqual(statuses, ['200 OK'])
+        self.assertEqual(self.app.extensions['pubsub'].subscribers, 1)
+        # The client went away before a single chunk was sent
+        body.close()
+        self.assertEqual(self.app.extensions['pubsub'].subscribers, 0)
+
+    def test_invalid_subscriptions_are_rejected(self):
+        for params in ({}, {"product_id": "one"}, {"category": "phones"}):
+            response = self.client.get("/products/stream", query_string=params)
+            self.assertEqual(response.status_code, 400, params)
+        self.app.config['SSE_MAX_TOPICS'] = 1
+        response = self.client.get("/products/stream", query_string={"product_id": "1,2"})
+        self.assertEqual(response.status_code, 400)
@@ -1,7 +1,6 @@
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource
 from flask_jwt_extended import jwt_required, get_jwt
 from ..models.logout import TokenBlockList
-from flask import request
 
 logout_namespace = Namespace('logout', description='Logout User')
 
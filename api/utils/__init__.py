@@ -1,5 +1,23 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
+from .eventlog import EventLog
+from .replicas import ReplicaRouter, RoutingSession
+from .pubsub import PubSub
+from .compression import Compression
+from .idempotency import Idempotency
+from .scheduler import Scheduler
+from .sharding import ShardRouter
+from .jobs import JobQueue
+from .cache import Cache
 
-db = SQLAlchemy()
-jwt = JWTManager()
\ No newline at end of file
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+jwt = JWTManager()
+event_log = EventLog()
+replicas = ReplicaRouter()
+pubsub = PubSub()
+compression = Compression()
+idempotency = Idempotency()
+scheduler = Scheduler()
+shards = ShardRouter(tables=('carts', 'cart_items', 'orders', 'order_items'))
+jobs = JobQueue()
+cache = Cache()
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+# Expiry of entries that must outlive every cached value, such as namespace versions
+_FOREVER = 1e18
+
+
+class Cache:
+    """
+        Read-through cache for hot lookups (products, token blocklist, JWT claims) with versioned
+        invalidation. Every value is stored with the version of its namespace and of its own key;
+        invalidating bumps a version, so stale values stop matching wherever they are stored,
+        including values a concurrent reader loaded just before the write committed.
+        CACHE_BACKEND picks where entries live: 'memory' (this process only) or 'sqlite', a file
+        shared by every worker process on the host, so one worker's invalidation reaches all.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_SQLITE_PATH', '')
+        app.config.setdefault('CACHE_TTL', 60.0)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 10000)
+        backend = app.config['CACHE_BACKEND']
+        if backend == 'memory':
+            store = MemoryBackend(app.config['CACHE_MAX_ENTRIES'])
+        elif backend == 'sqlite':
+            store = SQLiteBackend(app.config['CACHE_SQLITE_PATH'] or default_sqlite_path(app))
+        else:
+            raise ValueError("CACHE_BACKEND must be 'memory' or 'sqlite'")
+        app.extensions['cache'] = _CacheState(store, app.config['CACHE_TTL'])
+
+    def get_or_load(self, namespace, key, loader):
+        """The cached value of namespace/key, or loader()'s result, which is cached unless it is None."""
+        return current_app.extensions['cache'].get_or_load(namespace, str(key), loader)
+
+    def invalidate(self, namespace, key=None):
+        """Invalidate one key now, or the whole namespace when key is None."""
+        current_app.extensions['cache'].invalidate(namespace, None if key is None else str(key))
+
+    def invalidate_on_commit(self, session, namespace, key=None):
+        """Invalidate once the session's transaction commits; nothing happens if it rolls back."""
+        session.info.setdefault('cache_invalidations', set()).add((namespace, None if key is None else str(key)))
+
+    def stats(self):
+        return current_app.extensions['cache'].stats()
+
+
+class _CacheState:
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def get_or_load(self, namespace, key, loader):
+        namespace_version, key_version, item_key = _version_key(namespace), _version_key(namespace, key), f'{namespace}:{key}'
+        try:
+            found = self.store.get_many((namespace_version, key_version, item_key))
+        except Exception as e:
+            logger.warning(f"Cache read failed, loading {item_key} directly: {str(e)}")
+            return loader()
+        versions = [found.get(namespace_version, 0), found.get(key_version, 0)]
+        item = found.get(item_key)
+        if item is not None and item[0] == versions:
+            self.hits[namespace] += 1
+            return item[1]
+        self.misses[namespace] += 1
+        value = loader()
+        if value is not None:
+            try:
+                # Stored with the versions read before loading: a write committed meanwhile
+                # has bumped them, and this value is then never served
+                self.store.set(item_key, [versions, value], self.ttl)
+            except Exception as e:
+                logger.warning(f"Cache write failed for {item_key}: {str(e)}")
+        return value
+
+    def invalidate(self, namespace, key=None):
+        try:
+            if key is None:
+                self.store.incr(_version_key(namespace), _FOREVER)
+            else:
+                # Outlives every value stored under the previous version
+                self.store.incr(_version_key(namespace, key), 2 * self.ttl)
+        except Exception as e:
+            logger.error(f"Cache invalidation of {namespace}:{key} failed: {str(e)}")
+
+    def stats(self):
+        namespaces = sorted(set(self.hits) | set(self.misses))
+        return {
+            'backend': type(self.store).__name__,
+            'namespaces': [{'namespace': namespace, 'hits': self.hits[namespace], 'misses': self.misses[namespace],
+                            'hit_rate': self.hits[namespace] / ((self.hits[namespace] + self.misses[namespace]) or 1)}
+                           for namespace in namespaces],
+        }
+
+
+def _version_key(namespace, key=None):
+    return f'{namespace}#version' if key is None else f'{namespace}:{key}#version'
+
+
+def default_sqlite_path(app):
+    """One cache file per database, so apps on other databases (e.g. tests) never share entries."""
+    digest = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'phonestore-cache-{digest}.sqlite3')
+
+
+class MemoryBackend:
+    """Entries in a dict of this process, evicting the least recently used beyond max_entries."""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[0]
+        return found
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+            value = (entry[0] if entry and entry[1] > time.time() else 0) + 1
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            return value
+
+
+class SQLiteBackend:
+    """
+        Entries in a SQLite file on local disk, shared by every process that opens it.
+        WAL mode lets readers run alongside the one writer; values are stored as JSON.
+        Each thread keeps its own connection. Expired rows are pruned now and then on writes.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Losing the last writes on power failure only costs cache misses
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+
+    def get_many(self, keys):
+        keys = list(keys)
+        rows = self._connection().execute(
+            f"SELECT key, value FROM cache_entries WHERE key IN ({', '.join('?' * len(keys))}) AND expires_at > ?",
+            (*keys, time.time())).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        now = time.time()
+        connection.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                           (key, json.dumps(value), now + ttl))
+        if random.random() < 0.01:
+            connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+
+    def incr(self, key, ttl):
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?",
+                                     (key, now)).fetchone()
+            value = (json.loads(row[0]) if row else 0) + 1
+            connection.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                               (key, json.dumps(value), now + ttl))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return value
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    invalidations = session.info.pop('cache_invalidations', None)
+    if not invalidations or not has_app_context() or 'cache' not in current_app.extensions:
+        return
+    state = current_app.extensions['cache']
+    for namespace, key in invalidations:
+        state.invalidate(namespace, key)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('cache_invalidations', None)
@@ -0,0 +1,137 @@
+import threading
+import time
+import zlib
+from flask import current_app, request
+
+# wbits for zlib.compressobj: gzip container, and the zlib container that HTTP calls "deflate"
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+class Compression:
+    """
+        Compresses responses with gzip or deflate, whichever the client prefers in Accept-Encoding.
+        Bodies smaller than COMPRESS_MIN_SIZE, other media types and responses that already carry
+        a Content-Encoding are sent as they are. Streamed responses are compressed chunk by chunk
+        and flushed after every chunk, so streaming clients are not held up by the compressor.
+        Every compressed response reports its cost in a Server-Timing header, and the totals are
+        kept per process for GET /admin/stats/compression.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_MIMETYPES', ['application/json', 'text/plain', 'text/html'])
+        app.extensions['compression'] = _CompressionStats()
+        app.after_request(_compress_response)
+
+    def stats(self):
+        return current_app.extensions['compression'].snapshot()
+
+
+class _CompressionStats:
+    def __init__(self):
+        self.responses = 0
+        self.skipped_small = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, bytes_in, bytes_out, cpu_seconds):
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.cpu_seconds += cpu_seconds
+
+    def small(self):
+        with self._lock:
+            self.skipped_small += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'responses': self.responses,
+                'skipped_small': self.skipped_small,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'ratio': self.bytes_out / self.bytes_in if self.bytes_in else None,
+                'cpu_ms_per_response': 1000 * self.cpu_seconds / self.responses if self.responses else None,
+            }
+
+
+def choose_encoding(accept_encodings):
+    """Pick gzip or deflate by the client's q-values, gzip on a tie; None if neither is acceptable."""
+    best, best_quality = None, 0
+    for encoding in ('gzip', 'deflate'):
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compress_response(response):
+    config = current_app.config
+    if not config['COMPRESS_ENABLED'] or response.mimetype not in config['COMPRESS_MIMETYPES']:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers or response.direct_passthrough):
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    stats = current_app.extensions['compression']
+    level = config['COMPRESS_LEVEL']
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding, level, stats)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < config['COMPRESS_MIN_SIZE']:
+            stats.small()
+            return response
+        started = time.thread_time()
+        compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+        compressed = compressor.compress(body) + compressor.flush()
+        cpu_seconds = time.thread_time() - started
+        stats.add(len(body), len(compressed), cpu_seconds)
+        response.set_data(compressed)
+        response.headers.add('Server-Timing',
+                             f'compress;dur={cpu_seconds * 1000:.2f};desc="{encoding} {len(body)}>{len(compressed)}"')
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The compressed body is a different representation of the same resource
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def _compress_stream(chunks, encoding, level, stats):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    bytes_in = bytes_out = 0
+    cpu_seconds = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            started = time.thread_time()
+            # A sync flush ends each chunk on a byte boundary so the client can decode it right away
+            compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            cpu_seconds += time.thread_time() - started
+            bytes_in += len(chunk)
+            bytes_out += len(compressed)
+            yield compressed
+        tail = compressor.flush()
+        bytes_out += len(tail)
+        yield tail
+    finally:
+        stats.add(bytes_in, bytes_out, cpu_seconds)
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
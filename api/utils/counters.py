@@ -0,0 +1,31 @@
+from sqlalchemy import insert, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Helpers for tables of counters kept up to date incrementally from session hooks
+
+
+def increment(connection, table, keys, increments, extra=None):
+    """Add increments to the row identified by keys, inserting the row if it is missing."""
+    values = {**keys, **(extra or {}), **increments}
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        upsert = (sqlite_insert if dialect == 'sqlite' else postgresql_insert)(table).values(**values)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: table.c[column] + upsert.excluded[column] for column in increments})
+        connection.execute(upsert)
+        return
+    statement = update(table).where(*[table.c[key] == value for key, value in keys.items()])
+    updated = connection.execute(statement.values(
+        {column: table.c[column] + value for column, value in increments.items()})).rowcount
+    if not updated:
+        connection.execute(insert(table).values(**values))
+
+
+def previous_value(state, key):
+    """The value an attribute had when the object was loaded, before this flush's changes."""
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), key)
@@ -0,0 +1,17 @@
+import base64
+import binascii
+from flask_restx import abort
+
+# Opaque keyset pagination cursors: the id of the last row of a page, for `WHERE id > :last_id`
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """The last id encoded in cursor; a malformed cursor aborts the request with 400."""
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400, 'Invalid cursor')
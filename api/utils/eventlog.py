@@ -0,0 +1,168 @@
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from .shutdown import close_at_exit
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_FLUSH = object()
+
+
+class EventLog:
+    """
+        Append-only audit log for cart and order mutations.
+        Views call record(), which only puts the event on a bounded in-memory queue.
+        A background thread drains the queue and writes the events in batches,
+        so the request path never waits on a database commit.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EVENT_LOG_QUEUE_SIZE', 10000)
+        app.config.setdefault('EVENT_LOG_BATCH_SIZE', 500)
+        app.config.setdefault('EVENT_LOG_FLUSH_INTERVAL', 0.5)
+        app.config.setdefault('EVENT_LOG_BACKPRESSURE', 'drop')
+        app.config.setdefault('EVENT_LOG_BLOCK_TIMEOUT', 0.05)
+        if app.config['EVENT_LOG_BACKPRESSURE'] not in ('drop', 'block'):
+            raise ValueError("EVENT_LOG_BACKPRESSURE must be 'drop' or 'block'")
+        writer = _EventWriter(app)
+        app.extensions['event_log'] = writer
+        close_at_exit(writer)
+
+    def record(self, event_type, user_id=None, **data):
+        """
+            Queue an event for writing. Never blocks longer than EVENT_LOG_BLOCK_TIMEOUT.
+            Returns False when the event was dropped because the queue is full.
+        """
+        event = {
+            'event_type': event_type,
+            'user_id': user_id,
+            'payload': data,
+            'created_at': datetime.utcnow(),
+        }
+        return current_app.extensions['event_log'].put(event)
+
+    def flush(self, timeout=None):
+        """Block until every event queued so far has been written."""
+        current_app.extensions['event_log'].flush(timeout)
+
+    @property
+    def dropped(self):
+        return current_app.extensions['event_log'].dropped
+
+
+class _EventWriter:
+    def __init__(self, app):
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config['EVENT_LOG_QUEUE_SIZE'])
+        self.batch_size = app.config['EVENT_LOG_BATCH_SIZE']
+        self.flush_interval = app.config['EVENT_LOG_FLUSH_INTERVAL']
+        self.policy = app.config['EVENT_LOG_BACKPRESSURE']
+        self.block_timeout = app.config['EVENT_LOG_BLOCK_TIMEOUT']
+        self.dropped = 0
+        self.written = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, event):
+        self._ensure_started()
+        try:
+            if self.policy == 'block':
+                self.queue.put(event, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # Log the first drop and then every thousandth, not every one
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"Event log queue is full, {dropped} events dropped so far")
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        if self._thread is None:
+            return
+        self.queue.put(_FLUSH)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.queue.all_tasks_done.wait(remaining)
+
+    def close(self, timeout=5.0):
+        """Write whatever is still queued and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self.queue.put(_STOP)
+        thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            taken = 1
+            batch = [] if item in (_STOP, _FLUSH) else [item]
+            stop = item is _STOP
+            # Linger briefly so bursts of events are written with one INSERT
+            deadline = time.monotonic() + self.flush_interval
+            while batch and not stop and item is not _FLUSH and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is _STOP:
+                    stop = True
+                elif item is not _FLUSH:
+                    batch.append(item)
+            if batch:
+                self._write(batch)
+            for _ in range(taken):
+                self.queue.task_done()
+        # Drain anything queued behind the stop marker
+        batch = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue.task_done()
+            if item not in (_STOP, _FLUSH):
+                batch.append(item)
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch):
+        from . import db
+        from ..models.events import AuditEvent
+        rows = [dict(event, payload=json.dumps(event['payload'], default=str)) for event in batch]
+        with self.app.app_context():
+            try:
+                db.session.execute(AuditEvent.__table__.insert(), rows)
+                db.session.commit()
+                self.written += len(rows)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"An error occurred while writing {len(rows)} audit events: {str(e)}")
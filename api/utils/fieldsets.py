@@ -0,0 +1,68 @@
+from functools import wraps
+from flask import g, request
+from flask_restx import abort, marshal
+from flask_restx.utils import unpack
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+
+def marshal_with_fields(namespace, model, item_model=None, list_key=None):
+    """
+        marshal_with that honours a `fields=name,price` query parameter.
+        The names are validated against item_model (the model itself for single objects),
+        the view reads them with requested_fields() to narrow its query, and only those
+        keys of every item are marshalled. For a page model, list_key names the list of
+        items; the other keys of the page (e.g. pagination) are always returned.
+    """
+    item_model = item_model or model
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            g._requested_fields = _parse_fields(item_model)
+            data, code, headers = unpack(func(*args, **kwargs))
+            return marshal(data, model, mask=_mask(model, list_key, g._requested_fields)), code, headers
+
+        wrapper = namespace.response(200, 'Success', model)(wrapper)
+        return namespace.doc(params={'fields': 'Comma separated fields to return, e.g. id,name,price'})(wrapper)
+    return decorator
+
+
+def requested_fields():
+    """The names from fields=, or None when the client asked for every field."""
+    return g.get('_requested_fields')
+
+
+def only_requested_columns(query, entity):
+    """
+        Narrow a query to the columns behind the requested fields; unchanged when all were asked for.
+        The primary key is always loaded, and fields that are not columns are ignored.
+    """
+    names = requested_fields()
+    if names is None:
+        return query
+    mapper = inspect(entity)
+    columns = [mapper.column_attrs[name].class_attribute for name in names if name in mapper.column_attrs]
+    if not columns:
+        columns = [mapper.get_property_by_column(column).class_attribute for column in mapper.primary_key]
+    return query.options(load_only(*columns))
+
+
+def _parse_fields(item_model):
+    value = request.args.get('fields')
+    if value is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in names if name not in item_model]
+    if not names or unknown:
+        abort(400, f"Invalid fields: {', '.join(unknown) or value!r}. Choose from: {', '.join(item_model)}")
+    return names
+
+
+def _mask(model, list_key, names):
+    if names is None:
+        return None
+    if list_key is None:
+        return ','.join(names)
+    others = [key for key in model if key != list_key]
+    return ','.join(others + [f"{list_key}{{{','.join(names)}}}"])
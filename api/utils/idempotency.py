@@ -0,0 +1,220 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity
+from flask_restx import abort
+from flask_restx.utils import unpack
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import HTTPException
+
+HEADER = 'Idempotency-Key'
+
+
+class Idempotency:
+    """
+        Idempotency-Key support for mutating endpoints.
+        The outcome of the first request with a key is kept for IDEMPOTENCY_TTL_SECONDS,
+        per user, and replayed to retries without running the view again. A retry that
+        arrives while the first request is still running waits for it. Server errors are
+        not kept, so a retry after a 5xx runs the request again.
+        Claims and outcomes live in the idempotency_keys table, so a retry is matched
+        whichever worker it reaches: a client that timed out usually retries on a new
+        connection. A claim left in flight by a dead worker is taken over after
+        IDEMPOTENCY_LEASE_SECONDS.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDEMPOTENCY_TTL_SECONDS', 24 * 3600)
+        app.config.setdefault('IDEMPOTENCY_WAIT_SECONDS', 10.0)
+        app.config.setdefault('IDEMPOTENCY_LEASE_SECONDS', 300.0)
+        app.extensions['idempotency'] = _IdempotencyState()
+
+
+class _IdempotencyState:
+    """
+        Per-process side of the store: the requests this worker is running, so a retry reaching
+        the same worker is woken as soon as they finish instead of polling the table.
+    """
+    def __init__(self):
+        self.replayed = 0
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def started(self, scope):
+        with self._lock:
+            self._running[scope] = threading.Event()
+
+    def finished(self, scope):
+        with self._lock:
+            done = self._running.pop(scope, None)
+        if done is not None:
+            done.set()
+
+    def running(self, scope):
+        with self._lock:
+            return self._running.get(scope)
+
+
+def _scope_filter(IdempotencyKey, scope):
+    identity, method, path, key = scope
+    return and_(IdempotencyKey.identity == identity, IdempotencyKey.method == method,
+                IdempotencyKey.path == path, IdempotencyKey.key == key)
+
+
+def _load(scope):
+    from . import db
+    from ..models.idempotencyKeys import IdempotencyKey
+    row = db.session.execute(
+        select(IdempotencyKey.id, IdempotencyKey.fingerprint, IdempotencyKey.status, IdempotencyKey.response)
+        .where(_scope_filter(IdempotencyKey, scope))).first()
+    db.session.rollback()
+    return row
+
+
+def claim(scope, fingerprint):
+    """
+        Insert the claim of scope. Returns (id, True) when the caller owns the key and must run
+        the request, or (row, False) with the existing claim when another request holds it.
+        Outcomes past their ttl and claims past their lease are replaced.
+    """
+    from . import db
+    from ..models.idempotencyKeys import IdempotencyKey
+    config = current_app.config
+    identity, method, path, key = scope
+    while True:
+        now = datetime.utcnow()
+        try:
+            db.session.execute(delete(IdempotencyKey).where(
+                _scope_filter(IdempotencyKey, scope),
+                or_(IdempotencyKey.expires_at <= now,
+                    and_(IdempotencyKey.status == 'in_flight', IdempotencyKey.locked_until <= now))))
+            if random.random() < 0.01:
+                db.session.execute(delete(IdempotencyKey).where(
+                    IdempotencyKey.expires_at <= now, IdempotencyKey.status == 'completed'))
+            entry = IdempotencyKey(identity=identity, method=method, path=path, key=key, fingerprint=fingerprint,
+                                   locked_until=now + timedelta(seconds=config['IDEMPOTENCY_LEASE_SECONDS']),
+                                   expires_at=now + timedelta(seconds=config['IDEMPOTENCY_TTL_SECONDS']))
+            db.session.add(entry)
+            db.session.commit()
+            return entry.id, True
+        except IntegrityError:
+            db.session.rollback()
+        row = _load(scope)
+        if row is not None:
+            return row, False
+        # The holder released the key in between: try to claim it again
+
+
+def _wait(state, scope, timeout):
+    """The claim of scope once it is no longer in flight, or as it is when timeout runs out."""
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while True:
+        row = _load(scope)
+        remaining = deadline - time.monotonic()
+        if row is None or row.status != 'in_flight' or remaining <= 0:
+            return row
+        running = state.running(scope)
+        if running is not None:
+            # Run by this worker: woken as soon as it finishes
+            running.wait(remaining)
+        else:
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+
+
+def complete(entry_id, response):
+    """Record the outcome to replay. Work the view left uncommitted is rolled back, not committed with it."""
+    from . import db
+    from ..models.idempotencyKeys import IdempotencyKey
+    db.session.rollback()
+    db.session.execute(update(IdempotencyKey).where(IdempotencyKey.id == entry_id)
+                       .values(status='completed', response=json.dumps(response), locked_until=None))
+    db.session.commit()
+
+
+def release(entry_id):
+    """Forget the claim after a failure so the next retry runs the request again."""
+    from . import db
+    from ..models.idempotencyKeys import IdempotencyKey
+    db.session.rollback()
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == entry_id))
+    db.session.commit()
+
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _replay(row):
+    data, code, headers = json.loads(row.response)
+    return data, code, {**headers, 'Idempotent-Replayed': 'true'}
+
+
+def idempotent(f):
+    """
+        Honour an Idempotency-Key header on a resource method. Requests without the header
+        run as usual. Must be applied below jwt_required: keys are scoped to the caller.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return f(*args, **kwargs)
+        if not key or len(key) > 255:
+            abort(400, f'{HEADER} must be between 1 and 255 characters')
+        state = current_app.extensions['idempotency']
+        scope = (get_jwt_identity(), request.method, request.path, key)
+        fingerprint = _fingerprint()
+        wait = current_app.config['IDEMPOTENCY_WAIT_SECONDS']
+
+        while True:
+            entry, owner = claim(scope, fingerprint)
+            if owner:
+                break
+            if entry.fingerprint != fingerprint:
+                abort(422, f'{HEADER} was already used with a different request body')
+            row = _wait(state, scope, wait)
+            if row is not None and row.status == 'in_flight':
+                abort(409, f'A request with this {HEADER} is still being processed')
+            if row is not None:
+                state.replayed += 1
+                return _replay(row)
+            # The first request failed and released the key: try to claim it again
+
+        state.started(scope)
+        try:
+            try:
+                result = f(*args, **kwargs)
+            except HTTPException as e:
+                if e.code >= 500:
+                    release(entry)
+                    raise
+                # Client errors are part of the outcome: a retry gets the same answer
+                complete(entry, (getattr(e, 'data', None) or {'message': e.description}, e.code, {}))
+                raise
+            except BaseException:
+                release(entry)
+                raise
+            data, code, headers = unpack(result)
+            if code >= 500:
+                release(entry)
+            else:
+                complete(entry, (data, code, dict(headers or {})))
+            return result
+        finally:
+            state.finished(scope)
+    return decorated
@@ -0,0 +1,214 @@
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import and_, event, or_, select, update
+from sqlalchemy.orm import Session
+from .shutdown import close_at_exit
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+        Background jobs stored in the jobs table and run by a pool of JOBS_WORKERS threads.
+        Tasks are registered with @jobs.task(name) and queued with jobs.enqueue(name, **payload)
+        inside the caller's transaction, so a job exists exactly when the work that asked for it
+        was committed. A task runs in the same transaction that marks its job done, so its writes
+        are kept only if it finishes; a failed job is retried after JOBS_BACKOFF_SECONDS, doubling
+        each time, and is left as 'dead' after its last attempt. Delivery is at least once.
+    """
+    def __init__(self, app=None):
+        self.tasks = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_BACKOFF_SECONDS', 2.0)
+        app.config.setdefault('JOBS_BACKOFF_MAX_SECONDS', 300.0)
+        app.config.setdefault('JOBS_POLL_SECONDS', 5.0)
+        app.config.setdefault('JOBS_LEASE_SECONDS', 300.0)
+        pool = _WorkerPool(app, self)
+        app.extensions['jobs'] = pool
+        close_at_exit(pool)
+        if app.config['JOBS_WORKERS'] > 0:
+            # The scheduler's poll starts the pool and picks up jobs queued by other processes
+            app.extensions['scheduler'].add('jobs-poll', app.config['JOBS_POLL_SECONDS'], pool.wake)
+
+    def task(self, name):
+        def decorator(func):
+            self.tasks[name] = func
+            return func
+        return decorator
+
+    def enqueue(self, name, run_at=None, **payload):
+        """Add a job to the current transaction; workers are woken once it commits."""
+        from . import db
+        from ..models.jobs import Job
+        if name not in self.tasks:
+            raise KeyError(f"Unknown job {name!r}")
+        job = Job(name=name, payload=json.dumps(payload), run_at=run_at or datetime.utcnow(),
+                  max_attempts=current_app.config['JOBS_MAX_ATTEMPTS'])
+        db.session.add(job)
+        db.session.info['jobs_enqueued'] = True
+        return job
+
+    def run_pending(self, limit=None):
+        """
+            Run the due jobs one by one in the current app context until none is left, e.g. from
+            tests or `flask jobs-run`. Returns the number of jobs run, failed attempts included.
+        """
+        ran = 0
+        while limit is None or ran < limit:
+            if not self.run_next():
+                break
+            ran += 1
+        return ran
+
+    def run_next(self):
+        """Claim and run one due job. Returns False when there was nothing to do."""
+        from . import db
+        from ..models.jobs import Job
+        job_id = _claim(db, Job, current_app.config['JOBS_LEASE_SECONDS'])
+        if job_id is None:
+            return False
+        job = db.session.get(Job, job_id)
+        name, attempts = job.name, job.attempts
+        try:
+            task = self.tasks[name]
+            task(**json.loads(job.payload))
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            job.last_error = None
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            error = f"{type(e).__name__}: {e}"
+        job = db.session.get(Job, job_id)
+        if name not in self.tasks or attempts >= job.max_attempts:
+            job.status = 'dead'
+            job.finished_at = datetime.utcnow()
+            logger.error(f"Job {job_id} ({name}) failed for good after {attempts} attempts: {error}")
+        else:
+            delay = min(current_app.config['JOBS_BACKOFF_SECONDS'] * 2 ** (attempts - 1),
+                        current_app.config['JOBS_BACKOFF_MAX_SECONDS'])
+            job.status = 'queued'
+            job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning(f"Job {job_id} ({name}) attempt {attempts} failed, retrying in {delay:.0f}s: {error}")
+        job.last_error = error
+        job.locked_until = None
+        db.session.commit()
+        return True
+
+    def retry(self, job_id):
+        """Queue a dead job again with a fresh set of attempts. Returns False if it is not dead."""
+        from . import db
+        from ..models.jobs import Job
+        result = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == 'dead')
+            .values(status='queued', attempts=0, run_at=datetime.utcnow(), finished_at=None))
+        db.session.info['jobs_enqueued'] = True
+        db.session.commit()
+        return result.rowcount == 1
+
+
+def _claim(db, Job, lease_seconds):
+    """
+        Take the next due job with a conditional UPDATE, so two workers never run the same one.
+        Jobs left running past their lease by a dead worker count as due.
+    """
+    while True:
+        now = datetime.utcnow()
+        due = or_(and_(Job.status == 'queued', Job.run_at <= now),
+                  and_(Job.status == 'running', Job.locked_until < now))
+        job_id = db.session.execute(select(Job.id).where(due).order_by(Job.run_at).limit(1)).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, due)
+            .values(status='running', attempts=Job.attempts + 1,
+                    locked_until=now + timedelta(seconds=lease_seconds))).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+
+
+class _WorkerPool:
+    def __init__(self, app, queue):
+        self.app = app
+        self.queue = queue
+        self.size = app.config['JOBS_WORKERS']
+        self._threads = []
+        self._wakeup = threading.Condition()
+        self._signals = 0
+        self._stopped = False
+
+    def wake(self):
+        if self.size <= 0:
+            return
+        with self._wakeup:
+            if not self._threads and not self._stopped:
+                for index in range(self.size):
+                    thread = threading.Thread(target=self._run, name=f'job-worker-{index}', daemon=True)
+                    self._threads.append(thread)
+                    thread.start()
+            self._signals = self.size
+            self._wakeup.notify_all()
+
+    def close(self, timeout=5.0):
+        with self._wakeup:
+            self._stopped = True
+            threads, self._threads = self._threads, []
+            self._wakeup.notify_all()
+        for thread in threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._signals and not self._stopped:
+                    self._wakeup.wait()
+                if self._stopped:
+                    return
+                self._signals -= 1
+            # Drain the due jobs, then sleep until the next commit or poll
+            while not self._stopped:
+                try:
+                    with self.app.app_context():
+                        from . import db
+                        try:
+                            if not self.queue.run_next():
+                                break
+                        finally:
+                            db.session.remove()
+                except Exception as e:
+                    logger.error(f"Job worker failed to run a job: {str(e)}")
+                    break
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('jobs_enqueued', None) and has_app_context() and 'jobs' in current_app.extensions:
+        current_app.extensions['jobs'].wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop('jobs_enqueued', None)
+
+
+@click.command('jobs-run')
+@click.option('--limit', type=int, default=None, help='Stop after this many jobs')
+@with_appcontext
+def jobs_run(limit):
+    """Run the due background jobs in this process and exit."""
+    from . import jobs
+    click.echo(f"Ran {jobs.run_pending(limit)} jobs")
@@ -0,0 +1,43 @@
+import json
+import logging
+import os
+import click
+from flask import Response, current_app
+from flask.cli import with_appcontext
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+
+def serve_prebuilt_spec(app, path):
+    """
+        Answer /swagger.json with a spec file generated at build time instead of
+        building it from the namespaces on the first docs request.
+    """
+    if not os.path.exists(path):
+        logger.warning(f"Prebuilt OpenAPI spec {path} not found, generating it at runtime")
+        return False
+    with open(path, 'rb') as spec_file:
+        body = spec_file.read()
+
+    def specs():
+        return Response(body, mimetype='application/json')
+
+    app.view_functions['specs'] = specs
+    return True
+
+
+@click.command('openapi-export')
+@click.option('--output', '-o', default='swagger.json', show_default=True, help='Where to write the spec')
+@with_appcontext
+def export_openapi(output):
+    """Write the OpenAPI (Swagger 2.0) spec of every namespace to a JSON file."""
+    namespaces = current_app.extensions['namespaces']
+    namespaces.ensure_registered()
+    with current_app.test_request_context():
+        schema = namespaces.api.__schema__
+    if 'error' in schema:
+        raise click.ClickException(f"Could not build the OpenAPI spec: {schema['error']}")
+    with open(output, 'w') as spec_file:
+        json.dump(schema, spec_file, indent=2, sort_keys=True)
+    click.echo(f"Wrote OpenAPI spec to {output}")
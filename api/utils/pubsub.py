@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class PubSub:
+    """
+        In-process publish/subscribe for live updates (Server-Sent Events).
+        Publishers call publish() with the topics a message belongs to; each subscription
+        keeps a small buffer keyed by message key, so a burst of updates to the same key
+        collapses into the latest one. Only this process's writes are seen: with several
+        worker processes every one of them serves its own subscribers.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PUBSUB_BUFFER_SIZE', 100)
+        app.config.setdefault('PUBSUB_MAX_SUBSCRIBERS', 1000)
+        app.extensions['pubsub'] = _Broker(app.config['PUBSUB_BUFFER_SIZE'], app.config['PUBSUB_MAX_SUBSCRIBERS'])
+
+    def publish(self, topics, key, message):
+        current_app.extensions['pubsub'].publish(topics, key, message)
+
+    def subscribe(self, topics):
+        """Returns a Subscription, or None when PUBSUB_MAX_SUBSCRIBERS are already connected."""
+        return current_app.extensions['pubsub'].subscribe(topics)
+
+    def unsubscribe(self, subscription):
+        current_app.extensions['pubsub'].unsubscribe(subscription)
+
+
+class Subscription:
+    """
+        Buffer between the publishers and one connection.
+        Messages are coalesced by key. When the buffer holds buffer_size distinct keys
+        the connection is too slow to keep up: the buffer is dropped and the next get()
+        reports an overflow, so the client refetches instead of reading a partial history.
+    """
+    def __init__(self, topics, buffer_size):
+        self.topics = frozenset(topics)
+        self.buffer_size = buffer_size
+        self.overflowed = False
+        self.closed = False
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+
+    def offer(self, key, message):
+        with self._condition:
+            if self.closed:
+                return
+            if key in self._pending:
+                # Keep the key's original position: the latest value replaces the stale one
+                self._pending[key] = message
+            elif len(self._pending) >= self.buffer_size:
+                self._pending.clear()
+                self.overflowed = True
+            else:
+                self._pending[key] = message
+            self._condition.notify()
+
+    def get(self, timeout, linger=0.0):
+        """
+            Wait up to timeout for messages and return (overflowed, messages).
+            After the first message arrives, wait linger more seconds so a burst is sent at once.
+            Returns None once the subscription is closed.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._pending and not self.overflowed and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False, []
+                self._condition.wait(remaining)
+            if self.closed:
+                return None
+            linger_until = time.monotonic() + linger
+            while not self.overflowed and not self.closed:
+                remaining = linger_until - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if self.closed:
+                return None
+            overflowed, self.overflowed = self.overflowed, False
+            messages = list(self._pending.values())
+            self._pending.clear()
+            return overflowed, messages
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._pending.clear()
+            self._condition.notify_all()
+
+
+class _Broker:
+    def __init__(self, buffer_size, max_subscribers):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self._topics = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def subscribers(self):
+        return self._count
+
+    def subscribe(self, topics):
+        subscription = Subscription(topics, self.buffer_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            self._count += 1
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            removed = False
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers and subscription in subscribers:
+                    subscribers.discard(subscription)
+                    removed = True
+                    if not subscribers:
+                        del self._topics[topic]
+            if removed:
+                self._count -= 1
+
+    def publish(self, topics, key, message):
+        with self._lock:
+            self.published += 1
+            targets = set()
+            for topic in topics:
+                targets.update(self._topics.get(topic, ()))
+        # Offer outside the broker lock: a slow subscriber only ever blocks itself
+        for subscription in targets:
+            subscription.offer(key, message)
@@ -0,0 +1,210 @@
+import contextlib
+import itertools
+import math
+import sqlite3
+import threading
+import time
+import click
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask.cli import with_appcontext
+from flask_jwt_extended import verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+from .sharding import shard_engine
+
+STICKY_COOKIE = 'primary_reads'
+STICKY_HEADER = 'X-Primary-Reads'
+
+
+class RoutingSession(Session):
+    """
+        db.session class that sends reads to a replica while a request is marked read-only.
+        Flushes and writes always go to the primary engine, so the write path is unchanged.
+        Statements on the sharded user-owned tables go to the shard picked by the ShardRouter.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = shard_engine(self, mapper, clause) if bind is None else None
+        if shard is not None:
+            return shard
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or self._flushing or not has_app_context() or not g.get('_read_only'):
+            return engine
+        engines = self._db.engines
+        if engine is not engines.get(None):
+            return engine
+        replica = current_app.extensions['replicas'].next_replica()
+        return engines[replica] if replica else engine
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write_after_flush(session, flush_context):
+    if has_request_context():
+        g._wrote_primary = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_write_on_dml(orm_execute_state):
+    if has_request_context() and not orm_execute_state.is_select:
+        g._wrote_primary = True
+
+
+class ReplicaRouter:
+    """
+        Registers REPLICA_DATABASE_URIS as Flask-SQLAlchemy binds (replica_0, replica_1, ...)
+        and remembers which users wrote recently, so their reads stay on the primary.
+        The marker also travels with the client as a signed cookie and X-Primary-Reads header,
+        so a read reaching another worker than the write still goes to the primary.
+        init_app must run before db.init_app so the binds exist when engines are created,
+        and detach_metadata after it.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REPLICA_DATABASE_URIS', [])
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5.0)
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        keys = []
+        for index, uri in enumerate(app.config['REPLICA_DATABASE_URIS']):
+            key = f'replica_{index}'
+            binds[key] = uri
+            keys.append(key)
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.extensions['replicas'] = _ReplicaState(keys, app.config['REPLICA_STICKY_SECONDS'])
+        app.after_request(_remember_writer)
+
+    def detach_metadata(self, db, app):
+        """
+            Replicas mirror the primary schema and own no tables. Drop the empty metadata
+            Flask-SQLAlchemy made for their binds so create_all/drop_all skip them.
+        """
+        for key in app.extensions['replicas'].keys:
+            db.metadatas.pop(key, None)
+
+    def sync(self, app=None):
+        """
+            Replication stand-in for local SQLite setups: copy the primary database
+            file over every replica file with the SQLite backup API.
+        """
+        from . import db
+        app = app or current_app
+        with app.app_context():
+            primary = db.engines[None]
+            source = sqlite3.connect(primary.url.database)
+            try:
+                for key in app.extensions['replicas'].keys:
+                    engine = db.engines[key]
+                    engine.dispose()
+                    target = sqlite3.connect(engine.url.database)
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+
+
+class _ReplicaState:
+    def __init__(self, keys, sticky_seconds):
+        self.keys = keys
+        self.sticky_seconds = sticky_seconds
+        self._cycle = itertools.cycle(keys) if keys else None
+        self._recent_writers = {}
+        self._lock = threading.Lock()
+
+    def next_replica(self):
+        if self._cycle is None:
+            return None
+        with self._lock:
+            return next(self._cycle)
+
+    def wrote(self, identity):
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writers[identity] = now + self.sticky_seconds
+            if len(self._recent_writers) > 10000:
+                self._recent_writers = {key: until for key, until in self._recent_writers.items() if until > now}
+
+    def is_sticky(self, identity):
+        until = self._recent_writers.get(identity)
+        return until is not None and until > time.monotonic()
+
+
+def _current_identity():
+    decoded_jwt = g.get('_jwt_extended_jwt')
+    if decoded_jwt is None and 'Authorization' in request.headers:
+        try:
+            verify_jwt_in_request(optional=True)
+        except Exception:
+            return None
+        decoded_jwt = g.get('_jwt_extended_jwt')
+    return decoded_jwt.get('sub') if decoded_jwt else None
+
+
+def _sticky_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='primary-reads')
+
+
+def _client_is_sticky(identity, sticky_seconds):
+    """Whether the caller sent a marker, signed for identity, of a write in the last sticky_seconds."""
+    token = request.headers.get(STICKY_HEADER) or request.cookies.get(STICKY_COOKIE)
+    if not token:
+        return False
+    try:
+        return _sticky_serializer().loads(token, max_age=sticky_seconds) == identity
+    except (BadSignature, TypeError, ValueError):
+        return False
+
+
+def _remember_writer(response):
+    if g.get('_wrote_primary'):
+        identity = _current_identity()
+        state = current_app.extensions['replicas']
+        if identity and state.keys:
+            state.wrote(identity)
+            token = _sticky_serializer().dumps(identity)
+            response.headers[STICKY_HEADER] = token
+            response.set_cookie(STICKY_COOKIE, token, max_age=math.ceil(state.sticky_seconds),
+                                httponly=True, samesite='Lax', secure=request.is_secure)
+    return response
+
+
+def read_only(f):
+    """
+        Route the queries of a GET resource to a read replica, unless the caller
+        wrote something in the last REPLICA_STICKY_SECONDS (read-your-writes), as
+        recorded by this worker or by the marker the client sends back.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        state = current_app.extensions['replicas']
+        if state.keys:
+            identity = _current_identity()
+            g._read_only = not (identity and (state.is_sticky(identity)
+                                              or _client_is_sticky(identity, state.sticky_seconds)))
+        return f(*args, **kwargs)
+    return decorated
+
+
+@contextlib.contextmanager
+def reads_from_primary():
+    """Send the reads inside the block to the primary, also in a request routed to a replica."""
+    if not has_app_context() or not g.get('_read_only'):
+        yield
+        return
+    g._read_only = False
+    try:
+        yield
+    finally:
+        g._read_only = True
+
+
+@click.command('replicas-sync')
+@with_appcontext
+def replicas_sync():
+    """Copy the primary SQLite database over every configured replica."""
+    from . import replicas
+    replicas.sync()
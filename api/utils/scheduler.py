@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+from flask import current_app
+from .shutdown import close_at_exit
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+        Runs maintenance jobs every N seconds on one daemon thread, each inside an app context.
+        Jobs are registered with add_job() from init_app of the features that need them; a job
+        with an interval of 0 or less is disabled. Every worker process runs its own scheduler,
+        so jobs must be safe to run concurrently and more often than configured.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        runner = _JobRunner(app)
+        app.extensions['scheduler'] = runner
+        close_at_exit(runner)
+
+    def add_job(self, app, name, interval, func):
+        app.extensions['scheduler'].add(name, interval, func)
+
+    def run_now(self, name):
+        """Run a job synchronously in the current app context, e.g. from a test or CLI command."""
+        return current_app.extensions['scheduler'].jobs[name].func()
+
+
+class _Job:
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = time.monotonic() + interval
+        self.runs = 0
+        self.failures = 0
+
+
+class _JobRunner:
+    def __init__(self, app):
+        self.app = app
+        self.jobs = {}
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def add(self, name, interval, func):
+        job = _Job(name, interval, func)
+        with self._lock:
+            self.jobs[name] = job
+            if interval > 0 and self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def close(self, timeout=5.0):
+        with self._lock:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped:
+            now = time.monotonic()
+            due = [job for job in list(self.jobs.values()) if job.interval > 0 and job.next_run <= now]
+            for job in due:
+                self._run_job(job)
+                job.next_run = time.monotonic() + job.interval
+            upcoming = [job.next_run for job in self.jobs.values() if job.interval > 0]
+            timeout = max(0.0, min(upcoming) - time.monotonic()) if upcoming else None
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _run_job(self, job):
+        started = time.monotonic()
+        try:
+            with self.app.app_context():
+                job.func()
+            job.runs += 1
+            logger.info(f"Scheduled job {job.name} finished in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            job.failures += 1
+            logger.error(f"Scheduled job {job.name} failed: {str(e)}")
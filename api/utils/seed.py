@@ -0,0 +1,265 @@
+import itertools
+import logging
+import math
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, func, insert, select, update
+from werkzeug.security import generate_password_hash
+from ..models.cartItems import CartItem
+from ..models.carts import Cart
+from ..models.orderItems import OrderItem
+from ..models.orders import Order
+from ..models.productFacets import ProductFacet
+from ..models.products import Product
+from ..models.users import User
+from ..products.facets import facet_values
+from ..analytics.rollups import backfill_rollups
+from . import cache, db
+from .counters import increment
+
+# Create a logger instance
+logger = logging.getLogger(__name__)
+
+# Share of the catalogue and typical price of each ProductCategory
+CATEGORY_MIX = {
+    'samsung': (22, 450), 'iphone': (20, 900), 'xiaomi': (9, 250), 'redmi': (7, 180),
+    'oppo': (6, 280), 'vivo': (6, 260), 'tecno': (5, 150), 'infinix': (4, 140),
+    'realme': (4, 200), 'huawei': (3, 400), 'itel': (3, 80), 'google': (2, 700),
+    'oneplus': (2, 550), 'motorola': (2, 250), 'nokia': (1.5, 150), 'sony': (1, 600),
+    'lenovo': (1, 200), 'lg': (0.5, 300), 'htc': (0.5, 250), 'blackberry': (0.5, 200),
+}
+MODEL_NAMES = ('Pro', 'Max', 'Lite', 'Plus', 'Mini', 'Ultra', 'Neo', 'Note', 'Edge', 'Prime')
+COLOURS = ('black', 'white', 'blue', 'green', 'silver', 'gold', 'purple', 'red')
+# Orders older than two weeks have reached a final status; newer ones are still moving
+SETTLED_STATUSES = (('delivered', 'cancelled'), (88, 12))
+OPEN_STATUSES = (('pending', 'paid', 'shipped', 'cancelled'), (30, 30, 30, 10))
+# Users, products and orders spread over this many days before now
+HISTORY_DAYS = 730
+
+
+class _BatchWriter:
+    """
+        Buffers rows per engine and table and inserts them with Core executemany. When a
+        buffer reaches batch_size every buffer of that engine is written in one transaction,
+        parents before children, so cart items never land before their cart.
+    """
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.rows = Counter()
+
+    def add(self, engine, table, row):
+        tables = self.buffers.setdefault(engine, {})
+        rows = tables.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(engine)
+
+    def flush(self, engine=None):
+        for target in [engine] if engine is not None else list(self.buffers):
+            tables = self.buffers.pop(target, {})
+            with target.begin() as connection:
+                for table in sorted(tables, key=lambda table: _INSERT_ORDER.index(table.name)):
+                    connection.execute(insert(table), tables[table])
+                    self.rows[table.name] += len(tables[table])
+
+
+_INSERT_ORDER = ['products', 'users', 'carts', 'cart_items', 'orders', 'order_items']
+
+
+def _engine_for(user_id):
+    """The engine holding the carts and orders of user_id."""
+    state = current_app.extensions['shards']
+    return db.engines[state.shard_for_user(user_id)] if state.keys else db.engine
+
+
+def _next_ids(table, engines):
+    ids = {}
+    for engine in engines:
+        with engine.connect() as connection:
+            ids[engine] = (connection.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+    return ids
+
+
+def _when(rng, now, days, after=None):
+    """A moment in the last `days` days, no earlier than `after`."""
+    start = now - timedelta(days=days)
+    if after is not None and after > start:
+        start = after
+    return start + (now - start) * rng.random()
+
+
+def _poisson(rng, mean):
+    # Knuth's method; means here are small
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _line_count(rng, limit=6):
+    # Mostly one or two lines, with a long tail
+    return min(limit, 1 + int(rng.expovariate(1.2)))
+
+
+def seed_database(products=10000, users=5000, cart_share=0.3, orders_per_user=2.0,
+                  batch_size=10000, seed=0, password='password'):
+    """
+        Insert generated products, users, carts, cart items, orders and order items for
+        load testing, in Core executemany batches of batch_size rows, one transaction per
+        batch. The same seed produces the same rows on an empty database.
+
+        Categories follow CATEGORY_MIX, prices are log-normal around the category price and
+        products are picked for carts and orders with a Zipf-like popularity. Stock held in
+        carts is taken off the products, as adding to a cart does.
+        Returns the number of rows written per table.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    writer = _BatchWriter(batch_size)
+    state = current_app.extensions['shards']
+    shard_engines = [db.engines[key] for key in state.keys] or [db.engine]
+    products_table, users_table = Product.__table__, User.__table__
+    cart_ids = _next_ids(Cart.__table__, shard_engines)
+    cart_item_ids = _next_ids(CartItem.__table__, shard_engines)
+    order_ids = _next_ids(Order.__table__, shard_engines)
+    order_item_ids = _next_ids(OrderItem.__table__, shard_engines)
+    first_product = _next_ids(products_table, [db.engine])[db.engine]
+    first_user = _next_ids(users_table, [db.engine])[db.engine]
+
+    categories = list(CATEGORY_MIX)
+    category_weights = list(itertools.accumulate(share for share, _ in CATEGORY_MIX.values()))
+    product_ids, product_categories, prices, stock = [], [], [], []
+    for product_id in range(first_product, first_product + products):
+        category = rng.choices(categories, cum_weights=category_weights)[0]
+        name = f"{category} {rng.randint(1, 15)} {rng.choice(MODEL_NAMES)}"
+        price = round(max(30.0, rng.lognormvariate(0, 0.35) * CATEGORY_MIX[category][1]), 2)
+        quantity = 0 if rng.random() < 0.08 else min(500, int(rng.lognormvariate(3, 1)) + 1)
+        writer.add(db.engine, products_table, {
+            'id': product_id, 'name': name, 'price': price, 'quantity': quantity, 'stock': quantity,
+            'reorder_threshold': 5, 'category': category,
+            'description': f"{name}, {rng.choice((64, 128, 256, 512))} GB, {rng.choice(COLOURS)}",
+            'created_at': _when(rng, now, HISTORY_DAYS)})
+        product_ids.append(product_id)
+        product_categories.append(category)
+        prices.append(price)
+        stock.append(quantity)
+    writer.flush(db.engine)
+    if not product_ids and (cart_share or orders_per_user) and users:
+        # Carts and orders for new users over the products already in the database
+        with db.engine.connect() as connection:
+            for product_id, category, price, in_stock in connection.execute(
+                    select(Product.id, Product.category, Product.price, Product.stock).order_by(Product.id)):
+                product_ids.append(product_id)
+                product_categories.append(category)
+                prices.append(price)
+                stock.append(in_stock)
+    if not product_ids:
+        cart_share = orders_per_user = 0
+    initial_stock = list(stock)
+
+    # A few products take most of the traffic: weight 1 / rank ** 1.1 over a shuffled ranking
+    ranks = list(range(1, len(product_ids) + 1))
+    rng.shuffle(ranks)
+    popularity = list(itertools.accumulate(1 / rank ** 1.1 for rank in ranks))
+    product_indexes = range(len(product_ids))
+
+    password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
+    for user_id in range(first_user, first_user + users):
+        joined = _when(rng, now, HISTORY_DAYS)
+        writer.add(db.engine, users_table, {
+            'id': user_id, 'username': f"seed{user_id}", 'email': f"seed{user_id}@example.com",
+            'password_hash': password_hash, 'created_at': joined,
+            'is_admin': False, 'is_active': True, 'request_count': 0})
+        engine = _engine_for(user_id)
+
+        if rng.random() < cart_share:
+            cart_id = cart_ids[engine]
+            cart_ids[engine] += 1
+            updated = _when(rng, now, 14, after=joined)
+            writer.add(engine, Cart.__table__, {
+                'id': cart_id, 'user_id': user_id, 'created_at': updated, 'updated_at': updated})
+            for index in set(rng.choices(product_indexes, cum_weights=popularity, k=_line_count(rng))):
+                quantity = min(stock[index], 1 + int(rng.expovariate(1.5)))
+                if quantity <= 0:
+                    continue
+                stock[index] -= quantity
+                writer.add(engine, CartItem.__table__, {
+                    'id': cart_item_ids[engine], 'cart_id': cart_id, 'product_id': product_ids[index],
+                    'quantity': quantity, 'price': round(quantity * prices[index], 2)})
+                cart_item_ids[engine] += 1
+
+        for _ in range(_poisson(rng, orders_per_user)):
+            order_id = order_ids[engine]
+            order_ids[engine] += 1
+            placed = _when(rng, now, HISTORY_DAYS, after=joined)
+            statuses, weights = SETTLED_STATUSES if now - placed > timedelta(days=14) else OPEN_STATUSES
+            writer.add(engine, Order.__table__, {
+                'id': order_id, 'user_id': user_id, 'created_at': placed,
+                'status': rng.choices(statuses, weights)[0]})
+            for index in set(rng.choices(product_indexes, cum_weights=popularity, k=_line_count(rng))):
+                quantity = 1 + int(rng.expovariate(2))
+                writer.add(engine, OrderItem.__table__, {
+                    'id': order_item_ids[engine], 'order_id': order_id, 'product_id': product_ids[index],
+                    'quantity': quantity, 'price': round(quantity * prices[index], 2), 'created_at': placed})
+                order_item_ids[engine] += 1
+    writer.flush()
+
+    # The bulk inserts bypass the session hooks: take the held stock off the products and
+    # count the new products in product_facets by hand, as compaction does
+    held = [{'product_id': product_ids[index], 'held': initial_stock[index] - stock[index]}
+            for index in product_indexes if stock[index] != initial_stock[index]]
+    for start in range(0, len(held), batch_size):
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(products_table).where(products_table.c.id == bindparam('product_id'))
+                .values(stock=products_table.c.stock - bindparam('held')),
+                held[start:start + batch_size])
+    facets = Counter()
+    for index in product_indexes:
+        if index >= products and stock[index] == initial_stock[index]:
+            continue
+        facets.update(facet_values(product_categories[index], prices[index], stock[index]))
+        if index >= products:
+            facets.subtract(facet_values(product_categories[index], prices[index], initial_stock[index]))
+    with db.engine.begin() as connection:
+        for (facet, value), delta in facets.items():
+            if delta:
+                increment(connection, ProductFacet.__table__, {'facet': facet, 'value': value}, {'count': delta})
+    if 'facets' in current_app.extensions:
+        current_app.extensions['facets'].invalidate()
+    cache.invalidate('product')
+    return writer.rows
+
+
+@click.command('seed')
+@click.option('--products', default=10000, show_default=True, help='Products to create')
+@click.option('--users', default=5000, show_default=True, help='Users to create')
+@click.option('--cart-share', default=0.3, show_default=True, help='Share of the new users with a cart')
+@click.option('--orders-per-user', default=2.0, show_default=True, help='Mean number of orders per new user')
+@click.option('--batch-size', default=10000, show_default=True, help='Rows per insert transaction')
+@click.option('--seed', default=0, show_default=True, help='Random seed; the same seed gives the same data')
+@click.option('--password', default='password', show_default=True, help='Password of every seeded user')
+@with_appcontext
+def seed_command(products, users, cart_share, orders_per_user, batch_size, seed, password):
+    """Fill the database with generated catalogue, user, cart and order data for load testing."""
+    if batch_size <= 0:
+        raise click.BadParameter('must be positive', param_hint='--batch-size')
+    started = time.monotonic()
+    rows = seed_database(products=products, users=users, cart_share=cart_share,
+                         orders_per_user=orders_per_user, batch_size=batch_size, seed=seed,
+                         password=password)
+    inserted = time.monotonic() - started
+    # Sales and inventory rollups are rebuilt in one pass rather than kept up per batch
+    backfill_rollups()
+    total = sum(rows.values())
+    for table in _INSERT_ORDER:
+        click.echo(f"{table}: {rows[table]}")
+    click.echo(f"Inserted {total} rows in {inserted:.1f}s ({total / max(inserted, 1e-9):,.0f} rows/s), "
+               f"{time.monotonic() - started:.1f}s with the rollups")
@@ -0,0 +1,204 @@
+import contextlib
+import contextvars
+import click
+from flask import current_app, g, has_app_context, has_request_context
+from flask.cli import with_appcontext
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import func, inspect, select
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.sql.util import find_tables
+
+# Shard chosen with use_shard(); wins over the shard of the request's JWT identity
+_shard_override = contextvars.ContextVar('shard_override', default=None)
+
+
+class ShardNotSelected(RuntimeError):
+    pass
+
+
+class ShardRouter:
+    """
+        Spreads the user-owned tables over SHARD_DATABASE_URIS, keyed by user_id.
+        The URIs become Flask-SQLAlchemy binds (shard_0, shard_1, ...) and user N's carts,
+        cart items, orders and order items live on shard N % len(SHARD_DATABASE_URIS).
+        Every other table (users, products, ...) stays on the primary database.
+        db.session sends statements on the sharded tables to the shard of the request's
+        JWT identity, or of the user given to use_shard() in jobs and admin code.
+        Without SHARD_DATABASE_URIS nothing is routed. init_app must run before db.init_app
+        so the binds exist when engines are created, and detach_metadata after it.
+    """
+    def __init__(self, tables, app=None):
+        self.tables = frozenset(tables)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SHARD_DATABASE_URIS', [])
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        keys = []
+        for index, uri in enumerate(app.config['SHARD_DATABASE_URIS']):
+            key = f'shard_{index}'
+            binds[key] = uri
+            keys.append(key)
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.extensions['shards'] = _ShardState(keys, self.tables)
+
+    def detach_metadata(self, db, app):
+        """Shards get their tables from create_schema; drop the empty metadata of their binds."""
+        for key in app.extensions['shards'].keys:
+            db.metadatas.pop(key, None)
+
+    def enabled(self):
+        return bool(current_app.extensions['shards'].keys)
+
+    def shard_for_user(self, user_id):
+        return current_app.extensions['shards'].shard_for_user(user_id)
+
+    def use_shard(self, user_id):
+        """Route the sharded tables to the shard of user_id inside the block."""
+        return self.on_shard(self.shard_for_user(user_id))
+
+    @contextlib.contextmanager
+    def on_shard(self, key):
+        """Route the sharded tables to the shard named key (e.g. 'shard_1') inside the block."""
+        token = _shard_override.set(key)
+        try:
+            yield
+        finally:
+            _shard_override.reset(token)
+
+    def sharded_session(self, db):
+        """
+            A SQLAlchemy ShardedSession over every shard, for work that spans users.
+            Queries run on each shard and their rows are concatenated; new objects
+            are stored on the shard of their owner's user_id.
+        """
+        state = current_app.extensions['shards']
+
+        def shard_chooser(mapper, instance, clause=None):
+            owner = getattr(instance, 'cart', None) or getattr(instance, 'order', None) or instance
+            return state.shard_for_user(owner.user_id)
+
+        def identity_chooser(mapper, primary_key, *, lazy_loaded_from, **kwargs):
+            if lazy_loaded_from is not None:
+                return [lazy_loaded_from.identity_token]
+            return state.keys
+
+        def execute_chooser(orm_context):
+            return state.keys
+
+        return ShardedSession(shard_chooser=shard_chooser, identity_chooser=identity_chooser,
+                              execute_chooser=execute_chooser,
+                              shards={key: db.engines[key] for key in state.keys})
+
+    def paginate(self, db, statement, page, per_page):
+        """Paginate a select ordered by id over every shard; ids repeat across shards, so pages order by (id, shard)."""
+        with self.sharded_session(db) as session:
+            return ShardedPagination(page=page, per_page=per_page, max_per_page=None,
+                                     select=statement, session=session)
+
+    def create_schema(self, db, app=None):
+        """
+            Create the sharded tables on every shard. Foreign keys to tables that stay
+            on the primary (users, products) cannot span databases and are left out.
+        """
+        app = app or current_app
+        with app.app_context():
+            tables = [table for table in db.metadata.sorted_tables if table.name in self.tables]
+            for key in app.extensions['shards'].keys:
+                with db.engines[key].begin() as connection:
+                    for table in tables:
+                        if connection.dialect.has_table(connection, table.name):
+                            continue
+                        local_keys = [fk for fk in table.foreign_key_constraints
+                                      if fk.referred_table.name in self.tables]
+                        connection.execute(CreateTable(table, include_foreign_key_constraints=local_keys))
+                        for index in table.indexes:
+                            connection.execute(CreateIndex(index))
+
+    def drop_schema(self, db, app=None):
+        app = app or current_app
+        with app.app_context():
+            tables = [table for table in db.metadata.sorted_tables if table.name in self.tables]
+            for key in app.extensions['shards'].keys:
+                with db.engines[key].begin() as connection:
+                    for table in reversed(tables):
+                        table.drop(connection, checkfirst=True)
+
+
+class _ShardState:
+    def __init__(self, keys, tables):
+        self.keys = keys
+        self.tables = tables
+
+    def shard_for_user(self, user_id):
+        return self.keys[user_id % len(self.keys)] if self.keys else None
+
+
+class ShardedPagination(Pagination):
+    """
+        Pagination over a ShardedSession. Every shard returns its first offset + per_page
+        rows, which are merged and sliced here, and the per-shard counts are summed.
+    """
+    def _query_items(self):
+        statement = self._query_args['select'].limit(self._query_offset + self.per_page)
+        rows = self._query_args['session'].execute(statement).scalars().all()
+        rows.sort(key=lambda row: (row.id, inspect(row).identity_token))
+        return rows[self._query_offset:self._query_offset + self.per_page]
+
+    def _query_count(self):
+        counted = select(func.count()).select_from(self._query_args['select'].order_by(None).subquery())
+        return sum(self._query_args['session'].execute(counted).scalars())
+
+
+def shard_engine(session, mapper=None, clause=None):
+    """The engine of the current shard for statements on sharded tables, else None."""
+    if not has_app_context():
+        return None
+    state = current_app.extensions.get('shards')
+    if state is None or not state.keys:
+        return None
+    if mapper is not None:
+        tables = [mapper.persist_selectable]
+    elif clause is not None:
+        tables = find_tables(clause, include_crud=True)
+    else:
+        return None
+    names = sorted({table.name for table in tables if getattr(table, 'name', None) in state.tables})
+    if not names:
+        return None
+    key = _current_shard(state)
+    if key is None:
+        raise ShardNotSelected(f"No shard selected for {', '.join(names)}: use use_shard() or a user token")
+    return session._db.engines[key]
+
+
+def _current_shard(state):
+    key = _shard_override.get()
+    if key is not None or not has_request_context():
+        return key
+    decoded_jwt = g.get('_jwt_extended_jwt')
+    if not decoded_jwt:
+        return None
+    if 'uid' in decoded_jwt:
+        return state.shard_for_user(decoded_jwt['uid'])
+    # Tokens issued before the uid claim: look the user up once per request
+    cached = g.get('_shard_for_identity')
+    if cached is None or cached[0] != decoded_jwt['sub']:
+        from ..models.users import User
+        user = User.query.filter_by(email=decoded_jwt['sub']).first()
+        cached = (decoded_jwt['sub'], state.shard_for_user(user.id) if user else None)
+        g._shard_for_identity = cached
+    return cached[1]
+
+
+@click.command('shards-init')
+@with_appcontext
+def shards_init():
+    """Create the carts, cart items, orders and order items tables on every shard."""
+    from . import db, shards
+    if not shards.enabled():
+        raise click.ClickException("SHARD_DATABASE_URIS is not set")
+    shards.create_schema(db)
+    click.echo(f"Created the sharded tables on {len(current_app.extensions['shards'].keys)} shards")
@@ -0,0 +1,17 @@
+import atexit
+import weakref
+
+# Background workers still alive at interpreter exit. Weak references, so an app
+# that is dropped (e.g. between tests) is not kept alive by its exit hook.
+_open = weakref.WeakSet()
+
+
+def close_at_exit(resource):
+    """Call resource.close() at interpreter exit, if it is still around by then."""
+    _open.add(resource)
+
+
+@atexit.register
+def _close_all():
+    for resource in list(_open):
+        resource.close()
@@ -0,0 +1,95 @@
+"""
+Measure cart write throughput with the user-owned tables on 1, 2 and 4 SQLite shards,
+against the unsharded layout where every write goes to the primary database.
+
+Usage:
+    python scripts/benchmark_sharding.py [--users 200] [--items 5] [--workers 8]
+
+Each worker thread takes a slice of the users and, for every user, creates a cart and
+adds cart items one commit at a time, the way /cartItems/add does. SQLite lets one writer
+at a time into a database file, so with more shards more of these commits run at once.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-sharding')
+
+from api import create_app  # noqa: E402
+from api.config.config import config_dict  # noqa: E402
+from api.models.cartItems import CartItem  # noqa: E402
+from api.models.carts import Cart  # noqa: E402
+from api.utils import db, shards  # noqa: E402
+
+
+def build_app(tmpdir, shard_count):
+    class BenchmarkConfig(config_dict['test']):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmpdir, 'primary.sqlite3')
+        SQLALCHEMY_ECHO = False
+        SHARD_DATABASE_URIS = ['sqlite:///' + os.path.join(tmpdir, f'shard{index}.sqlite3')
+                               for index in range(shard_count)]
+
+    app = create_app(config=BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+    shards.create_schema(db, app)
+    return app
+
+
+def write_carts(app, user_ids, items):
+    with app.app_context():
+        for user_id in user_ids:
+            with shards.use_shard(user_id):
+                cart = Cart(user_id=user_id)
+                db.session.add(cart)
+                db.session.commit()
+                for product_id in range(1, items + 1):
+                    db.session.add(CartItem(cart_id=cart.id, product_id=product_id, quantity=1))
+                    db.session.commit()
+        db.session.remove()
+
+
+def run(shard_count, users, items, workers):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        app = build_app(tmpdir, shard_count)
+        user_ids = list(range(1, users + 1))
+        threads = [threading.Thread(target=write_carts, args=(app, user_ids[index::workers], items))
+                   for index in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        app.extensions['event_log'].close()
+        app.extensions['scheduler'].close()
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+        return users * (items + 1) / elapsed
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'layout':<14}{'commits/s':>12}   ({args.users} users x {args.items + 1} commits, {args.workers} workers)")
+    for shard_count in (0, 1, 2, 4):
+        name = f'{shard_count} shards' if shard_count else 'unsharded'
+        print(f"{name:<14}{run(shard_count, args.users, args.items, args.workers):>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Measure cold start of the API: time to import the package, build the app and
+answer the first request, for the default start-up and the lazy/prebuilt one.
+
+Usage:
+    python scripts/measure_startup.py [--runs 5]
+
+Every run happens in a fresh interpreter so nothing is cached between them.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import api
+from api.config.config import config_dict
+imported = time.perf_counter()
+app = api.create_app(config_dict['test'])
+created = time.perf_counter()
+response = app.test_client().get('/swagger.json')
+assert response.status_code == 200, response.status_code
+first_request = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_request': first_request - created,
+    'total': first_request - start,
+}))
+"""
+
+
+def probe(env):
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    base_env = dict(os.environ)
+    base_env.setdefault('JWT_SECRET_KEY', 'measure-startup')
+    base_env.pop('LAZY_NAMESPACES', None)
+    base_env.pop('SWAGGER_SPEC_PATH', None)
+
+    spec_path = os.path.join(tempfile.mkdtemp(), 'swagger.json')
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'api', 'openapi-export', '--output', spec_path],
+                   cwd=ROOT, env=base_env, check=True, capture_output=True)
+
+    modes = {
+        'eager, runtime spec': base_env,
+        'lazy, prebuilt spec': dict(base_env, LAZY_NAMESPACES='true', SWAGGER_SPEC_PATH=spec_path),
+    }
+    print(f"{'mode':<22}{'import':>10}{'create_app':>12}{'1st request':>13}{'total':>10}   (median ms of {args.runs})")
+    for name, env in modes.items():
+        runs = [probe(env) for _ in range(args.runs)]
+        medians = {key: statistics.median(run[key] for run in runs) * 1000 for key in runs[0]}
+        print(f"{name:<22}{medians['import']:>10.1f}{medians['create_app']:>12.1f}"
+              f"{medians['first_request']:>13.1f}{medians['total']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()